@@ -0,0 +1,222 @@
+import argparse
+import multiprocessing as mp
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import log_loss
+from xgboost import XGBClassifier
+from clean_data_fighters import FEATURE_STORE_DIR, MODEL_FEATURE_COLUMNS, build_training_set, load_feature_store
+from feature_snapshots import FeatureSnapshotIndex, point_in_time_fight_features
+from model_tuning import split_cores
+from model_ufc_prediction import DEFAULT_PARAMS
+
+BACKTEST_DIR = '../data/backtest'
+CALIBRATION_BINS = 10
+
+# The time-ordered training matrix shared with the fold workers
+_BACKTEST_SOURCE = None
+
+
+def plan_folds(training_data, min_train_events=50, checkpoint_every=10):
+    """
+    Splits the events into time folds. The model is retrained at the first event of every fold on
+    all fights before it, and then scores every event of the fold.
+
+    Args:
+        training_data (pd.DataFrame): The training matrix with 'event' and 'date' columns.
+        min_train_events (int): The number of events used for training before the first fold.
+        checkpoint_every (int): The number of events scored between retrains.
+
+    Returns:
+        list: One list of event names per fold, in time order.
+    """
+    events = training_data.groupby('event')['date'].min().sort_values(kind='stable').index.tolist()
+    scored_events = events[min_train_events:]
+    return [scored_events[i:i + checkpoint_every] for i in range(0, len(scored_events), checkpoint_every)]
+
+
+def _init_backtest_worker(training_data):
+    global _BACKTEST_SOURCE
+    if training_data is not None:
+        _BACKTEST_SOURCE = training_data
+
+
+def _run_backtest_fold(fold):
+    events, params, n_threads, update_trees = fold
+    return run_backtest_fold(_BACKTEST_SOURCE, events, params, n_threads, update_trees)
+
+
+def run_backtest_fold(training_data, events, params=None, n_threads=1, update_trees=0):
+    """
+    Trains on every fight before the fold's first event and scores the fold's events in order.
+    With update_trees, the model is updated after each event by boosting that many more trees on
+    every fight up to and including the event, as model_registry.update_model does.
+
+    Args:
+        training_data (pd.DataFrame): The training matrix with 'event' and 'date' columns.
+        events (list): The fold's event names, in time order.
+        params (dict): The XGBoost hyperparameters. Defaults to DEFAULT_PARAMS.
+        n_threads (int): The number of xgboost threads.
+        update_trees (int): The number of trees added after each event, or 0 to never update.
+
+    Returns:
+        pd.DataFrame: One row per scored fight with its event, date, target and predicted probability.
+    """
+    params = {**(params or DEFAULT_PARAMS), 'n_jobs': n_threads}
+    fold_start = training_data.loc[training_data['event'] == events[0], 'date'].min()
+    seen = training_data['date'] < fold_start
+
+    model = XGBClassifier(eval_metric='logloss', **params)
+    model.fit(training_data.loc[seen, MODEL_FEATURE_COLUMNS], training_data.loc[seen, 'target'])
+
+    predictions = []
+    for event in events:
+        event_rows = training_data['event'] == event
+        scored = training_data.loc[event_rows, ['event', 'date', 'target']].copy()
+        scored['probability'] = model.predict_proba(training_data.loc[event_rows, MODEL_FEATURE_COLUMNS])[:, 1]
+        predictions.append(scored)
+
+        if update_trees:
+            seen |= event_rows
+            updated = XGBClassifier(eval_metric='logloss', **{**params, 'n_estimators': update_trees})
+            updated.fit(training_data.loc[seen, MODEL_FEATURE_COLUMNS], training_data.loc[seen, 'target'],
+                        xgb_model=model.get_booster())
+            model = updated
+
+    return pd.concat(predictions, ignore_index=True)
+
+
+def summarize_backtest(predictions):
+    """
+    Computes per-event metrics and a calibration table from the backtest predictions.
+
+    Args:
+        predictions (pd.DataFrame): The scored fights returned by run_backtest_fold.
+
+    Returns:
+        tuple: The per-event DataFrame (fights, accuracy, log loss, Brier score, mean predicted
+               and observed win rate) and the calibration DataFrame (one row per probability bin).
+    """
+    scored = predictions.assign(
+        correct=((predictions['probability'] >= 0.5) == (predictions['target'] == 1)).astype(float),
+        squared_error=(predictions['probability'] - predictions['target']) ** 2,
+        fight_log_loss=-np.log(np.clip(np.where(predictions['target'] == 1, predictions['probability'],
+                                                1 - predictions['probability']), 1e-15, 1))
+    )
+
+    per_event = scored.groupby(['date', 'event'], sort=True).agg(
+        fights=('target', 'size'),
+        accuracy=('correct', 'mean'),
+        log_loss=('fight_log_loss', 'mean'),
+        brier=('squared_error', 'mean'),
+        mean_predicted=('probability', 'mean'),
+        observed=('target', 'mean')
+    ).reset_index()
+
+    bins = np.linspace(0, 1, CALIBRATION_BINS + 1)
+    scored['bin'] = pd.cut(scored['probability'], bins, include_lowest=True)
+    calibration = scored.groupby('bin', observed=False).agg(
+        fights=('target', 'size'),
+        mean_predicted=('probability', 'mean'),
+        observed=('target', 'mean')
+    ).reset_index()
+    calibration['bin'] = calibration['bin'].astype(str)
+
+    return per_event, calibration
+
+
+def walk_forward_backtest(fight_features, min_train_events=50, checkpoint_every=10, update_trees=0, params=None,
+                          n_jobs=1, output_dir=BACKTEST_DIR, snapshot_index=None):
+    """
+    Replays the fight history in time order. The features of every fight are rebuilt as they were
+    known before it with point_in_time_fight_features, the model is retrained at every checkpoint
+    on all earlier fights, and each event is scored out of time. The folds between checkpoints
+    are independent and run in parallel across processes, with the cores split between processes
+    and xgboost threads.
+
+    Args:
+        fight_features (pd.DataFrame): The fight-level features, e.g. the feature store's fight_features.
+        min_train_events (int): The number of events used for training before the first scored event.
+        checkpoint_every (int): The number of events scored between retrains.
+        update_trees (int): The number of trees added after each scored event, or 0 to only retrain
+                            at checkpoints.
+        params (dict): The XGBoost hyperparameters. Defaults to DEFAULT_PARAMS.
+        n_jobs (int): The number of worker processes, or -1 to use every core, at most one per fold.
+        output_dir (str): The directory to write predictions.csv, per_event.csv and calibration.csv
+                          to, or None to skip writing.
+        snapshot_index (FeatureSnapshotIndex): The feature store's snapshots. Built from
+                                               fight_features when not given.
+
+    Returns:
+        dict: The per-fight predictions, the per-event metrics, the calibration table and the
+              overall accuracy, log loss and Brier score.
+    """
+    training_data = build_training_set(point_in_time_fight_features(fight_features, snapshot_index),
+                                       include_keys=True)
+    folds = plan_folds(training_data, min_train_events, checkpoint_every)
+    if not folds:
+        raise ValueError(f"Need more than {min_train_events} events to backtest")
+
+    n_cores = os.cpu_count() or 1
+    n_jobs = max(1, min(n_cores if n_jobs == -1 else n_jobs, len(folds)))
+    n_jobs, n_threads = split_cores(n_cores, n_jobs)
+    fold_args = [(events, params, n_threads, update_trees) for events in folds]
+    print(f"Backtesting {sum(len(events) for events in folds)} events in {len(folds)} folds "
+          f"on {n_jobs} processes with {n_threads} xgboost threads each")
+
+    if n_jobs == 1:
+        fold_predictions = [run_backtest_fold(training_data, *args) for args in fold_args]
+    else:
+        # Forked workers share the parent's copy of the training matrix
+        if 'fork' in mp.get_all_start_methods():
+            context = mp.get_context('fork')
+            init_args = (None,)
+        else:
+            context = mp.get_context('spawn')
+            init_args = (training_data,)
+
+        global _BACKTEST_SOURCE
+        _BACKTEST_SOURCE = training_data
+        try:
+            with context.Pool(processes=n_jobs, initializer=_init_backtest_worker, initargs=init_args) as pool:
+                fold_predictions = pool.map(_run_backtest_fold, fold_args)
+        finally:
+            _BACKTEST_SOURCE = None
+
+    predictions = pd.concat(fold_predictions, ignore_index=True)
+    per_event, calibration = summarize_backtest(predictions)
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        predictions.to_csv(os.path.join(output_dir, 'predictions.csv'), index=False)
+        per_event.to_csv(os.path.join(output_dir, 'per_event.csv'), index=False)
+        calibration.to_csv(os.path.join(output_dir, 'calibration.csv'), index=False)
+
+    return {
+        'predictions': predictions,
+        'per_event': per_event,
+        'calibration': calibration,
+        'accuracy': float(((predictions['probability'] >= 0.5) == (predictions['target'] == 1)).mean()),
+        'log_loss': float(log_loss(predictions['target'], predictions['probability'], labels=[0, 1])),
+        'brier': float(((predictions['probability'] - predictions['target']) ** 2).mean())
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Walk-forward backtest of the fight outcome model.')
+    parser.add_argument('--store-dir', default=FEATURE_STORE_DIR)
+    parser.add_argument('--min-train-events', type=int, default=50)
+    parser.add_argument('--checkpoint-every', type=int, default=10)
+    parser.add_argument('--update-trees', type=int, default=0)
+    parser.add_argument('--jobs', type=int, default=-1)
+    parser.add_argument('--output-dir', default=BACKTEST_DIR)
+    args = parser.parse_args()
+
+    feature_store = load_feature_store(args.store_dir)
+    backtest = walk_forward_backtest(feature_store['fight_features'], args.min_train_events, args.checkpoint_every,
+                                     args.update_trees, n_jobs=args.jobs, output_dir=args.output_dir,
+                                     snapshot_index=FeatureSnapshotIndex.from_feature_store(feature_store))
+    print(f"Accuracy {backtest['accuracy']:.3f}, log loss {backtest['log_loss']:.3f}, "
+          f"Brier {backtest['brier']:.3f} over {len(backtest['predictions'])} fights")
+    print(backtest['calibration'].to_string(index=False))
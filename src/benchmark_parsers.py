@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import time
+
+from benchmark_stages import BENCHMARK_DIR
+from scrape_basic_stats import parse_fighter_basic_stats
+from scrape_fight_dates import extract_fight_dates_and_results
+from scrape_fight_round_details import extract_max_round, parse_fight_data, parse_significant_strikes
+from synthetic_pages import generate_pages, write_pages
+
+
+def _expected_fight_rows(expected):
+    return 2 * expected['rounds'] if expected['per_round'] else None
+
+
+# Each parser with the page type it reads, how to call it on a page, and the number of records a
+# correct parse of the page returns according to the generator (None for pages it should reject)
+PARSERS = {
+    'extract_max_round': ('fight', lambda html, max_round: extract_max_round(html),
+                          lambda expected: expected['rounds'] if expected['per_round'] else 0),
+    'parse_fight_data': ('fight', parse_fight_data, _expected_fight_rows),
+    'parse_significant_strikes': ('fight', parse_significant_strikes, _expected_fight_rows),
+    'extract_fight_dates_and_results': ('fighter', lambda html, max_round: extract_fight_dates_and_results(html),
+                                        lambda expected: expected['ufc_rows']),
+    'parse_fighter_basic_stats': ('fighter', lambda html, max_round: parse_fighter_basic_stats(html),
+                                  lambda expected: expected['bouts']),
+}
+
+
+def _parsed_count(result):
+    if isinstance(result, dict):
+        return result['Wins'] + result['Losses'] + result['Draws'] + result['No Contests']
+    if isinstance(result, list):
+        return len(result)
+    return result
+
+
+def benchmark_parser(name, pages, repeats=3):
+    """
+    Measures a parser's throughput over generated pages and checks its output against the generator.
+
+    Args:
+        name (str): The parser's name in PARSERS.
+        pages (dict): The pages returned by generate_pages.
+        repeats (int): The number of timed passes over the pages; the fastest one is reported.
+
+    Returns:
+        dict: The parser's 'pages', 'megabytes', 'seconds', 'pages_per_second', 'mb_per_second'
+              and the number of pages it parsed wrongly as 'mismatches'.
+    """
+    page_type, parse, expected_count = PARSERS[name]
+    page_list = pages[page_type]
+    # The fight parsers take the round count that fight_details reads from the page first
+    max_rounds = [expected.get('rounds', 0) for _, expected in page_list]
+    megabytes = sum(len(html.encode('utf-8')) for html, _ in page_list) / 1024 ** 2
+
+    durations = []
+    mismatches = 0
+    for attempt in range(repeats):
+        start = time.perf_counter()
+        results = [parse(html, max_round) for (html, _), max_round in zip(page_list, max_rounds)]
+        durations.append(time.perf_counter() - start)
+        if attempt == 0:
+            mismatches = sum(_parsed_count(result) != expected_count(expected)
+                             for result, (_, expected) in zip(results, page_list))
+
+    seconds = min(durations)
+    return {
+        'pages': len(page_list),
+        'megabytes': megabytes,
+        'seconds': seconds,
+        'pages_per_second': len(page_list) / seconds,
+        'mb_per_second': megabytes / seconds,
+        'mismatches': int(mismatches)
+    }
+
+
+def run_parser_benchmarks(n_fight_pages=200, n_fighter_pages=50, max_bouts=45, repeats=3, seed=0,
+                          parsers=None, output_path=None, pages_dir=None):
+    """
+    Benchmarks the scrape parsers on generated ufcstats pages, entirely offline.
+
+    Args:
+        n_fight_pages (int): The number of fight details pages to generate.
+        n_fighter_pages (int): The number of fighter pages to generate.
+        max_bouts (int): The largest number of fights on a fighter page.
+        repeats (int): The number of timed passes per parser.
+        seed (int): The seed of the generated pages.
+        parsers (list): The parsers to benchmark. Defaults to every parser in PARSERS.
+        output_path (str): The JSON file to write the results to, or None to skip writing.
+        pages_dir (str): A directory to also write the generated pages to, or None.
+
+    Returns:
+        dict: The results of benchmark_parser keyed by parser name.
+    """
+    pages = generate_pages(n_fight_pages, n_fighter_pages, max_bouts, seed=seed)
+    if pages_dir:
+        write_pages(pages, pages_dir)
+
+    results = {}
+    print(f"{'parser':32s} {'pages/s':>9s} {'MB/s':>7s} {'pages':>6s} {'MB':>6s} {'mismatches':>11s}")
+    for name in parsers or PARSERS:
+        results[name] = measured = benchmark_parser(name, pages, repeats)
+        print(f"{name:32s} {measured['pages_per_second']:9.1f} {measured['mb_per_second']:7.2f} "
+              f"{measured['pages']:6d} {measured['megabytes']:6.1f} {measured['mismatches']:11d}")
+
+    if output_path:
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with open(output_path, 'w') as file:
+            json.dump(results, file, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the scrape parsers on generated ufcstats pages.')
+    parser.add_argument('--fight-pages', type=int, default=200)
+    parser.add_argument('--fighter-pages', type=int, default=50)
+    parser.add_argument('--max-bouts', type=int, default=45)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--parsers', nargs='+', choices=list(PARSERS))
+    parser.add_argument('--output', default=os.path.join(BENCHMARK_DIR, 'parser_results.json'))
+    parser.add_argument('--pages-dir', help='Also write the generated pages to this directory.')
+    args = parser.parse_args()
+
+    run_parser_benchmarks(args.fight_pages, args.fighter_pages, args.max_bouts, args.repeats, args.seed,
+                          args.parsers, args.output, args.pages_dir)
@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from clean_data_fighters import process_fighter_attributes, engineer_fight_stats, filter_weight_class_data, \
+    prepare_fight_data_pairs
+from synthetic_data import SYNTHETIC_DATA_DIR, load_synthetic_raw_rounds
+
+BENCHMARK_DIR = '../data/benchmarks'
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'stage_baseline.json')
+BENCHMARK_SIZES = [10000, 100000, 1000000]
+
+# A stage regresses when it is this much slower, or uses this much more peak memory, than the baseline
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.25
+
+
+def measure_stage(func, repeats=3, trace_memory=True):
+    """
+    Times a stage and measures its peak memory. The timed runs are separate from the traced run,
+    since tracing allocations slows the stage down.
+
+    Args:
+        func (callable): The stage to run with no arguments.
+        repeats (int): The number of timed runs; the fastest one is reported.
+        trace_memory (bool): Whether to measure the peak memory allocated by the stage.
+
+    Returns:
+        tuple: The stage's result and a dictionary with its 'seconds' and 'peak_mb'.
+    """
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+
+    peak_mb = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        finally:
+            tracemalloc.stop()
+
+    return result, {'seconds': float(min(durations)), 'peak_mb': peak_mb}
+
+
+def benchmark_stages(n_rows, seed=0, repeats=3, trace_memory=True, data_dir=SYNTHETIC_DATA_DIR):
+    """
+    Runs the prediction pipeline's stages on synthetic raw data, as model_run calls them for a
+    fight in the data's most common weight class.
+
+    Args:
+        n_rows (int): The approximate number of raw rows.
+        seed (int): The seed of the synthetic data.
+        repeats (int): The number of timed runs per stage.
+        trace_memory (bool): Whether to measure each stage's peak memory.
+        data_dir (str): The directory the synthetic data is kept in.
+
+    Returns:
+        dict: The 'seconds' and 'peak_mb' of every stage, keyed by stage name.
+    """
+    raw_data = load_synthetic_raw_rounds(n_rows, seed, data_dir)
+    results = {}
+
+    cleaned_data, results['process_fighter_attributes'] = measure_stage(
+        lambda: process_fighter_attributes(raw_data), repeats, trace_memory)
+
+    weight_class = cleaned_data['weight_class'].mode()[0]
+    engineered_data, results['engineer_fight_stats'] = measure_stage(
+        lambda: engineer_fight_stats(cleaned_data, {'weight_class': weight_class}), repeats, trace_memory)
+
+    filter_input = {'weight_class': weight_class, 'is_male_fight': True}
+    filtered_data, results['filter_weight_class_data'] = measure_stage(
+        lambda: filter_weight_class_data(raw_data, filter_input), repeats, trace_memory)
+
+    fighter_1, fighter_2 = engineered_data['name'].iloc[:2]
+    fight = {'fighter_1': fighter_1, 'fighter_2': fighter_2, 'weight_class': weight_class,
+             'is_title_fight': False, 'is_male_fight': True}
+    _, results['prepare_fight_data_pairs'] = measure_stage(
+        lambda: prepare_fight_data_pairs(engineered_data, filtered_data, fight), repeats, trace_memory)
+
+    return results
+
+
+def compare_to_baseline(results, baseline, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """
+    Compares benchmark results with a baseline of the same sizes and stages.
+
+    Args:
+        results (dict): The results of run_benchmarks, keyed by size and then stage.
+        baseline (dict): Baseline results in the same layout.
+        time_tolerance (float): The allowed relative slowdown, e.g. 0.25 for 25%.
+        memory_tolerance (float): The allowed relative growth in peak memory.
+
+    Returns:
+        list: One message per regression, empty if nothing regressed.
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, measured in stages.items():
+            expected = baseline.get(size, {}).get(stage)
+            if expected is None:
+                continue
+            if measured['seconds'] > expected['seconds'] * (1 + time_tolerance):
+                regressions.append(f"{stage} at {size} rows: {measured['seconds']:.3f}s vs "
+                                   f"{expected['seconds']:.3f}s baseline")
+            if measured['peak_mb'] is not None and expected.get('peak_mb') is not None and \
+                    measured['peak_mb'] > expected['peak_mb'] * (1 + memory_tolerance):
+                regressions.append(f"{stage} at {size} rows: {measured['peak_mb']:.1f} MB peak vs "
+                                   f"{expected['peak_mb']:.1f} MB baseline")
+    return regressions
+
+
+def run_benchmarks(sizes=None, seed=0, repeats=3, trace_memory=True, output_path=None):
+    """
+    Benchmarks every stage at each size and writes the results as JSON.
+
+    Args:
+        sizes (list): The numbers of raw rows to benchmark. Defaults to BENCHMARK_SIZES.
+        seed (int): The seed of the synthetic data.
+        repeats (int): The number of timed runs per stage.
+        trace_memory (bool): Whether to measure each stage's peak memory.
+        output_path (str): The JSON file to write the results to, or None to skip writing.
+
+    Returns:
+        dict: The results keyed by size (as a string, as in the JSON) and then stage.
+    """
+    results = {}
+    for n_rows in sizes or BENCHMARK_SIZES:
+        print(f"Benchmarking stages on {n_rows} rows")
+        results[str(n_rows)] = benchmark_stages(n_rows, seed, repeats, trace_memory)
+        for stage, measured in results[str(n_rows)].items():
+            peak = f"{measured['peak_mb']:9.1f} MB" if measured['peak_mb'] is not None else ''
+            print(f"  {stage:28s} {measured['seconds']:9.3f} s {peak}")
+
+    if output_path:
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with open(output_path, 'w') as file:
+            json.dump(results, file, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=BENCHMARK_SIZES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help='Skip the traced run that measures peak memory.')
+    parser.add_argument('--output', default=os.path.join(BENCHMARK_DIR, 'stage_results.json'))
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline.')
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.seed, args.repeats, not args.no_memory,
+                             args.baseline if args.save_baseline else args.output)
+
+    if args.save_baseline:
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            regressions = compare_to_baseline(results, json.load(file), args.time_tolerance, args.memory_tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+    else:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
@@ -0,0 +1,83 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import model_registry
+from tree_evaluator import CompiledTreeEnsemble
+
+
+def time_call(func, repeats):
+    """
+    Times repeated calls of a function.
+
+    Args:
+        func (callable): The function to call with no arguments.
+        repeats (int): The number of calls to time.
+
+    Returns:
+        dict: The median and 99th percentile latency in milliseconds.
+    """
+    func()  # Warm up
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    durations = np.array(durations) * 1000
+    return {'p50_ms': float(np.percentile(durations, 50)), 'p99_ms': float(np.percentile(durations, 99))}
+
+
+def benchmark_tree_evaluator(training_path=model_registry.TRAINING_DATA_PATH, version=None, batch_size=1000,
+                             repeats=200, tolerance=1e-5):
+    """
+    Compares the compiled tree evaluator against XGBClassifier.predict_proba on rows of the
+    training data, checking that the probabilities match and timing single-row and batch scoring.
+
+    Args:
+        training_path (str): The training CSV to draw rows from.
+        version (str): The registered model version to benchmark, or None for the latest.
+        batch_size (int): The number of rows in the batch benchmark.
+        repeats (int): The number of timed calls per benchmark.
+        tolerance (float): The largest allowed absolute difference between the probabilities.
+
+    Returns:
+        dict: The largest probability difference and the latency of each method.
+
+    Raises:
+        AssertionError: If the compiled evaluator disagrees with xgboost beyond the tolerance.
+    """
+    model, metadata = model_registry.get_model(version, training_path)
+    compiled = CompiledTreeEnsemble.from_boosters([model.get_booster()])
+
+    features = pd.read_csv(training_path)[metadata['feature_columns']]
+    batch = features.sample(n=min(batch_size, len(features)), replace=len(features) < batch_size, random_state=0)
+    batch_array = batch.to_numpy(dtype=np.float32)
+
+    max_difference = float(np.abs(model.predict_proba(batch)[:, 1] - compiled.predict_proba(batch_array)[:, 1]).max())
+    assert max_difference <= tolerance, f"Compiled evaluator differs from xgboost by {max_difference}"
+
+    single_row = batch.iloc[:1]
+    single_row_array = batch_array[:1]
+    results = {
+        'max_probability_difference': max_difference,
+        'xgboost_single_row': time_call(lambda: model.predict_proba(single_row), repeats),
+        'compiled_single_row': time_call(lambda: compiled.predict_proba(single_row_array), repeats),
+        'xgboost_batch': time_call(lambda: model.predict_proba(batch), max(1, repeats // 10)),
+        'compiled_batch': time_call(lambda: compiled.predict_proba(batch_array), max(1, repeats // 10)),
+    }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the compiled tree evaluator against xgboost.')
+    parser.add_argument('--training-path', default=model_registry.TRAINING_DATA_PATH)
+    parser.add_argument('--model-version', default=None)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    benchmark = benchmark_tree_evaluator(args.training_path, args.model_version, args.batch_size, args.repeats)
+    print(f"Max probability difference: {benchmark['max_probability_difference']:.2e}")
+    for name in ['xgboost_single_row', 'compiled_single_row', 'xgboost_batch', 'compiled_batch']:
+        print(f"{name:22s} p50 {benchmark[name]['p50_ms']:8.3f} ms   p99 {benchmark[name]['p99_ms']:8.3f} ms")
@@ -1,11 +1,112 @@
+import argparse
+import multiprocessing as mp
+import os
+import shutil
 from datetime import datetime
 
 import pandas as pd
+from feature_snapshots import FeatureSnapshotIndex, build_fighter_records, build_fighter_snapshots, \
+    point_in_time_fight_features
 from helper_clean_data_methods import categorize_method, extract_strike_data, clean_weight_class, extract_first_value, \
     extract_round_number, calculate_cumulative_metrics, get_most_recent_cumulative, one_hot_encode_fight_details
+from feature_store_paths import FEATURE_STORE_DIR, FEATURE_STORE_TABLES
+from pipeline_trace import span, traced, start_tracing, stop_tracing
+from surrogate_keys import fill_surrogate_keys
 import numpy as np
 
-
+RAW_DATA_PATH = '../data/combined_fighter_data.csv'
+TRAINING_DATA_PATH = '../data/cleaned_data_ml.csv'
+
+# Columns of the model input, in the order the model was trained on
+MODEL_FEATURE_COLUMNS = [
+    'fighter_A_stance_Orthodox',
+    'fighter_A_stance_Southpaw',
+    'fighter_A_stance_Switch',
+    'fighter_B_stance_Orthodox',
+    'fighter_B_stance_Southpaw',
+    'fighter_B_stance_Switch',
+    'is_title_fight_True',
+    'is_male_fight_True',
+    'weight_class_featherweight',
+    'weight_class_flyweight',
+    'weight_class_heavyweight',
+    'weight_class_light_heavyweight',
+    'weight_class_lightweight',
+    'weight_class_middleweight',
+    'weight_class_strawweight',
+    'weight_class_welterweight',
+    'diff_wins',
+    'diff_losses',
+    'diff_fight_age',
+    'diff_height_inches',
+    'diff_reach_inches',
+    'diff_knockdowns',
+    'diff_significant_strikes_landed',
+    'diff_significant_strikes_thrown',
+    'diff_total_strikes_landed',
+    'diff_total_strikes_thrown',
+    'diff_takedowns_landed',
+    'diff_takedowns_thrown',
+    'diff_head_strikes_landed',
+    'diff_head_strikes_thrown',
+    'diff_body_strikes_landed',
+    'diff_body_strikes_thrown',
+    'diff_leg_strikes_landed',
+    'diff_leg_strikes_thrown',
+    'diff_distance_strikes_landed',
+    'diff_distance_strikes_thrown',
+    'diff_clinch_strikes_landed',
+    'diff_clinch_strikes_thrown',
+    'diff_ground_strikes_landed',
+    'diff_ground_strikes_thrown',
+    'diff_strike_accuracy',
+    'diff_sig_strike_accuracy',
+    'diff_takedown_accuracy',
+    'diff_head_strike_ratio',
+    'diff_body_strike_ratio',
+    'diff_leg_strike_ratio',
+    'diff_fight_duration',
+    'diff_win_rate',
+    'diff_knockdown_percentage',
+    'diff_ko_rate',
+    'diff_submission_rate',
+    'diff_finish_rate'
+]
+
+# Per-fighter columns that are differenced between fighter A and B, in MODEL_FEATURE_COLUMNS order
+MATCHUP_NUMERICAL_COLUMNS = [
+    'wins', 'losses', 'current_age', 'height_inches', 'reach_inches', 'knockdowns',
+    'significant_strikes_landed', 'significant_strikes_thrown', 'total_strikes_landed',
+    'total_strikes_thrown', 'takedowns_landed', 'takedowns_thrown', 'head_strikes_landed',
+    'head_strikes_thrown', 'body_strikes_landed', 'body_strikes_thrown', 'leg_strikes_landed',
+    'leg_strikes_thrown', 'distance_strikes_landed', 'distance_strikes_thrown',
+    'clinch_strikes_landed', 'clinch_strikes_thrown', 'ground_strikes_landed',
+    'ground_strikes_thrown', 'strike_accuracy', 'sig_strike_accuracy', 'takedown_accuracy',
+    'head_strike_ratio', 'body_strike_ratio', 'leg_strike_ratio', 'fight_duration', 'win_rate',
+    'knockdown_percentage', 'ko_rate', 'submission_rate', 'finish_rate'
+]
+MATCHUP_STANCE_COLUMNS = ['stance_Orthodox', 'stance_Southpaw', 'stance_Switch']
+MATCHUP_WEIGHT_CLASSES = [
+    'featherweight', 'flyweight', 'heavyweight', 'light_heavyweight',
+    'lightweight', 'middleweight', 'strawweight', 'welterweight'
+]
+
+# Columns that identify a training row across rebuilds of the training data: the fight, and the
+# fighter on side A, which tells the two orientations of a fight in a symmetric matrix apart
+TRAINING_KEY_COLUMNS = ['fight_id', 'fighter_A_id']
+
+# Columns that are the same on every round of a fighter's fight, kept by aggregate_round_stats
+FIGHT_ATTRIBUTE_COLUMNS = [
+    'event_id', 'event', 'name', 'wins', 'losses', 'draws', 'nc', 'stance', 'DOB', 'date', 'result', 'method',
+    'Fighter_1', 'Fighter_2', 'current_age', 'fight_age', 'is_title_fight', 'is_male_fight', 'weight_class',
+    'height_inches', 'weight_pounds', 'reach_inches'
+]
+
+# Fight data shared with the worker processes of build_fight_features
+_SHARD_SOURCE = None
+
+
+@traced('process_fighter_attributes')
 def process_fighter_attributes(ufc_data):
     """
     Processes and modifies the attributes of fighters such as the fighter's age, weight class, height, reach, weight.
@@ -14,11 +115,16 @@ def process_fighter_attributes(ufc_data):
     df (pd.DataFrame): The DataFrame containing fighter data to be processed.
 
     Returns:
-    pd.DataFrame: A DataFrame with processed fighter attributes to be used for further feature engineering.
+    pd.DataFrame: A DataFrame with processed fighter attributes and the integer fight_id, event_id and
+                  fighter_id keys, to be used for further feature engineering.
     """
 
-    # Rename columns for easier manipulation
-    ufc_data.rename(columns={
+    # Rename columns for easier manipulation, into a new frame so that the caller's raw data is not modified.
+    # Rows without the fight, event and fighter keys get keys derived from the names
+    ufc_data = fill_surrogate_keys(ufc_data).rename(columns={
+        'Fight ID': 'fight_id',
+        'Event ID': 'event_id',
+        'Fighter ID': 'fighter_id',
         'Sig. Str.': 'significant_strikes',
         'Total Str.': 'total_strikes',
         'TD': 'takedowns',
@@ -33,7 +139,7 @@ def process_fighter_attributes(ufc_data):
         'Clinch': 'clinch_strikes',
         'Ground': 'ground_strikes',
         'Method': 'method'
-    }, inplace=True)
+    })
 
     ufc_data['method'] = ufc_data['method'].apply(categorize_method)
 
@@ -131,7 +237,8 @@ def process_fighter_attributes(ufc_data):
     return ufc_data
 
 
-def engineer_fight_stats(ufc_data, user_input):
+@traced('engineer_fight_stats')
+def engineer_fight_stats(ufc_data, user_input, n_jobs=1):
     """
     Performs feature engineering on fight statistics, including aggregating and calculating
     cumulative fight performance metrics. This includes metrics like significant strikes,
@@ -141,17 +248,43 @@ def engineer_fight_stats(ufc_data, user_input):
     ufc_data (pd.DataFrame): The DataFrame containing raw UFC fight data.
     user_input (dict): A dictionary containing user-provided information about the fight,
                        including weight class.
+    n_jobs (int): The number of worker processes used for the per-fighter feature engineering.
 
     Returns:
     pd.DataFrame: A DataFrame with engineered features, including cumulative fight metrics
                   and win ratios.
     """
-    ufc_fight_data = ufc_data.groupby(
-        ['event', 'name', 'wins', 'losses', 'draws', 'nc', 'stance', 'DOB', 'date', 'result', 'method'
-         # method
-            , 'Fighter_1', 'Fighter_2', 'current_age', 'fight_age', 'is_title_fight', 'is_male_fight', 'weight_class',
-         'height_inches', 'weight_pounds', 'reach_inches'
-         ]).agg({
+    ufc_fight_data = aggregate_round_stats(ufc_data)
+    ufc_fight_data_filtered = build_fight_features(ufc_fight_data, n_jobs)
+    fighter_agg_cleaned = aggregate_fighter_features(ufc_fight_data_filtered)
+
+    # Extract the required values from the user input dictionary
+    user_input_weightclass = user_input.get("weight_class")
+    user_input_weightclass = user_input_weightclass.lower().replace(' ', '_')
+
+    fighter_agg_cleaned = fighter_agg_cleaned[fighter_agg_cleaned['weight_class'] == user_input_weightclass]
+
+    return fighter_agg_cleaned
+
+
+@traced('aggregate_round_stats')
+def aggregate_round_stats(ufc_data):
+    """
+    Aggregates the round-by-round rows produced by process_fighter_attributes into one row per
+    fighter per fight, and one-hot encodes the method of victory.
+
+    Parameters:
+    ufc_data (pd.DataFrame): The DataFrame returned by process_fighter_attributes.
+
+    Returns:
+    pd.DataFrame: A DataFrame with one row per fighter per fight.
+    """
+    # A fighter's rounds of a fight share every attribute column, so the rows are grouped on the two
+    # integer keys and the attributes are carried with 'first'. Rows missing an attribute are dropped,
+    # as they were when the attributes were part of the group keys
+    ufc_data = ufc_data.dropna(subset=FIGHT_ATTRIBUTE_COLUMNS)
+    ufc_fight_data = ufc_data.groupby(['fight_id', 'fighter_id']).agg({
+        **{col: 'first' for col in FIGHT_ATTRIBUTE_COLUMNS},
         'knockdowns': 'sum',
         'significant_strikes_landed': 'sum',
         'significant_strikes_thrown': 'sum',
@@ -181,12 +314,106 @@ def engineer_fight_stats(ufc_data, user_input):
     for method in required_methods:
         if method not in method_dummies.columns:
             method_dummies[method] = 0
-    method_dummies = method_dummies[required_methods]
+    method_dummies = method_dummies[required_methods].astype(int)
 
     ufc_fight_data = ufc_fight_data.join(method_dummies)
 
+    return ufc_fight_data
+
+
+@traced('build_fight_features')
+def build_fight_features(ufc_fight_data, n_jobs=1):
+    """
+    Calculates each fighter's cumulative performance metrics going into every fight and attaches
+    them to the fight rows. A fighter's first fight in a weight class has no history and is dropped.
+
+    Every fighter and weight class is independent, so with n_jobs > 1 the fighters are sharded
+    across a process pool. Workers inherit the fight data when processes are forked and receive
+    only row positions per shard, and the output is returned in the same order as a serial run.
+
+    Parameters:
+    ufc_fight_data (pd.DataFrame): The DataFrame returned by aggregate_round_stats.
+    n_jobs (int): The number of worker processes to use, or -1 to use every core.
+
+    Returns:
+    pd.DataFrame: A DataFrame with one row per fighter per fight, including the pre-fight
+                  cumulative metrics and ratios for every weight class.
+    """
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs <= 1 or ufc_fight_data.empty:
+        return _build_fighter_history_features(ufc_fight_data)
+
+    ufc_fight_data = ufc_fight_data.reset_index(drop=True)
+    ufc_fight_data['_row_position'] = np.arange(len(ufc_fight_data))
+
+    shards = shard_fighter_rows(ufc_fight_data, n_jobs * 4)
+    n_jobs = min(n_jobs, len(shards))
+
+    # Forked workers share the parent's copy of the data, so only the row positions are pickled
+    if 'fork' in mp.get_all_start_methods():
+        context = mp.get_context('fork')
+        init_args = (None,)
+    else:
+        context = mp.get_context('spawn')
+        init_args = (ufc_fight_data,)
+
+    global _SHARD_SOURCE
+    _SHARD_SOURCE = ufc_fight_data
+    try:
+        with context.Pool(processes=n_jobs, initializer=_init_shard_worker, initargs=init_args) as pool:
+            shard_results = pool.map(_build_fight_features_shard, shards)
+    finally:
+        _SHARD_SOURCE = None
+
+    ufc_fight_data_filtered = pd.concat([df for df in shard_results if not df.empty], ignore_index=True)
+    ufc_fight_data_filtered = ufc_fight_data_filtered.sort_values('_row_position', kind='stable')
+    ufc_fight_data_filtered = ufc_fight_data_filtered.drop(columns='_row_position').reset_index(drop=True)
+
+    return ufc_fight_data_filtered
+
+
+def shard_fighter_rows(ufc_fight_data, num_shards):
+    """
+    Splits the rows of the fight data into shards, keeping every fighter and weight class in a
+    single shard and balancing the shards by number of rows.
+
+    Parameters:
+    ufc_fight_data (pd.DataFrame): The DataFrame returned by aggregate_round_stats.
+    num_shards (int): The maximum number of shards to create.
+
+    Returns:
+    list: A list of numpy arrays holding the row positions in each shard.
+    """
+    groups = ufc_fight_data.groupby(['fighter_id', 'weight_class'], sort=True).indices
+    num_shards = max(1, min(num_shards, len(groups)))
+
+    # Assign the largest fighters first, each to the currently smallest shard
+    shard_rows = [[] for _ in range(num_shards)]
+    shard_sizes = [0] * num_shards
+    for key in sorted(groups, key=lambda k: (-len(groups[k]), k)):
+        smallest = shard_sizes.index(min(shard_sizes))
+        shard_rows[smallest].append(groups[key])
+        shard_sizes[smallest] += len(groups[key])
+
+    return [np.sort(np.concatenate(rows)) for rows in shard_rows if rows]
+
+
+def _init_shard_worker(ufc_fight_data):
+    global _SHARD_SOURCE
+    if ufc_fight_data is not None:
+        _SHARD_SOURCE = ufc_fight_data
+
+
+def _build_fight_features_shard(row_positions):
+    return _build_fighter_history_features(_SHARD_SOURCE.iloc[row_positions].reset_index(drop=True))
+
+
+def _build_fighter_history_features(ufc_fight_data):
+    required_methods = ['method_ko', 'method_sub', 'method_dec', 'method_dq', 'method_overturned']
+
     # Aggregating Data with methods
-    aggregated_fighter_data = ufc_fight_data.groupby(['name', 'weight_class', 'date']).agg(
+    aggregated_fighter_data = ufc_fight_data.groupby(['fighter_id', 'weight_class', 'date']).agg(
         knockdowns=('knockdowns', 'sum'),
         significant_strikes_landed=('significant_strikes_landed', 'sum'),
         significant_strikes_thrown=('significant_strikes_thrown', 'sum'),
@@ -209,8 +436,8 @@ def engineer_fight_stats(ufc_data, user_input):
         total_title_fights=('is_title_fight', 'sum'),
         wins=('result', lambda x: (x == 'win').sum()),
         total_rounds=('round_number', 'sum'),
-        total_unique_events=('event', 'nunique'),
-        **{f'total_{col}': (col, 'sum') for col in method_dummies.columns}
+        total_unique_events=('event_id', 'nunique'),
+        **{f'total_{col}': (col, 'sum') for col in required_methods}
     ).reset_index()
 
     # Apply the function to each row
@@ -221,7 +448,7 @@ def engineer_fight_stats(ufc_data, user_input):
 
     # Define the columns to keep
     columns_to_keep = [
-        'name', 'weight_class', 'date',
+        'fighter_id', 'weight_class', 'date',
         'cumulative_knockdowns', 'cumulative_significant_strikes_landed', 'cumulative_significant_strikes_thrown',
         'cumulative_total_strikes_landed', 'cumulative_total_strikes_thrown', 'cumulative_takedowns_landed',
         'cumulative_takedowns_thrown', 'cumulative_head_strikes_landed', 'cumulative_head_strikes_thrown',
@@ -334,10 +561,10 @@ def engineer_fight_stats(ufc_data, user_input):
         0
     )
 
-    final_data_with_cumulative = final_data_with_cumulative.sort_values(by=['name', 'weight_class', 'date'])
+    final_data_with_cumulative = final_data_with_cumulative.sort_values(by=['fighter_id', 'weight_class', 'date'])
 
     # Create the next_fight_date column
-    final_data_with_cumulative['next_fight_date'] = final_data_with_cumulative.groupby(['name', 'weight_class'])[
+    final_data_with_cumulative['next_fight_date'] = final_data_with_cumulative.groupby(['fighter_id', 'weight_class'])[
         'date'].shift(-1)
 
     cols_drop = [
@@ -359,8 +586,8 @@ def engineer_fight_stats(ufc_data, user_input):
     final_data_with_cumulative['date'] = pd.to_datetime(final_data_with_cumulative['date'], errors='coerce')
     ufc_fight_data['date'] = pd.to_datetime(ufc_fight_data['date'], errors='coerce')
 
-    # Sort the cumulative data by name, weight_class, and date
-    final_data_with_cumulative = final_data_with_cumulative.sort_values(['name', 'weight_class', 'date'])
+    # Sort the cumulative data by fighter, weight_class, and date
+    final_data_with_cumulative = final_data_with_cumulative.sort_values(['fighter_id', 'weight_class', 'date'])
 
     # Apply the function to get the most recent cumulative stats for each fight event
     most_recent_cumulative = ufc_fight_data.apply(
@@ -379,8 +606,8 @@ def engineer_fight_stats(ufc_data, user_input):
     ufc_fight_data_with_cumulative = pd.merge(
         ufc_fight_data,
         final_data_with_cumulative,
-        left_on=['name', 'weight_class', 'date'],
-        right_on=['name', 'weight_class', 'next_fight_date'],
+        left_on=['fighter_id', 'weight_class', 'date'],
+        right_on=['fighter_id', 'weight_class', 'next_fight_date'],
         how='left',
         suffixes=('', '_cumulative')
     )
@@ -394,9 +621,23 @@ def engineer_fight_stats(ufc_data, user_input):
     ufc_fight_data_filtered.drop(columns='is_first_fight', inplace=True)
     ufc_fight_data_filtered.reset_index(drop=True, inplace=True)
 
+    return ufc_fight_data_filtered
+
+
+@traced('aggregate_fighter_features')
+def aggregate_fighter_features(ufc_fight_data_filtered):
+    """
+    Averages each fighter's fight-level features into a single feature vector per weight class.
+
+    Parameters:
+    ufc_fight_data_filtered (pd.DataFrame): The DataFrame returned by build_fight_features.
+
+    Returns:
+    pd.DataFrame: A DataFrame with one row per fighter and weight class.
+    """
     fighter_agg = ufc_fight_data_filtered.copy()
 
-    columns_to_drop = ['event', 'DOB', 'date', 'result', 'method',
+    columns_to_drop = ['fight_id', 'event_id', 'name', 'event', 'DOB', 'date', 'result', 'method',
                        'Fighter_1', 'Fighter_2', 'round_number', 'method_ko',
                        'method_sub', 'method_dec', 'method_dq', 'method_overturned',
                        'draws', 'nc', 'stance',
@@ -404,51 +645,68 @@ def engineer_fight_stats(ufc_data, user_input):
 
     fighter_agg_cleaned = fighter_agg.drop(columns=columns_to_drop)
 
-    fighter_agg_cleaned = fighter_agg_cleaned.groupby(['name', 'weight_class']).mean(numeric_only=True).reset_index()
-
-    # Extract the required values from the user input dictionary
-    user_input_weightclass = user_input.get("weight_class")
-    user_input_weightclass = user_input_weightclass.lower().replace(' ', '_')
+    fighter_agg_cleaned = fighter_agg_cleaned.groupby(['fighter_id', 'weight_class']).mean(numeric_only=True) \
+        .reset_index()
 
-    fighter_agg_cleaned = fighter_agg_cleaned[fighter_agg_cleaned['weight_class'] == user_input_weightclass]
+    # Names are looked up by the user, so they are carried next to the key
+    names = fighter_agg.drop_duplicates('fighter_id').set_index('fighter_id')['name']
+    fighter_agg_cleaned.insert(1, 'name', fighter_agg_cleaned['fighter_id'].map(names))
 
     return fighter_agg_cleaned
 
 
-def filter_weight_class_data(df, user_input):
+@traced('extract_fighter_attributes')
+def extract_fighter_attributes(df):
     """
-    Filters the aggregated fighter data to only include fighters from the specified weight class
-    provided by the user. This step ensures that only relevant data is considered in further analysis.
+    Extracts each fighter's stance from the raw scraped data and one-hot encodes it.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing the raw data where we store fighter's attributes
-    user_input (dict): A dictionary containing user-provided information about the fight,
-                       including weight class.
 
     Returns:
-    pd.DataFrame: A DataFrame filtered to include only the fighters from the specified weight class.
+    pd.DataFrame: A DataFrame with one row per fighter containing the fighter_id, name and stance indicators.
     """
-
-    cols = ['Name', 'Stance', 'Date']
-    df = df[cols]
+    cols = ['Fighter ID', 'Name', 'Stance', 'Date']
+    df = fill_surrogate_keys(df, ['Fighter ID'])[cols]
     df.sort_values(by=['Name', 'Date'], ascending=[True, False])
-    ufc_data_attr = df.groupby('Name').first()
+    ufc_data_attr = df.groupby('Fighter ID').first()
 
     stance_dummies = pd.get_dummies(ufc_data_attr['Stance'], prefix='stance')
     required_stances = ['stance_Orthodox', 'stance_Southpaw', 'stance_Switch']
     for stance in required_stances:
         if stance not in stance_dummies.columns:
             stance_dummies[stance] = 0
-    stance_dummies = stance_dummies[required_stances]
+    stance_dummies = stance_dummies[required_stances].astype(int)
     ufc_data_attr = ufc_data_attr.join(stance_dummies)
 
     ufc_data_attr.reset_index(inplace=True)
     ufc_data_attr.drop(columns=['Stance', 'Date'], inplace=True)
 
     ufc_data_attr.rename(columns={
+        'Fighter ID': 'fighter_id',
         'Name': 'name'
     }, inplace=True)
 
+    return ufc_data_attr
+
+
+@traced('filter_weight_class_data')
+def filter_weight_class_data(df, user_input):
+    """
+    Filters the aggregated fighter data to only include fighters from the specified weight class
+    provided by the user. This step ensures that only relevant data is considered in further analysis.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing the raw data where we store fighter's attributes
+    user_input (dict): A dictionary containing user-provided information about the fight,
+                       including weight class.
+
+    Returns:
+    pd.DataFrame: A DataFrame filtered to include only the fighters from the specified weight class.
+    """
+
+    ufc_data_attr = extract_fighter_attributes(df)
+
     user_input_weightclass = user_input.get("weight_class")
     user_input_male_fight = user_input.get("is_male_fight")
 
@@ -482,6 +740,7 @@ def filter_weight_class_data(df, user_input):
     return ufc_data_attr
 
 
+@traced('prepare_fight_data_pairs')
 def prepare_fight_data_pairs(agg_data, attr_data, user_input):
     """
     Prepares and pairs the data of two fighters for comparison, calculating differences
@@ -498,7 +757,7 @@ def prepare_fight_data_pairs(agg_data, attr_data, user_input):
     pd.DataFrame: A DataFrame with paired fighter data, including calculated differences
                   in performance metrics and relevant features for model input.
     """
-    final_comp_df = attr_data.merge(agg_data, how='inner', on='name')
+    final_comp_df = attr_data.merge(agg_data.drop(columns='name'), how='inner', on='fighter_id')
     fighter_1 = user_input.get("fighter_1")
     fighter_2 = user_input.get("fighter_2")
 
@@ -568,7 +827,8 @@ def prepare_fight_data_pairs(agg_data, attr_data, user_input):
         
     # Drop original fighter_A and fighter_B columns for numerical metrics
     final_model_df.drop(columns=columns_to_drop, inplace=True)
-    final_model_df.drop(columns=['fighter_A_name', 'fighter_B_name'], inplace=True)
+    final_model_df.drop(columns=['fighter_A_name', 'fighter_B_name', 'fighter_A_fighter_id', 'fighter_B_fighter_id'],
+                        inplace=True)
 
     drop_cols = [
         'fighter_A_weight_class',
@@ -602,60 +862,439 @@ def prepare_fight_data_pairs(agg_data, attr_data, user_input):
         'diff_current_age': 'diff_fight_age'
     }, inplace=True)
 
-    desired_columns = [
-        'fighter_A_stance_Orthodox',
-        'fighter_A_stance_Southpaw',
-        'fighter_A_stance_Switch',
-        'fighter_B_stance_Orthodox',
-        'fighter_B_stance_Southpaw',
-        'fighter_B_stance_Switch',
-        'is_title_fight_True',
-        'is_male_fight_True',
-        'weight_class_featherweight',
-        'weight_class_flyweight',
-        'weight_class_heavyweight',
-        'weight_class_light_heavyweight',
-        'weight_class_lightweight',
-        'weight_class_middleweight',
-        'weight_class_strawweight',
-        'weight_class_welterweight',
-        'diff_wins',
-        'diff_losses',
-        'diff_fight_age',
-        'diff_height_inches',
-        'diff_reach_inches',
-        'diff_knockdowns',
-        'diff_significant_strikes_landed',
-        'diff_significant_strikes_thrown',
-        'diff_total_strikes_landed',
-        'diff_total_strikes_thrown',
-        'diff_takedowns_landed',
-        'diff_takedowns_thrown',
-        'diff_head_strikes_landed',
-        'diff_head_strikes_thrown',
-        'diff_body_strikes_landed',
-        'diff_body_strikes_thrown',
-        'diff_leg_strikes_landed',
-        'diff_leg_strikes_thrown',
-        'diff_distance_strikes_landed',
-        'diff_distance_strikes_thrown',
-        'diff_clinch_strikes_landed',
-        'diff_clinch_strikes_thrown',
-        'diff_ground_strikes_landed',
-        'diff_ground_strikes_thrown',
-        'diff_strike_accuracy',
-        'diff_sig_strike_accuracy',
-        'diff_takedown_accuracy',
-        'diff_head_strike_ratio',
-        'diff_body_strike_ratio',
-        'diff_leg_strike_ratio',
-        'diff_fight_duration',
-        'diff_win_rate',
-        'diff_knockdown_percentage',
-        'diff_ko_rate',
-        'diff_submission_rate',
-        'diff_finish_rate'
+    final_model_df = final_model_df[MODEL_FEATURE_COLUMNS]
+    return final_model_df
+
+
+@traced('build_feature_tables')
+def build_feature_tables(raw_data, n_jobs=1):
+    """
+    Runs attribute processing and feature engineering on a block of raw scraped rows for every
+    weight class, producing the tables stored in the feature store.
+
+    Parameters:
+    raw_data (pd.DataFrame): Raw scraped rows in the combined_fighter_data.csv format.
+    n_jobs (int): The number of worker processes used for the per-fighter feature engineering.
+
+    Returns:
+    dict: A dictionary mapping each table name in FEATURE_STORE_TABLES to its DataFrame.
+    """
+    fighter_attributes = extract_fighter_attributes(raw_data)
+
+    cleaned_data = process_fighter_attributes(raw_data)
+    if cleaned_data.empty:
+        return {'fight_features': pd.DataFrame(), 'fighter_features': pd.DataFrame(),
+                'fighter_attributes': fighter_attributes, 'fighter_snapshots': pd.DataFrame(),
+                'fighter_records': pd.DataFrame()}
+
+    fight_features = build_fight_features(aggregate_round_stats(cleaned_data), n_jobs)
+    fighter_features = aggregate_fighter_features(fight_features)
+
+    return {
+        'fight_features': fight_features,
+        'fighter_features': fighter_features,
+        'fighter_attributes': fighter_attributes,
+        'fighter_snapshots': build_fighter_snapshots(fight_features),
+        'fighter_records': build_fighter_records(fight_features)
+    }
+
+
+def iter_fighter_chunks(raw_path, chunk_rows):
+    """
+    Reads raw scraped rows in chunks that never split a fighter's history across two chunks.
+    The scraper writes each fighter's rows contiguously, which this relies on. Fighters are told
+    apart by their 'Fighter ID' key, or by name in raw data scraped before the keys were written.
+
+    Parameters:
+    raw_path (str): The path to the raw combined_fighter_data.csv file.
+    chunk_rows (int): The approximate number of rows to read at a time.
+
+    Yields:
+    pd.DataFrame: A chunk containing the complete histories of one or more fighters.
+
+    Raises:
+    ValueError: If a fighter's rows are not contiguous in the file.
+    """
+    completed_fighters = set()
+    pending = None
+
+    for chunk in pd.read_csv(raw_path, chunksize=chunk_rows):
+        if pending is not None:
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+
+        fighter_column = 'Fighter ID' if 'Fighter ID' in chunk.columns else 'Name'
+
+        # The last fighter in the chunk may continue in the next one, so hold their rows back
+        last_fighter = chunk[fighter_column].iloc[-1]
+        is_pending = chunk[fighter_column] == last_fighter
+        pending = chunk[is_pending]
+        complete = chunk[~is_pending]
+
+        if complete.empty:
+            continue
+
+        fighters = set(complete[fighter_column].unique())
+        if fighters & completed_fighters:
+            raise ValueError(f"Rows for fighters {sorted(fighters & completed_fighters)[:5]} are not contiguous "
+                             f"in {raw_path}; chunked builds require the file to be grouped by fighter.")
+        completed_fighters.update(fighters)
+
+        yield complete.reset_index(drop=True)
+
+    if pending is not None and not pending.empty:
+        if pending[fighter_column].iloc[0] in completed_fighters:
+            raise ValueError(f"Rows for fighter {pending['Name'].iloc[0]} are not contiguous in {raw_path}; "
+                             f"chunked builds require the file to be grouped by fighter.")
+        yield pending.reset_index(drop=True)
+
+
+def merge_partial_tables(partial_dir, store_dir, num_parts):
+    """
+    Concatenates the partial feature tables written by each chunk into the final feature store
+    files, streaming one part at a time.
+
+    Parameters:
+    partial_dir (str): The directory containing the partial tables.
+    store_dir (str): The feature store directory to write the merged tables to.
+    num_parts (int): The number of chunks that were processed.
+    """
+    for table in FEATURE_STORE_TABLES:
+        output_path = os.path.join(store_dir, f'{table}.csv')
+        write_header = True
+        with open(output_path, 'w', newline='') as output_file:
+            for part in range(num_parts):
+                part_path = os.path.join(partial_dir, f'{table}_part_{part:05d}.csv')
+                if not os.path.exists(part_path):
+                    continue
+                with open(part_path, 'r', newline='') as part_file:
+                    header = part_file.readline()
+                    if write_header:
+                        output_file.write(header)
+                        write_header = False
+                    shutil.copyfileobj(part_file, output_file)
+
+
+def build_feature_store(raw_path, store_dir=FEATURE_STORE_DIR, chunk_rows=None, n_jobs=1):
+    """
+    Builds the feature store for every fighter in the raw scraped data. By default the whole file
+    is processed in memory. When chunk_rows is given, the file is streamed in fighter-partitioned
+    chunks, each chunk's features are written to disk and the partial outputs are merged at the
+    end, so peak memory is bounded by the chunk size rather than the dataset size.
+
+    Parameters:
+    raw_path (str): The path to the raw combined_fighter_data.csv file.
+    store_dir (str): The directory to write the feature store tables to.
+    chunk_rows (int): The number of raw rows to read per chunk, or None to read the whole file.
+    n_jobs (int): The number of worker processes used for the per-fighter feature engineering.
+
+    Returns:
+    str: The feature store directory.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+
+    if chunk_rows is None:
+        tables = build_feature_tables(pd.read_csv(raw_path), n_jobs)
+        for table, df in tables.items():
+            df.to_csv(os.path.join(store_dir, f'{table}.csv'), index=False)
+        return store_dir
+
+    partial_dir = os.path.join(store_dir, 'partial')
+    os.makedirs(partial_dir, exist_ok=True)
+
+    num_parts = 0
+    for part, chunk in enumerate(iter_fighter_chunks(raw_path, chunk_rows)):
+        print(f"Processing chunk {part} ({len(chunk)} rows, {chunk['Name'].nunique()} fighters)...")
+        with span('feature_chunk', part=part):
+            tables = build_feature_tables(chunk, n_jobs)
+        for table, df in tables.items():
+            if not df.empty:
+                df.to_csv(os.path.join(partial_dir, f'{table}_part_{part:05d}.csv'), index=False)
+        num_parts = part + 1
+
+    merge_partial_tables(partial_dir, store_dir, num_parts)
+    shutil.rmtree(partial_dir)
+
+    return store_dir
+
+
+def load_feature_store(store_dir=FEATURE_STORE_DIR):
+    """
+    Loads the tables written by build_feature_store.
+
+    Parameters:
+    store_dir (str): The feature store directory.
+
+    Returns:
+    dict: A dictionary mapping each table name in FEATURE_STORE_TABLES to its DataFrame.
+    """
+    tables = {}
+    for table in FEATURE_STORE_TABLES:
+        tables[table] = pd.read_csv(os.path.join(store_dir, f'{table}.csv'))
+        if 'date' in tables[table].columns:
+            tables[table]['date'] = pd.to_datetime(tables[table]['date'])
+    return tables
+
+
+def encode_matchups(numerical_A, numerical_B, stance_A, stance_B, weight_classes, is_title_fight, is_male_fight):
+    """
+    Encodes matchups into the model input from per-fighter arrays. All arguments broadcast against
+    each other with numpy rules, so a whole card or a fighter-by-fighter grid is encoded at once.
+
+    Parameters:
+    numerical_A (np.ndarray): Fighter A's MATCHUP_NUMERICAL_COLUMNS values, shape (..., 36).
+    numerical_B (np.ndarray): Fighter B's MATCHUP_NUMERICAL_COLUMNS values, shape (..., 36).
+    stance_A (np.ndarray): Fighter A's MATCHUP_STANCE_COLUMNS indicators, shape (..., 3).
+    stance_B (np.ndarray): Fighter B's MATCHUP_STANCE_COLUMNS indicators, shape (..., 3).
+    weight_classes (np.ndarray): The normalized weight class of each matchup, e.g. 'light_heavyweight'.
+    is_title_fight (np.ndarray): Whether each matchup is a title fight.
+    is_male_fight (np.ndarray): Whether each matchup is a men's fight.
+
+    Returns:
+    np.ndarray: A float array of shape (..., len(MODEL_FEATURE_COLUMNS)).
+    """
+    diffs = np.nan_to_num(np.asarray(numerical_A, dtype=float)) - np.nan_to_num(np.asarray(numerical_B, dtype=float))
+    batch_shape = np.broadcast_shapes(diffs.shape[:-1], np.shape(stance_A)[:-1], np.shape(stance_B)[:-1],
+                                      np.shape(weight_classes), np.shape(is_title_fight), np.shape(is_male_fight))
+
+    weight_classes = np.asarray(weight_classes)
+    encoded = np.empty(batch_shape + (len(MODEL_FEATURE_COLUMNS),), dtype=float)
+    encoded[..., 0:3] = np.nan_to_num(np.asarray(stance_A, dtype=float))
+    encoded[..., 3:6] = np.nan_to_num(np.asarray(stance_B, dtype=float))
+    encoded[..., 6] = np.asarray(is_title_fight, dtype=bool)
+    encoded[..., 7] = np.asarray(is_male_fight, dtype=bool)
+    for offset, weight_class in enumerate(MATCHUP_WEIGHT_CLASSES):
+        encoded[..., 8 + offset] = weight_classes == weight_class
+    encoded[..., 16:] = diffs
+
+    return encoded
+
+
+def fighter_feature_arrays(agg_data, attr_data):
+    """
+    Collects each fighter's numerical features and stance indicators into arrays for encode_matchups.
+
+    Parameters:
+    agg_data (pd.DataFrame): Aggregated fighter features with 'fighter_id', 'name' and 'weight_class' columns.
+    attr_data (pd.DataFrame): Fighter attributes with 'fighter_id' and the stance indicator columns.
+
+    Returns:
+    tuple: A DataFrame of (name, weight_class) keys, the matching (n, 36) numerical array and
+           the matching (n, 3) stance array.
+    """
+    features = agg_data.drop_duplicates(['name', 'weight_class']).reset_index(drop=True)
+    for col in MATCHUP_NUMERICAL_COLUMNS:
+        if col not in features.columns:
+            features = features.assign(**{col: 0})
+
+    stances = attr_data.drop_duplicates('fighter_id')[['fighter_id'] + MATCHUP_STANCE_COLUMNS]
+    features = features.merge(stances, how='left', on='fighter_id')
+
+    keys = features[['name', 'weight_class']]
+    numerical = features[MATCHUP_NUMERICAL_COLUMNS].fillna(0).to_numpy(dtype=float)
+    stance = features[MATCHUP_STANCE_COLUMNS].fillna(0).to_numpy(dtype=float)
+
+    return keys, numerical, stance
+
+
+def normalize_names(names):
+    """
+    Lowercases fighter names and collapses their whitespace, for lookups that ignore both.
+
+    Parameters:
+    names (pd.Series): The fighter names.
+
+    Returns:
+    pd.Series: The normalized names.
+    """
+    return names.astype(str).str.lower().str.split().str.join(' ')
+
+
+def build_matchup_features(agg_data, attr_data, matchups):
+    """
+    Builds the model input for many matchups at once. Each fighter's features are looked up with
+    a single merge per side and the differences are computed on whole columns, so the result has
+    one row per matchup in the MODEL_FEATURE_COLUMNS layout produced by prepare_fight_data_pairs.
+
+    Parameters:
+    agg_data (pd.DataFrame): Aggregated fighter features with 'fighter_id', 'name' and 'weight_class'
+                             columns, such as the output of engineer_fight_stats or the feature
+                             store's fighter_features table.
+    attr_data (pd.DataFrame): Fighter attributes with 'fighter_id' and the stance indicator columns.
+    matchups (list): A list of fight dictionaries with 'fighter_1', 'fighter_2', 'weight_class',
+                     'is_title_fight' and 'is_male_fight' keys. Names match regardless of case
+                     and spacing.
+
+    Returns:
+    pd.DataFrame: A DataFrame with one row per matchup whose fighters both have features in the
+                  weight class, indexed by the matchup's position in matchups. Matchups with a
+                  fighter missing from the weight class are left out rather than scored on zeros.
+    """
+    keys, numerical, stance = fighter_feature_arrays(agg_data, attr_data)
+    # Names are matched ignoring case and spacing, as prediction_cache.normalize_matchup keys them,
+    # so that every request sharing a cache key is scored on the same fighter's features
+    keys = keys.assign(name=normalize_names(keys['name']), position=np.arange(len(keys))) \
+        .drop_duplicates(['name', 'weight_class'])
+
+    matchup_df = pd.DataFrame({
+        'fighter_1': normalize_names(pd.Series([fight['fighter_1'] for fight in matchups], dtype=object)),
+        'fighter_2': normalize_names(pd.Series([fight['fighter_2'] for fight in matchups], dtype=object)),
+        'weight_class': [fight['weight_class'].lower().replace(' ', '_') for fight in matchups],
+    })
+
+    # Look up each side's row in the feature arrays
+    positions = {}
+    for side, fighter_col in [('A', 'fighter_1'), ('B', 'fighter_2')]:
+        side_df = matchup_df.merge(keys, how='left', left_on=[fighter_col, 'weight_class'],
+                                   right_on=['name', 'weight_class'])
+        positions[side] = side_df['position'].to_numpy()
+    found = ~(np.isnan(positions['A']) | np.isnan(positions['B']))
+    rows_A, rows_B = positions['A'][found].astype(int), positions['B'][found].astype(int)
+
+    encoded = encode_matchups(
+        numerical[rows_A], numerical[rows_B], stance[rows_A], stance[rows_B],
+        matchup_df['weight_class'].to_numpy()[found],
+        np.array([bool(fight.get('is_title_fight')) for fight in matchups], dtype=bool)[found],
+        np.array([bool(fight.get('is_male_fight')) for fight in matchups], dtype=bool)[found]
+    )
+
+    return pd.DataFrame(encoded, columns=MODEL_FEATURE_COLUMNS, index=np.flatnonzero(found))
+
+
+@traced('build_training_set')
+def build_training_set(fight_features, symmetric=False, output_path=None, include_keys=False):
+    """
+    Builds the pairwise training matrix for the model from the fight-level features in the
+    feature store. Both fighters' rows for a fight are matched with a self-join on the fight_id
+    key, and the result has the TRAINING_KEY_COLUMNS and a 'target' column followed by
+    MODEL_FEATURE_COLUMNS, the layout of cleaned_data_ml.csv.
+
+    Parameters:
+    fight_features (pd.DataFrame): The fight-level features from build_fight_features.
+    symmetric (bool): If True, every fight appears twice, once from each fighter's side with
+                      the target flipped. Otherwise each fight appears once, with fighter A being
+                      the fighter whose name sorts first.
+    output_path (str): If given, the training matrix is also written to this CSV path.
+    include_keys (bool): If True, the matrix starts with the 'event' and 'date' of each fight,
+                         e.g. for splitting it in time order.
+
+    Returns:
+    pd.DataFrame: The training matrix.
+    """
+    fights = fight_features.reset_index(drop=True)
+
+    numerical_columns = [
+        'wins', 'losses', 'fight_age', 'height_inches', 'reach_inches', 'knockdowns',
+        'significant_strikes_landed', 'significant_strikes_thrown', 'total_strikes_landed',
+        'total_strikes_thrown', 'takedowns_landed', 'takedowns_thrown', 'head_strikes_landed',
+        'head_strikes_thrown', 'body_strikes_landed', 'body_strikes_thrown', 'leg_strikes_landed',
+        'leg_strikes_thrown', 'distance_strikes_landed', 'distance_strikes_thrown',
+        'clinch_strikes_landed', 'clinch_strikes_thrown', 'ground_strikes_landed',
+        'ground_strikes_thrown', 'strike_accuracy', 'sig_strike_accuracy', 'takedown_accuracy',
+        'head_strike_ratio', 'body_strike_ratio', 'leg_strike_ratio', 'fight_duration', 'win_rate',
+        'knockdown_percentage', 'ko_rate', 'submission_rate', 'finish_rate'
     ]
+    side_columns = ['fight_id', 'fighter_id', 'event', 'name', 'date', 'Fighter_1', 'Fighter_2', 'result', 'stance',
+                    'is_title_fight', 'is_male_fight', 'weight_class'] + numerical_columns
 
-    final_model_df = final_model_df[desired_columns]
-    return final_model_df
+    fighter_A_df = fights[side_columns].add_prefix('fighter_A_').rename(columns={'fighter_A_fight_id': 'fight_id'})
+    fighter_B_df = fights[side_columns].add_prefix('fighter_B_').rename(columns={'fighter_B_fight_id': 'fight_id'})
+
+    merged_df = fighter_A_df.merge(fighter_B_df, on='fight_id', how='inner')
+    merged_df = merged_df[merged_df['fighter_A_fighter_id'] != merged_df['fighter_B_fighter_id']]
+    if not symmetric:
+        merged_df = merged_df[merged_df['fighter_A_Fighter_1'] <= merged_df['fighter_A_Fighter_2']]
+
+    merged_df = merged_df.sort_values(['fighter_A_date', 'fight_id', 'fighter_A_fighter_id'], kind='stable')
+    merged_df = merged_df.reset_index(drop=True)
+
+    training_df = pd.DataFrame({'target': (merged_df['fighter_A_result'] == 'win').astype(int)})
+
+    for side in ['A', 'B']:
+        for stance in ['Orthodox', 'Southpaw', 'Switch']:
+            training_df[f'fighter_{side}_stance_{stance}'] = (merged_df[f'fighter_{side}_stance'] == stance).astype(int)
+
+    training_df['is_title_fight_True'] = merged_df['fighter_A_is_title_fight'].astype(bool).astype(int)
+    training_df['is_male_fight_True'] = merged_df['fighter_A_is_male_fight'].astype(bool).astype(int)
+
+    for column in MODEL_FEATURE_COLUMNS:
+        if column.startswith('weight_class_'):
+            weight_class = column[len('weight_class_'):]
+            training_df[column] = (merged_df['fighter_A_weight_class'] == weight_class).astype(int)
+
+    diffs = merged_df[[f'fighter_A_{col}' for col in numerical_columns]].to_numpy(dtype=float) - \
+        merged_df[[f'fighter_B_{col}' for col in numerical_columns]].to_numpy(dtype=float)
+    diff_df = pd.DataFrame(diffs, columns=[f'diff_{col}' for col in numerical_columns])
+    training_df = pd.concat([training_df, diff_df], axis=1)
+
+    training_df = training_df[['target'] + MODEL_FEATURE_COLUMNS]
+    training_df.insert(0, 'fighter_A_id', merged_df['fighter_A_fighter_id'])
+    training_df.insert(0, 'fight_id', merged_df['fight_id'])
+    if include_keys:
+        training_df.insert(0, 'date', merged_df['fighter_A_date'])
+        training_df.insert(0, 'event', merged_df['fighter_A_event'])
+
+    if output_path:
+        training_df.to_csv(output_path, index=False)
+
+    return training_df
+
+
+def build_training_data(output_path=TRAINING_DATA_PATH, symmetric=False, point_in_time=False,
+                        store_dir=FEATURE_STORE_DIR):
+    """
+    Builds the model training data from the feature store and writes it to a CSV.
+
+    Parameters:
+    output_path (str): The CSV path to write the training matrix to.
+    symmetric (bool): If True, every fight appears once from each fighter's side.
+    point_in_time (bool): If True, each fighter's features are taken from the snapshots as they
+                          were before every fight instead of the fight rows' own cumulative values.
+    store_dir (str): The feature store directory.
+
+    Returns:
+    pd.DataFrame: The training matrix.
+    """
+    feature_store = load_feature_store(store_dir)
+    fight_features = feature_store['fight_features']
+    if point_in_time:
+        fight_features = point_in_time_fight_features(fight_features,
+                                                      FeatureSnapshotIndex.from_feature_store(feature_store))
+    return build_training_set(fight_features, symmetric, output_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the feature store and the model training data.')
+    parser.add_argument('--memory-profile', default=None,
+                        help='Profile the memory of every step and write the report to this JSON file.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    features_parser = subparsers.add_parser('features', help='Build the feature store from the raw scraped data.')
+    features_parser.add_argument('raw_path', nargs='?', default=RAW_DATA_PATH)
+    features_parser.add_argument('--chunk-rows', type=int, default=None,
+                                 help='Stream the raw file in fighter-partitioned chunks of about this many rows.')
+    features_parser.add_argument('--jobs', type=int, default=1,
+                                 help='Number of worker processes for per-fighter feature engineering.')
+
+    training_parser = subparsers.add_parser('training', help='Build the model training data from the feature store.')
+    training_parser.add_argument('--output', default=TRAINING_DATA_PATH)
+    training_parser.add_argument('--symmetric', action='store_true',
+                                 help='Add a swapped A/B row with a flipped target for every fight.')
+    training_parser.add_argument('--point-in-time', action='store_true',
+                                 help='Use each fighter\'s features as of before every fight from the snapshots.')
+
+    args = parser.parse_args()
+
+    tracer = start_tracing(memory=True) if args.memory_profile else None
+    try:
+        if args.command == 'features':
+            build_feature_store(args.raw_path, chunk_rows=args.chunk_rows, n_jobs=args.jobs)
+            print(f"Feature store written to '{FEATURE_STORE_DIR}'")
+        else:
+            training_data = build_training_data(args.output, args.symmetric, args.point_in_time)
+            print(f"Training data with {len(training_data)} rows saved to '{args.output}'")
+    finally:
+        if tracer:
+            stop_tracing()
+            tracer.export(args.memory_profile, 'memory')
+            tracer.print_summary()
+            print(f"Memory profile written to '{args.memory_profile}'")
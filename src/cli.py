@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Every subcommand imports the modules it needs when it runs, so that `--help` and predictions
+# answered from the prediction cache never import pandas, sklearn, xgboost, requests or bs4
+HEAVY_MODULES = ['pandas', 'sklearn', 'xgboost', 'requests', 'bs4']
+
+
+def crawl(args):
+    from scrape_metrics import METRICS_PATH
+    from scrape_run import RAW_DATA_PATH, crawl as run_crawl
+    run_crawl(args.output or RAW_DATA_PATH, args.metrics_file or METRICS_PATH, args.metrics_port)
+
+
+def build_features(args):
+    from clean_data_fighters import FEATURE_STORE_DIR, RAW_DATA_PATH, TRAINING_DATA_PATH, build_feature_store, \
+        build_training_data
+    build_feature_store(args.raw_path or RAW_DATA_PATH, chunk_rows=args.chunk_rows, n_jobs=args.jobs)
+    print(f"Feature store written to '{FEATURE_STORE_DIR}'")
+    if not args.skip_training:
+        output_path = args.training_output or TRAINING_DATA_PATH
+        training_data = build_training_data(output_path, args.symmetric, args.point_in_time)
+        print(f"Training data with {len(training_data)} rows saved to '{output_path}'")
+
+
+def train(args):
+    import model_registry
+    if args.list:
+        for version in model_registry.list_versions():
+            metadata = model_registry.load_metadata(version)
+            print(f"{version}  {metadata['created_at']}  {metadata['metrics']}")
+    elif args.update:
+        model_registry.update_model(args.training_path or model_registry.TRAINING_DATA_PATH)
+    else:
+        model_registry.train_and_register(args.training_path or model_registry.TRAINING_DATA_PATH, force=args.force,
+                                          tune=args.tune)
+
+
+def load_fights(args):
+    """
+    Reads the matchups to predict from a card file, or the single matchup given on the command line.
+
+    Returns:
+        list: The fight dictionaries.
+    """
+    if args.fights:
+        from fight_card import load_card
+        return load_card(args.fights)
+    if not (args.fighter_1 and args.fighter_2 and args.weight_class):
+        raise SystemExit("predict needs --fights or all of --fighter-1, --fighter-2 and --weight-class")
+    return [{'fighter_1': args.fighter_1, 'fighter_2': args.fighter_2, 'weight_class': args.weight_class,
+             'is_title_fight': args.title_fight, 'is_male_fight': not args.female}]
+
+
+def predict(args):
+    fights_data = load_fights(args)
+
+    if args.scrape:
+        from model_run import process_fighter_data
+        predictions = process_fighter_data(fights_data, use_cache=not args.no_cache, workers=args.workers)
+    else:
+        from prediction_cache import PREDICTION_CACHE_PATH, PredictionCache, cached_predictions
+        cache = PredictionCache(path=args.cache_path or PREDICTION_CACHE_PATH)
+        predictions = None
+        if not args.no_cache and args.as_of is None:
+            predictions = cached_predictions(fights_data, cache, args.model_version)
+        if predictions is None:
+            from model_run import predict_matchups
+            predictions = predict_matchups(fights_data, model_version=args.model_version,
+                                           use_cache=not args.no_cache, as_of=args.as_of, cache=cache)
+            cache.save()
+
+    for prediction in predictions:
+        print(json.dumps(prediction, default=float))
+    if args.output:
+        from fight_card import write_predictions
+        write_predictions(predictions, args.output)
+        print(f"Predictions written to {args.output}")
+
+
+def serve(args):
+    from prediction_server import FEATURE_STORE_DIR, MAX_CACHED_PREDICTIONS, serve as run_server
+    run_server(args.host, args.port, args.workers, args.store_dir or FEATURE_STORE_DIR, args.model_version,
+               args.compiled, args.cache_size or MAX_CACHED_PREDICTIONS, args.cache_path)
+
+
+def measure_startup(command, repeats=5):
+    """
+    Runs a CLI command in fresh interpreters and measures its cold start.
+
+    Args:
+        command (list): The CLI arguments, e.g. ['predict', '--fights', 'card.json'].
+        repeats (int): The number of runs; the fastest one is reported.
+
+    Returns:
+        dict: The fastest wall time in 'seconds', the module import time Python reported for that
+              run in 'import_seconds', and the heavy modules the command imported.
+    """
+    script = os.path.abspath(__file__)
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-X', 'importtime', script] + command,
+                                   capture_output=True, text=True)
+        seconds = time.perf_counter() - start
+        if completed.returncode != 0:
+            raise RuntimeError(f"{' '.join(command)} failed:\n{completed.stderr[-2000:]}")
+
+        # -X importtime writes 'import time: self [us] | cumulative | package' lines to stderr
+        import_seconds, modules = 0.0, set()
+        for line in completed.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line and 'self [us]' not in line:
+                _, cumulative, module = line[len('import time:'):].split('|')
+                modules.add(module.strip())
+                if not module.startswith(' ' * 2):  # The cumulative time of top-level imports includes the nested ones
+                    import_seconds += int(cumulative) / 1e6
+        runs.append((seconds, import_seconds, modules))
+
+    seconds, import_seconds, modules = min(runs, key=lambda run: run[0])
+    return {'seconds': seconds, 'import_seconds': import_seconds,
+            'heavy_modules': [module for module in HEAVY_MODULES if module in modules]}
+
+
+def bench(args):
+    if args.target == 'startup':
+        commands = [args.args] if args.args else [['--help']]
+        for command in commands:
+            measured = measure_startup(command, args.repeats)
+            print(f"cli.py {' '.join(command)}: {measured['seconds'] * 1000:.0f} ms "
+                  f"({measured['import_seconds'] * 1000:.0f} ms importing), heavy modules: "
+                  f"{', '.join(measured['heavy_modules']) or 'none'}")
+        return
+
+    # The benchmarks keep their own command line, which receives the remaining arguments
+    import runpy
+    module = {'stages': 'benchmark_stages', 'parsers': 'benchmark_parsers'}[args.target]
+    sys.argv = [f'{module}.py'] + args.args
+    runpy.run_module(module, run_name='__main__')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Scrape ufcstats, build features, train the model and predict fights.')
+    parser.add_argument('--trace', default=None, help='Write the timing of every stage to this file.')
+    parser.add_argument('--trace-format', choices=['json', 'chrome'], default='json',
+                        help='json for spans and a per-stage summary, chrome for chrome://tracing or Perfetto.')
+    parser.add_argument('--memory-profile', default=None,
+                        help='Profile the memory of every stage and write the report to this JSON file.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    crawl_parser = subparsers.add_parser('crawl', help='Scrape every fighter on ufcstats.')
+    crawl_parser.add_argument('--output', default=None, help='Defaults to data/combined_fighter_data.csv.')
+    crawl_parser.add_argument('--metrics-file', default=None,
+                              help='Prometheus text file rewritten with the scrape metrics after every fighter.')
+    crawl_parser.add_argument('--metrics-port', type=int, default=None,
+                              help='Also serve the metrics at http://127.0.0.1:<port>/metrics during the crawl.')
+    crawl_parser.set_defaults(handler=crawl)
+
+    features_parser = subparsers.add_parser('build-features',
+                                            help='Build the feature store and the training data from the raw data.')
+    features_parser.add_argument('raw_path', nargs='?', default=None, help='Defaults to data/combined_fighter_data.csv.')
+    features_parser.add_argument('--chunk-rows', type=int, default=None,
+                                 help='Stream the raw file in fighter-partitioned chunks of about this many rows.')
+    features_parser.add_argument('--jobs', type=int, default=1,
+                                 help='Number of worker processes for per-fighter feature engineering.')
+    features_parser.add_argument('--training-output', default=None, help='Defaults to data/cleaned_data_ml.csv.')
+    features_parser.add_argument('--skip-training', action='store_true', help='Only build the feature store.')
+    features_parser.add_argument('--symmetric', action='store_true',
+                                 help='Add a swapped A/B row with a flipped target for every fight.')
+    features_parser.add_argument('--point-in-time', action='store_true',
+                                 help='Use each fighter\'s features as of before every fight from the snapshots.')
+    features_parser.set_defaults(handler=build_features)
+
+    train_parser = subparsers.add_parser('train', help='Train and register a model.')
+    train_parser.add_argument('training_path', nargs='?', default=None, help='Defaults to data/cleaned_data_ml.csv.')
+    train_parser.add_argument('--force', action='store_true', help='Train even if the data has not changed.')
+    train_parser.add_argument('--tune', action='store_true', help='Search the hyperparameters before training.')
+    train_parser.add_argument('--update', action='store_true',
+                              help='Add trees for the new fights to the latest model instead of retraining.')
+    train_parser.add_argument('--list', action='store_true', help='List the registered models.')
+    train_parser.set_defaults(handler=train)
+
+    predict_parser = subparsers.add_parser('predict', help='Predict matchups from the feature store.')
+    predict_parser.add_argument('--fights', default=None,
+                                help='JSON or CSV card with fighter_1, fighter_2, weight_class, is_title_fight '
+                                     'and is_male_fight for every fight.')
+    predict_parser.add_argument('--fighter-1', default=None)
+    predict_parser.add_argument('--fighter-2', default=None)
+    predict_parser.add_argument('--weight-class', default=None)
+    predict_parser.add_argument('--title-fight', action='store_true')
+    predict_parser.add_argument('--female', action='store_true')
+    predict_parser.add_argument('--model-version', default=None)
+    predict_parser.add_argument('--as-of', default=None, help='Use the fighters\' features as of this date.')
+    predict_parser.add_argument('--scrape', action='store_true',
+                                help='Scrape both fighters from ufcstats instead of reading the feature store.')
+    predict_parser.add_argument('--workers', type=int, default=None,
+                                help='Fighters fetched at the same time with --scrape, 4 by default.')
+    predict_parser.add_argument('--output', default=None, help='Also write the predictions to this JSON or CSV file.')
+    predict_parser.add_argument('--no-cache', action='store_true',
+                                help='Ignore the prediction, stage and fighter caches.')
+    predict_parser.add_argument('--cache-path', default=None,
+                                help='The prediction cache kept between runs, data/cache/predictions.pkl by default.')
+    predict_parser.set_defaults(handler=predict)
+
+    serve_parser = subparsers.add_parser('serve', help='Serve predictions over HTTP.')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--workers', type=int, default=8)
+    serve_parser.add_argument('--store-dir', default=None)
+    serve_parser.add_argument('--model-version', default=None)
+    serve_parser.add_argument('--compiled', action='store_true',
+                              help='Score with the compiled numpy tree evaluator instead of xgboost.')
+    serve_parser.add_argument('--cache-size', type=int, default=None)
+    serve_parser.add_argument('--cache-path', default=None,
+                              help='Persist the prediction cache to this file, e.g. ../data/cache/predictions.pkl.')
+    serve_parser.set_defaults(handler=serve)
+
+    bench_parser = subparsers.add_parser(
+        'bench', help='Run a benchmark: stages, parsers, or startup for the cold start of a CLI command.',
+        description='Extra arguments go to benchmark_stages.py or benchmark_parsers.py, or for startup are '
+                    'the CLI command to time, e.g. `bench startup predict --fights card.json`.')
+    bench_parser.add_argument('target', choices=['stages', 'parsers', 'startup'])
+    bench_parser.add_argument('--repeats', type=int, default=5,
+                              help='Runs per command for startup, given before the target.')
+    bench_parser.add_argument('args', nargs=argparse.REMAINDER)
+    bench_parser.set_defaults(handler=bench)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    tracer = None
+    if args.trace or args.memory_profile:
+        from pipeline_trace import start_tracing
+        tracer = start_tracing(memory=bool(args.memory_profile))
+    try:
+        args.handler(args)
+    finally:
+        if tracer:
+            from pipeline_trace import stop_tracing
+            stop_tracing()
+            if args.trace:
+                tracer.export(args.trace, args.trace_format)
+                print(f"Trace written to {args.trace}")
+            if args.memory_profile:
+                tracer.export(args.memory_profile, 'memory')
+                print(f"Memory profile written to {args.memory_profile}")
+            tracer.print_summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import bisect
+
+import numpy as np
+import pandas as pd
+from pipeline_trace import traced
+
+# Per-fight columns that are averaged into a fighter's features, as in aggregate_fighter_features
+SNAPSHOT_COLUMNS = [
+    'height_inches', 'reach_inches', 'knockdowns',
+    'significant_strikes_landed', 'significant_strikes_thrown', 'total_strikes_landed',
+    'total_strikes_thrown', 'takedowns_landed', 'takedowns_thrown', 'head_strikes_landed',
+    'head_strikes_thrown', 'body_strikes_landed', 'body_strikes_thrown', 'leg_strikes_landed',
+    'leg_strikes_thrown', 'distance_strikes_landed', 'distance_strikes_thrown',
+    'clinch_strikes_landed', 'clinch_strikes_thrown', 'ground_strikes_landed',
+    'ground_strikes_thrown', 'strike_accuracy', 'sig_strike_accuracy', 'takedown_accuracy',
+    'head_strike_ratio', 'body_strike_ratio', 'leg_strike_ratio', 'fight_duration', 'win_rate',
+    'knockdown_percentage', 'ko_rate', 'submission_rate', 'finish_rate'
+]
+
+
+def _fighter_names(fight_features):
+    return fight_features.drop_duplicates('fighter_id').set_index('fighter_id')['name']
+
+
+@traced('build_fighter_snapshots')
+def build_fighter_snapshots(fight_features):
+    """
+    Builds each fighter's feature snapshot after every fight date. A snapshot holds the mean of the
+    fighter's fight-level features in the weight class up to and including that date, which is what
+    aggregate_fighter_features would have produced if it had been run on that day.
+
+    Parameters:
+    fight_features (pd.DataFrame): The fight-level features from build_fight_features.
+
+    Returns:
+    pd.DataFrame: One row per fighter, weight class and fight date, sorted by date, with the fighter's
+                  key and name, the averaged SNAPSHOT_COLUMNS and the number of fights averaged.
+    """
+    fights = fight_features[['fighter_id', 'weight_class', 'date'] + SNAPSHOT_COLUMNS].copy()
+    fights['date'] = pd.to_datetime(fights['date'])
+    fights[SNAPSHOT_COLUMNS] = fights[SNAPSHOT_COLUMNS].apply(pd.to_numeric, errors='coerce')
+
+    # Sum every fighter's rows per date first, so a date appears once even with several rows
+    daily = fights.groupby(['fighter_id', 'weight_class', 'date'], sort=True)
+    sums = daily[SNAPSHOT_COLUMNS].sum(min_count=1)
+    counts = daily[SNAPSHOT_COLUMNS].count()
+    fight_counts = daily.size()
+
+    # Running means ignore missing values, like DataFrame.mean
+    group_keys = [sums.index.get_level_values('fighter_id'), sums.index.get_level_values('weight_class')]
+    running_sums = sums.fillna(0).groupby(group_keys).cumsum()
+    running_counts = counts.groupby(group_keys).cumsum()
+    snapshots = running_sums / running_counts.replace(0, np.nan)
+    snapshots['fights'] = fight_counts.groupby(group_keys).cumsum()
+
+    snapshots = snapshots.reset_index()
+    snapshots.insert(1, 'name', snapshots['fighter_id'].map(_fighter_names(fight_features)))
+    return snapshots.sort_values('date', kind='stable').reset_index(drop=True)
+
+
+@traced('build_fighter_records')
+def build_fighter_records(fight_features):
+    """
+    Counts each fighter's wins and losses after every fight date, across all weight classes.
+
+    Parameters:
+    fight_features (pd.DataFrame): The fight-level features from build_fight_features.
+
+    Returns:
+    pd.DataFrame: One row per fighter and fight date, sorted by date, with the fighter's key and
+                  name, 'wins', 'losses' and the fighter's 'DOB'.
+    """
+    results = fight_features[['fighter_id', 'date', 'result']].copy()
+    results['date'] = pd.to_datetime(results['date'])
+    results['wins'] = (results['result'] == 'win').astype(int)
+    results['losses'] = (results['result'] == 'loss').astype(int)
+
+    records = results.groupby(['fighter_id', 'date'], sort=True)[['wins', 'losses']].sum()
+    records = records.groupby(level='fighter_id').cumsum().reset_index()
+    records.insert(1, 'name', records['fighter_id'].map(_fighter_names(fight_features)))
+
+    if 'DOB' in fight_features.columns:
+        birth_dates = fight_features.drop_duplicates('fighter_id').set_index('fighter_id')['DOB']
+        records['DOB'] = pd.to_datetime(records['fighter_id'].map(birth_dates), errors='coerce')
+    else:
+        records['DOB'] = pd.NaT
+
+    return records.sort_values('date', kind='stable').reset_index(drop=True)
+
+
+class FeatureSnapshotIndex:
+    """
+    Each fighter's feature snapshots and record after every fight, sorted by date, answering
+    "what did this fighter look like before date D" without recomputing any features. Single
+    lookups use a binary search over the fighter's dates and whole frames are joined with
+    merge_asof. Fighters are indexed by their fighter_id key; single lookups by name go through
+    the key of the fighter with that name.
+    """
+
+    def __init__(self, snapshots, records):
+        self.snapshots = snapshots.assign(date=pd.to_datetime(snapshots['date'])) \
+            .sort_values('date', kind='stable').reset_index(drop=True)
+        self.records = records.assign(date=pd.to_datetime(records['date']), DOB=pd.to_datetime(records['DOB'])) \
+            .sort_values('date', kind='stable').reset_index(drop=True)
+
+        # Per fighter, the sorted dates as nanosecond integers and the matching row positions
+        snapshot_dates = self.snapshots['date'].to_numpy(dtype='datetime64[ns]').astype('int64')
+        self._snapshot_dates = {
+            key: (snapshot_dates[positions].tolist(), positions)
+            for key, positions in self.snapshots.groupby(['fighter_id', 'weight_class'], sort=False).indices.items()
+        }
+        record_dates = self.records['date'].to_numpy(dtype='datetime64[ns]').astype('int64')
+        self._record_dates = {
+            fighter_id: (record_dates[positions].tolist(), positions)
+            for fighter_id, positions in self.records.groupby('fighter_id', sort=False).indices.items()
+        }
+        self._fighter_ids = dict(zip(self.records['name'], self.records['fighter_id']))
+        self._snapshot_values = self.snapshots[SNAPSHOT_COLUMNS + ['fights']].to_numpy(dtype=float)
+        self._record_values = self.records[['wins', 'losses']].to_numpy(dtype=float)
+        self._birth_dates = self.records['DOB'].tolist()
+
+    @classmethod
+    def from_fight_features(cls, fight_features):
+        return cls(build_fighter_snapshots(fight_features), build_fighter_records(fight_features))
+
+    @classmethod
+    def from_feature_store(cls, feature_store):
+        return cls(feature_store['fighter_snapshots'], feature_store['fighter_records'])
+
+    def as_of(self, name, weight_class, date, inclusive=False):
+        """
+        Looks up a fighter's features before a date with a binary search.
+
+        Args:
+            name (str): The fighter's name.
+            weight_class (str): The normalized weight class, e.g. 'lightweight'.
+            date: The date to look up, as anything pd.Timestamp accepts.
+            inclusive (bool): If True, a fight on the date itself is included.
+
+        Returns:
+            dict: The SNAPSHOT_COLUMNS, the number of fights, 'wins', 'losses' and 'current_age' as
+                  of the date, or None if the fighter had no fight in the weight class before it.
+        """
+        date = pd.Timestamp(date)
+        target = date.as_unit('ns').value
+        search = bisect.bisect_right if inclusive else bisect.bisect_left
+
+        fighter_id = self._fighter_ids.get(name)
+        dates, positions = self._snapshot_dates.get((fighter_id, weight_class), ([], None))
+        index = search(dates, target) - 1
+        if index < 0:
+            return None
+        features = dict(zip(SNAPSHOT_COLUMNS + ['fights'], self._snapshot_values[positions[index]]))
+
+        dates, positions = self._record_dates.get(fighter_id, ([], None))
+        index = search(dates, target) - 1
+        if index >= 0:
+            features['wins'], features['losses'] = self._record_values[positions[index]]
+            birth_date = self._birth_dates[positions[index]]
+        else:
+            features['wins'], features['losses'] = 0.0, 0.0
+            birth_date = pd.NaT
+        features['current_age'] = float((date - birth_date).days // 365) if pd.notna(birth_date) else np.nan
+
+        return features
+
+    def as_of_join(self, frame, inclusive=False):
+        """
+        Attaches every row's features as of its date with a vectorized as-of join.
+
+        Args:
+            frame (pd.DataFrame): Rows with 'fighter_id', 'weight_class' and 'date' columns.
+            inclusive (bool): If True, a fight on the row's date itself is included.
+
+        Returns:
+            pd.DataFrame: The rows in their original order with the SNAPSHOT_COLUMNS, 'fights',
+                          'wins', 'losses' and 'current_age' as of each row's date. Rows without
+                          an earlier fight have NaN features and 0 fights.
+        """
+        rows = frame.drop(columns=SNAPSHOT_COLUMNS + ['fights', 'wins', 'losses', 'current_age'], errors='ignore')
+        rows = rows.assign(date=pd.to_datetime(rows['date'])).reset_index(drop=True)
+        rows['_row_position'] = np.arange(len(rows))
+        rows = rows.sort_values('date', kind='stable')
+
+        rows = pd.merge_asof(rows, self.snapshots.drop(columns='name'), on='date', by=['fighter_id', 'weight_class'],
+                             allow_exact_matches=inclusive)
+        rows = pd.merge_asof(rows, self.records.drop(columns='name').rename(columns={'DOB': '_birth_date'}), on='date',
+                             by='fighter_id', allow_exact_matches=inclusive)
+        rows['fights'] = rows['fights'].fillna(0)
+        rows[['wins', 'losses']] = rows[['wins', 'losses']].fillna(0)
+        rows['current_age'] = (rows['date'] - rows['_birth_date']).dt.days // 365
+        rows = rows.drop(columns='_birth_date')
+
+        return rows.sort_values('_row_position').drop(columns='_row_position').set_index(frame.index)
+
+    def fighter_features_as_of(self, date, inclusive=False):
+        """
+        Builds every fighter's features as of a date, in the layout of aggregate_fighter_features,
+        e.g. for predicting a historical matchup with build_matchup_features.
+
+        Args:
+            date: The date to look up.
+            inclusive (bool): If True, fights on the date itself are included.
+
+        Returns:
+            pd.DataFrame: One row per fighter and weight class with a fight before the date.
+        """
+        keys = self.snapshots[['fighter_id', 'name', 'weight_class']].drop_duplicates(['fighter_id', 'weight_class']) \
+            .assign(date=pd.Timestamp(date))
+        features = self.as_of_join(keys, inclusive)
+        return features[features['fights'] > 0].drop(columns=['date', 'fights']).reset_index(drop=True)
+
+
+@traced('point_in_time_fight_features')
+def point_in_time_fight_features(fight_features, snapshot_index=None):
+    """
+    Replaces the fighter features on every fight row with the values known before the fight: the
+    fighter's snapshot and record as of the previous fight date, looked up with an as-of join. The
+    profile record and the current fight's own statistics therefore never leak into its row.
+    Fights where the fighter has no earlier fight in the weight class are dropped.
+
+    Parameters:
+    fight_features (pd.DataFrame): The fight-level features from build_fight_features.
+    snapshot_index (FeatureSnapshotIndex): The snapshots to read, e.g. from the feature store. Built
+                                           from fight_features when not given.
+
+    Returns:
+    pd.DataFrame: The fight rows with point-in-time features, in the layout build_training_set expects.
+    """
+    if snapshot_index is None:
+        snapshot_index = FeatureSnapshotIndex.from_fight_features(fight_features)
+
+    fights = snapshot_index.as_of_join(fight_features.drop(columns=['wins', 'losses'], errors='ignore'))
+    fights = fights[fights['fights'] > 0].drop(columns=['fights', 'current_age'])
+
+    return fights.reset_index(drop=True)
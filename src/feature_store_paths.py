@@ -0,0 +1,5 @@
+# The feature store's location and tables, kept apart from clean_data_fighters so that modules
+# which only need to find the store, such as prediction_cache, do not import pandas
+FEATURE_STORE_DIR = '../data/feature_store'
+FEATURE_STORE_TABLES = ['fight_features', 'fighter_features', 'fighter_attributes', 'fighter_snapshots',
+                        'fighter_records']
@@ -0,0 +1,71 @@
+import csv
+import json
+import os
+
+from prediction_cache import parse_flag
+
+CARD_COLUMNS = ['fighter_1', 'fighter_2', 'weight_class', 'is_title_fight', 'is_male_fight']
+
+
+def _parse_fight(fight, position):
+    missing = [key for key in ['fighter_1', 'fighter_2', 'weight_class'] if not str(fight.get(key) or '').strip()]
+    if missing:
+        raise ValueError(f"Fight {position} of the card is missing {', '.join(missing)}")
+    return {
+        'fighter_1': str(fight['fighter_1']).strip(),
+        'fighter_2': str(fight['fighter_2']).strip(),
+        'weight_class': str(fight['weight_class']).strip(),
+        'is_title_fight': parse_flag(fight.get('is_title_fight', False)),
+        'is_male_fight': parse_flag(fight.get('is_male_fight', True)),
+    }
+
+
+def load_card(path):
+    """
+    Reads an event card from a JSON or CSV file. A JSON card is a list of fights or an object with
+    a 'fights' list; a CSV card has one fight per row under a header. Each fight has 'fighter_1',
+    'fighter_2' and 'weight_class', and optionally 'is_title_fight' (default false) and
+    'is_male_fight' (default true).
+
+    Args:
+        path (str): The card file, read as CSV if it ends in .csv and as JSON otherwise.
+
+    Returns:
+        list: The fight dictionaries in card order.
+
+    Raises:
+        ValueError: If a fight is missing a fighter or the weight class.
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, newline='') as file:
+            fights = list(csv.DictReader(file))
+    else:
+        with open(path) as file:
+            fights = json.load(file)
+        if isinstance(fights, dict):
+            fights = fights.get('fights', [fights])
+    return [_parse_fight(fight, position) for position, fight in enumerate(fights, start=1)]
+
+
+def write_predictions(predictions, path):
+    """
+    Writes a card's predictions to a JSON or CSV file.
+
+    Args:
+        predictions (list): The predictions from format_predictions.
+        path (str): The file to write, as CSV if it ends in .csv and as JSON otherwise.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # The win probabilities arrive as numpy floats, or None for a fight without data
+    rows = [{key: float(value) if key.endswith('_pct_winning') and value is not None else value
+             for key, value in prediction.items()}
+            for prediction in predictions]
+    if path.lower().endswith('.csv'):
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=['fight', 'predicted_winner', 'fighter_A_pct_winning',
+                                                      'fighter_B_pct_winning'])
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w') as file:
+            json.dump(rows, file, indent=2)
@@ -0,0 +1,115 @@
+import os
+import sys
+
+import pandas as pd
+
+from scrape_metrics import record_cache
+from stage_cache import code_version, evict_stage_cache
+
+FIGHTER_CACHE_DIR = '../data/cache/fighters'
+MAX_CACHED_FIGHTERS = 8192
+MAX_FIGHTER_CACHE_BYTES = 1024 ** 3
+RECORD_FIELDS = ['Wins', 'Losses', 'Draws', 'No Contests']
+
+
+def fighter_id(fighter_url):
+    """
+    Gets the ufcstats ID of a fighter from their profile URL.
+
+    Args:
+        fighter_url (str): The URL of the fighter's profile page, ending in /fighter-details/<id>.
+
+    Returns:
+        str: The fighter's ID.
+    """
+    return fighter_url.rstrip('/').rsplit('/', 1)[-1]
+
+
+def fighter_record(stats):
+    """
+    Reads the record a fighter's cached history is validated against.
+
+    Args:
+        stats (dict): The fighter's basic stats, or the partial record listed in the fighter directory.
+
+    Returns:
+        dict: The record fields present in stats.
+    """
+    return {field: int(stats[field]) for field in RECORD_FIELDS if field in stats}
+
+
+def _cache_path(fighter_id, cache_dir):
+    return os.path.join(cache_dir, f'{fighter_id}.pkl')
+
+
+def load_fighter_history(fighter_id, record, scraper, cache_dir=FIGHTER_CACHE_DIR):
+    """
+    Loads a fighter's compiled fight data from the cache, if it was scraped while the fighter had the
+    same record. A new fight always changes the record, so a matching record means nothing on the
+    fighter's pages has changed. The fighter directory lists wins, losses and draws only, so a record
+    from the directory misses a fighter whose only new fight is a no contest.
+
+    Args:
+        fighter_id (str): The fighter's ufcstats ID.
+        record (dict): The fighter's current record from fighter_record, or None to skip the lookup.
+        scraper (callable): The function compiling the data; editing its module invalidates the cache.
+        cache_dir (str): The directory holding the cached fighters.
+
+    Returns:
+        pd.DataFrame: The cached fight data, or None on a miss.
+    """
+    if not record:
+        return None
+
+    path = _cache_path(fighter_id, cache_dir)
+    entry = None
+    if os.path.exists(path):
+        try:
+            entry = pd.read_pickle(path)
+        except Exception as e:
+            print(f"Failed to read cached fighter {fighter_id}: {e}")
+
+    hit = (entry is not None and entry['code_version'] == code_version(scraper)
+           and all(entry['record'].get(field) == value for field, value in record.items()))
+    record_cache('fighter_history', hit)
+    if not hit:
+        return None
+
+    os.utime(path)  # Mark as recently used for LRU eviction
+    print(f"Loaded fighter {fighter_id} from cache.")
+    return entry['data']
+
+
+def save_fighter_history(fighter_id, record, data, scraper, cache_dir=FIGHTER_CACHE_DIR):
+    """
+    Caches a fighter's compiled fight data together with the record it was scraped at.
+
+    Args:
+        fighter_id (str): The fighter's ufcstats ID.
+        record (dict): The fighter's full record from fighter_record.
+        data (pd.DataFrame): The fighter's compiled fight data.
+        scraper (callable): The function that compiled the data.
+        cache_dir (str): The directory holding the cached fighters.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(fighter_id, cache_dir)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    pd.to_pickle({'record': record, 'code_version': code_version(scraper), 'data': data}, temp_path)
+    os.replace(temp_path, path)
+    evict_stage_cache(cache_dir, MAX_CACHED_FIGHTERS, MAX_FIGHTER_CACHE_BYTES)
+
+
+def clear_fighter_cache(cache_dir=FIGHTER_CACHE_DIR):
+    """
+    Removes every cached fighter.
+
+    Args:
+        cache_dir (str): The directory holding the cached fighters.
+    """
+    evict_stage_cache(cache_dir, max_entries=0)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'clear':
+        clear_fighter_cache()
+        print("Fighter cache cleared.")
@@ -2,17 +2,28 @@ import pandas as pd
 import time
 from scrape_fighters import get_all_fighter_urls
 from scrape_basic_stats import get_fighter_basic_stats
-from scrape_fight_urls import get_fight_urls
+from scrape_fight_urls import extract_fight_urls
 from scrape_fight_dates import fetch_webpage, extract_fight_dates_and_results
 from scrape_fight_round_details import fight_details
+from surrogate_keys import surrogate_key
+from fighter_cache import fighter_id, fighter_record, load_fighter_history, save_fighter_history
+from pipeline_trace import span
 
+# The ufcstats fighter directory, fetched by get_fighter_directory the first time it is needed, and
+# the wins, losses and draws it lists for each fighter keyed by profile URL
+_FIGHTER_DIRECTORY = None
+_FIGHTER_RECORDS = {}
 
-def fighter_stats(fighter_url):
+
+def fighter_stats(fighter_url, use_cache=True):
     """
-    Fetches and compiles fight statistics for a given fighter URL.
+    Fetches and compiles fight statistics for a given fighter URL. With use_cache, the profile page
+    is fetched first and, if the fighter's record is unchanged since they were last compiled, the
+    cached statistics are returned without fetching the fight pages.
 
     Args:
         fighter_url (str): The URL of the fighter's profile page.
+        use_cache (bool): Whether to use the fighter cache.
 
     Returns:
         pd.DataFrame: A DataFrame containing fight statistics for the fighter.
@@ -20,22 +31,34 @@ def fighter_stats(fighter_url):
     all_fighter_stats = []
     all_fight_dates = []
     combined_fighter_round_df = pd.DataFrame()
+    unparsed_urls = {}
+    complete = False
 
     try:
-        stats = get_fighter_basic_stats(fighter_url)
+        with span('basic_stats'):
+            stats = get_fighter_basic_stats(fighter_url)
+        if use_cache and stats['Name'] != 'Unknown':
+            cached_data = load_fighter_history(fighter_id(fighter_url), fighter_record(stats), fighter_stats)
+            if cached_data is not None:
+                return cached_data
+        stats['Fighter ID'] = surrogate_key(fighter_url, stats['Name'])
         all_fighter_stats.append(stats)
 
-        html_content = fetch_webpage(fighter_url)
-        if html_content:
-            fight_dates = extract_fight_dates_and_results(html_content)
-            for fight in fight_dates:
-                fight['Name'] = stats['Name']  # Add fighter name to each fight date
-            all_fight_dates.extend(fight_dates)
+        with span('fight_dates'):
+            html_content = fetch_webpage(fighter_url)
+            if html_content:
+                fight_dates = extract_fight_dates_and_results(html_content)
+                all_fight_dates.extend(fight_dates)
 
-        fight_urls = get_fight_urls(fighter_url)
-        fighter_round_df = fight_details(fight_urls, stats['Name'])
+        # The fight URLs are listed on the same page as the fight dates
+        with span('fight_urls'):
+            fight_urls = extract_fight_urls(html_content) if html_content else []
+        with span('fight_details') as record:
+            fighter_round_df = fight_details(fight_urls, stats['Name'], stats['Fighter ID'], unparsed_urls)
+            record.set_rows(len(fighter_round_df))
 
         combined_fighter_round_df = pd.concat([combined_fighter_round_df, fighter_round_df], ignore_index=True)
+        complete = stats['Name'] != 'Unknown' and bool(html_content)
     except Exception as e:
         print(f"Failed to process data for fighter: {e}")
 
@@ -43,13 +66,41 @@ def fighter_stats(fighter_url):
     df_fighter_stats = pd.DataFrame(all_fighter_stats)
     df_fight_dates = pd.DataFrame(all_fight_dates)
 
-    # Merge the DataFrames to get the final combined data
-    final_combined_df = combined_fighter_round_df.merge(df_fighter_stats, on='Name', how='inner')
-    final_combined_df = final_combined_df.merge(df_fight_dates, on=['Event', 'Name'], how='inner')
+    # Merge the DataFrames on the fighter and fight keys to get the final combined data
+    final_combined_df = combined_fighter_round_df.merge(df_fighter_stats.drop(columns='Name'), on='Fighter ID',
+                                                        how='inner')
+    final_combined_df = final_combined_df.merge(df_fight_dates.drop(columns=['Event', 'Event ID']), on='Fight ID',
+                                                how='inner')
+
+    # A fighter whose pages failed part way is scraped again next time instead of being cached
+    if use_cache and complete and is_complete_history(final_combined_df, all_fight_dates, unparsed_urls):
+        save_fighter_history(fighter_id(fighter_url), fighter_record(stats), final_combined_df, fighter_stats)
 
     return final_combined_df
 
 
+def is_complete_history(fighter_data, fight_dates, unparsed_urls):
+    """
+    Checks that a fighter's compiled fight data holds every UFC fight in their fight history, so
+    that it can be cached.
+
+    Args:
+        fighter_data (pd.DataFrame): The fighter's compiled fight data.
+        fight_dates (list): The fights listed on the fighter's page, from extract_fight_dates_and_results.
+        unparsed_urls (dict): The fight URLs that produced no rows, filled by fight_details.
+
+    Returns:
+        bool: True if every fight page was fetched and parsed, and every UFC fight that has round
+              stats is in fighter_data.
+    """
+    if any(reason != 'no round stats' for reason in unparsed_urls.values()):
+        return False
+    # Upcoming fights and old fights without per-round tables have no rows
+    without_rounds = {surrogate_key(url, url) for url in unparsed_urls}
+    expected_fights = {fight['Fight ID'] for fight in fight_dates if fight['Result'] != 'next'} - without_rounds
+    return fighter_data['Fight ID'].nunique() == len(expected_fights)
+
+
 def standardize_name(name):
     """
     Standardizes the fighter name to match the format used on the UFC stats website.
@@ -63,47 +114,107 @@ def standardize_name(name):
     return ' '.join(word.capitalize() for word in name.split())
 
 
-def fetch_specific_fighter_data(fighter_names):
+def get_fighter_directory():
+    """
+    Gets the URLs of every fighter on ufcstats. The directory is 26 pages, so it is fetched once per
+    process and shared by every fighter looked up afterwards.
+
+    Returns:
+        dict: A dictionary with fighter names as keys and their profile URLs as values.
+    """
+    global _FIGHTER_DIRECTORY
+    if not _FIGHTER_DIRECTORY:  # Also retries a directory that failed to load
+        base_url = 'http://ufcstats.com/statistics/fighters'
+        with span('fighter_directory'):
+            _FIGHTER_DIRECTORY = get_all_fighter_urls(base_url, _FIGHTER_RECORDS)
+    return _FIGHTER_DIRECTORY
+
+
+def find_fighter_url(fighter_name, all_fighter_urls):
+    """
+    Looks up a fighter's profile URL by name, first with the name standardized and then as given.
+
+    Args:
+        fighter_name (str): The fighter's name.
+        all_fighter_urls (dict): The fighter directory from get_fighter_directory.
+
+    Returns:
+        str: The fighter's profile URL, or None if the fighter is not in the directory.
+    """
+    # First attempt with the standardized name
+    standardized_name = standardize_name(fighter_name)
+    fighter_url = all_fighter_urls.get(standardized_name)
+
+    # If not found, try the original user input name
+    if not fighter_url:
+        print(f"Standardized name '{standardized_name}' not found. Trying original input '{fighter_name}'.")
+        fighter_url = all_fighter_urls.get(fighter_name)
+
+    if not fighter_url:
+        print(f"URL for '{fighter_name}' not found even with the original input. Skipping...")
+    return fighter_url
+
+
+def fetch_fighter_data(fighter_name, all_fighter_urls=None, use_cache=True):
+    """
+    Fetches the fight data of one fighter by name. With use_cache, a fighter whose record in the
+    fighter directory matches their cached data is answered without any request, and any other
+    fighter is checked against the cache with a single profile fetch by fighter_stats.
+
+    Args:
+        fighter_name (str): The fighter's name.
+        all_fighter_urls (dict): The fighter directory, or None to use get_fighter_directory.
+        use_cache (bool): Whether to use the fighter cache.
+
+    Returns:
+        pd.DataFrame: The fighter's fight data, or None if the fighter was not found or could not be fetched.
+    """
+    if all_fighter_urls is None:
+        all_fighter_urls = get_fighter_directory()
+    fighter_url = find_fighter_url(fighter_name, all_fighter_urls)
+    if not fighter_url:
+        return None
+
+    if use_cache:
+        fighter_data = load_fighter_history(fighter_id(fighter_url), _FIGHTER_RECORDS.get(fighter_url), fighter_stats)
+        if fighter_data is not None:
+            return fighter_data
+
+    print(f"Fetching data for {fighter_name} using URL: {fighter_url}")
+    fighter_data = None
+    try:
+        with span('fighter_stats', fighter=fighter_name) as record:
+            fighter_data = fighter_stats(fighter_url, use_cache)
+            record.set_rows(len(fighter_data))
+    except Exception as e:
+        print(f"Failed to fetch data for {fighter_name}: {e}")
+    with span('throttle'):
+        time.sleep(1)
+    return fighter_data
+
+
+def fetch_specific_fighter_data(fighter_names, use_cache=True):
     """
     Fetches fight data for specific fighters by their names and compiles it into a single DataFrame.
 
     Args:
         fighter_names (list): A list of fighter names to process.
+        use_cache (bool): Whether to use the fighter cache.
 
     Returns:
         pd.DataFrame: A DataFrame containing fight data for the specified fighters.
     """
-    base_url = 'http://ufcstats.com/statistics/fighters'
-    all_fighter_urls = get_all_fighter_urls(base_url)
+    all_fighter_urls = get_fighter_directory()
     combined_data = pd.DataFrame()
 
     for fighter_name in fighter_names:
-        # First attempt with the standardized name
-        standardized_name = standardize_name(fighter_name)
-        fighter_url = all_fighter_urls.get(standardized_name)
-
-        # If not found, try the original user input name
-        if not fighter_url:
-            print(f"Standardized name '{standardized_name}' not found. Trying original input '{fighter_name}'.")
-            fighter_url = all_fighter_urls.get(fighter_name)
-
-        # If still not found, skip to the next fighter
-        if not fighter_url:
-            print(f"URL for '{fighter_name}' not found even with the original input. Skipping...")
-            continue
-
-        print(f"Fetching data for {fighter_name} using URL: {fighter_url}")
-        try:
-            fighter_data = fighter_stats(fighter_url)
+        fighter_data = fetch_fighter_data(fighter_name, all_fighter_urls, use_cache)
+        if fighter_data is not None:
             combined_data = pd.concat([combined_data, fighter_data], ignore_index=True)
-        except Exception as e:
-            print(f"Failed to fetch data for {fighter_name}: {e}")
-        time.sleep(1)  
 
     return combined_data
 
 
-
 if __name__ == "__main__":
     fighter_1 = input("Enter Fighter 1: ").strip()
     fighter_2 = input("Enter Fighter 2: ").strip()
@@ -57,7 +57,7 @@ def extract_first_value(s):
 def calculate_cumulative_metrics(row, fighter_data):
     # Filter the fighter's historical data before the current fight date
     historical_fights = fighter_data[
-        (fighter_data['name'] == row['name']) &
+        (fighter_data['fighter_id'] == row['fighter_id']) &
         (fighter_data['weight_class'] == row['weight_class']) &
         (pd.to_datetime(fighter_data['date']) <= pd.to_datetime(row['date']))
         ]
@@ -100,7 +100,7 @@ def calculate_cumulative_metrics(row, fighter_data):
 # Function to get the most recent cumulative data prior to each fight
 def get_most_recent_cumulative(row, cumulative_data):
     # Filter cumulative data for the same fighter and weight class
-    relevant_data = cumulative_data[(cumulative_data['name'] == row['name']) &
+    relevant_data = cumulative_data[(cumulative_data['fighter_id'] == row['fighter_id']) &
                                     (cumulative_data['weight_class'] == row['weight_class']) &
                                     (cumulative_data['date'] < row['date'])]
     # Return the most recent cumulative data (last row)
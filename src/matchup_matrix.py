@@ -0,0 +1,92 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import model_registry
+from clean_data_fighters import FEATURE_STORE_DIR, MODEL_FEATURE_COLUMNS, load_feature_store, \
+    fighter_feature_arrays, encode_matchups
+
+MATCHUP_MATRIX_DIR = '../data/matchups'
+
+
+def round_robin_matrix(weight_class, fighters=None, store_dir=FEATURE_STORE_DIR, model_version=None,
+                       is_title_fight=False, is_male_fight=True, output_path=None):
+    """
+    Predicts every pairing of the fighters in a weight class. All pairwise feature differences are
+    built with array broadcasting and scored in one call to the model, and each pairing is scored
+    in both corners and averaged, so that P(A beats B) + P(B beats A) = 1.
+
+    Args:
+        weight_class (str): The weight class, e.g. 'Lightweight'.
+        fighters (list): The fighter names to include, or None for every fighter with features in
+                         the weight class. Names without features are skipped with a warning.
+        store_dir (str): The feature store directory.
+        model_version (str): The registered model version, or None for the latest.
+        is_title_fight (bool): Whether to score the pairings as title fights.
+        is_male_fight (bool): Whether to score the pairings as men's fights.
+        output_path (str): The CSV to write the matrix to. Defaults to
+                           MATCHUP_MATRIX_DIR/<weight_class>.csv.
+
+    Returns:
+        pd.DataFrame: A fighter-by-fighter matrix where each cell is the probability that the row
+                      fighter beats the column fighter, with NaN on the diagonal.
+    """
+    normalized_weight_class = weight_class.lower().strip().replace(' ', '_')
+    model, metadata = model_registry.get_model(model_version)
+    feature_store = load_feature_store(store_dir)
+    keys, numerical, stance = fighter_feature_arrays(feature_store['fighter_features'],
+                                                     feature_store['fighter_attributes'])
+
+    in_weight_class = (keys['weight_class'] == normalized_weight_class).to_numpy()
+    if fighters is not None:
+        requested = {' '.join(name.lower().split()): name for name in fighters}
+        available = keys['name'].str.lower().str.split().str.join(' ')
+        missing = set(requested) - set(available[in_weight_class])
+        for name in missing:
+            print(f"Warning: No features for {requested[name]} at {weight_class}, skipping.")
+        in_weight_class &= available.isin(requested).to_numpy()
+
+    names = keys['name'][in_weight_class].tolist()
+    numerical = numerical[in_weight_class]
+    stance = stance[in_weight_class]
+    if len(names) < 2:
+        raise ValueError(f"Need at least two fighters with features at {weight_class}, found {len(names)}")
+
+    # Row i is fighter A and column j is fighter B, giving an (n, n, features) grid
+    encoded = encode_matchups(numerical[:, None, :], numerical[None, :, :], stance[:, None, :], stance[None, :, :],
+                              normalized_weight_class, is_title_fight, is_male_fight)
+    column_order = [MODEL_FEATURE_COLUMNS.index(col) for col in metadata['feature_columns']]
+    encoded = encoded.reshape(-1, encoded.shape[-1])[:, column_order]
+
+    prob_B_winning = model.get_booster().inplace_predict(encoded).reshape(len(names), len(names))
+
+    # P(i beats j) averaged over i in the A corner (1 - P(B wins)) and i in the B corner
+    probability = ((1 - prob_B_winning) + prob_B_winning.T) / 2
+    np.fill_diagonal(probability, np.nan)
+    matrix = pd.DataFrame(probability, index=names, columns=names)
+
+    output_path = output_path or os.path.join(MATCHUP_MATRIX_DIR, f'{normalized_weight_class}.csv')
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    matrix.to_csv(output_path)
+    print(f"Wrote {len(names)}x{len(names)} matchup matrix to {output_path}")
+
+    return matrix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Predict every pairing of fighters in a weight class.')
+    parser.add_argument('weight_class')
+    parser.add_argument('--fighters', nargs='+', default=None)
+    parser.add_argument('--store-dir', default=FEATURE_STORE_DIR)
+    parser.add_argument('--model-version', default=None)
+    parser.add_argument('--title-fight', action='store_true')
+    parser.add_argument('--women', action='store_true', help='Score the pairings as women\'s fights.')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    round_robin_matrix(args.weight_class, args.fighters, args.store_dir, args.model_version,
+                       args.title_fight, not args.women, args.output)
+    print(f"Finished in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,196 @@
+import os
+import re
+import threading
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024 ** 2
+
+# Allocations are attributed to the innermost frame in this directory, i.e. the pipeline code
+# that called into pandas or numpy, rather than to the library line that did the allocating
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRACEBACK_FRAMES = 12
+_PROFILER_FILES = {os.path.join(SOURCE_DIR, name) for name in ('memory_profile.py', 'pipeline_trace.py')}
+
+
+def current_rss_mb():
+    """
+    Reads the resident set size of this process.
+
+    Returns:
+        float: The current RSS in MB, or None where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / MB
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    """
+    Reads the peak resident set size of this process since it was last reset.
+
+    Returns:
+        float: The peak RSS in MB, or None if it cannot be read.
+    """
+    try:
+        with open('/proc/self/status') as file:
+            return int(re.search(r'VmHWM:\s+(\d+)', file.read()).group(1)) / 1024
+    except (OSError, AttributeError):
+        if resource is None:
+            return None
+        # ru_maxrss is the lifetime peak, in KB on Linux and bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (MB if os.uname().sysname == 'Darwin' else 1024)
+
+
+def reset_peak_rss():
+    """
+    Resets the kernel's peak RSS counter, so that peak_rss_mb covers only what follows.
+
+    Returns:
+        bool: Whether the counter could be reset; on other systems the peak is the lifetime peak.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _is_pipeline_frame(frame):
+    return frame.filename.startswith(SOURCE_DIR) and frame.filename not in _PROFILER_FILES
+
+
+def frame_memory_mb(value):
+    """
+    Measures the deep memory usage of a DataFrame, or of every DataFrame in a dict, list or tuple.
+
+    Args:
+        value: The stage input or output.
+
+    Returns:
+        dict: The memory in MB keyed by frame name or position, or an empty dict if there are no frames.
+    """
+    if hasattr(value, 'memory_usage') and hasattr(value, 'columns'):
+        return {'frame': float(value.memory_usage(deep=True).sum()) / MB}
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, (list, tuple)):
+        items = enumerate(value)
+    else:
+        return {}
+    return {str(key): float(item.memory_usage(deep=True).sum()) / MB for key, item in items
+            if hasattr(item, 'memory_usage') and hasattr(item, 'columns')}
+
+
+class MemoryProfiler:
+    """
+    Measures the memory of every traced span: the peak RSS and the peak of Python allocations
+    within the span, the RSS it left behind, the source lines that allocated the most in it, and
+    the size of the DataFrames going in and out of it. Nested spans are handled by resetting the
+    peaks on entry and folding each child's peak into its parent's, so every span reports its own
+    peak including its children. Only spans on the thread that started profiling are measured, since
+    the peaks are process-wide; spans on other threads, e.g. concurrent fetches, are timed only.
+    """
+
+    def __init__(self, top_allocations=10):
+        self.top_allocations = top_allocations
+        self.can_reset_rss = reset_peak_rss()
+        self._stack = []
+        self._thread = threading.get_ident()
+        self._filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                         tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                         tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>')]
+
+    def start(self):
+        self._thread = threading.get_ident()
+        tracemalloc.start(TRACEBACK_FRAMES)
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def _snapshot(self):
+        if not self.top_allocations:
+            return None
+        return tracemalloc.take_snapshot().filter_traces(self._filters)
+
+    def enter(self, record):
+        if threading.get_ident() != self._thread:
+            return
+        if self._stack:
+            parent = self._stack[-1]
+            parent['peak_traced'] = max(parent['peak_traced'], tracemalloc.get_traced_memory()[1])
+            parent['peak_rss'] = max(parent['peak_rss'], peak_rss_mb() or 0.0)
+        tracemalloc.reset_peak()
+        reset_peak_rss()
+
+        state = {
+            'record': record,
+            'rss_start': current_rss_mb(),
+            'traced_start': tracemalloc.get_traced_memory()[0],
+            'peak_traced': 0,
+            'peak_rss': 0.0,
+            'snapshot': self._snapshot()
+        }
+        self._stack.append(state)
+        record.memory = {}
+
+    def exit(self, record):
+        if threading.get_ident() != self._thread:
+            return
+        state = self._stack.pop()
+        traced_now, traced_peak = tracemalloc.get_traced_memory()
+        peak_traced = max(state['peak_traced'], traced_peak)
+        peak_rss = max(state['peak_rss'], peak_rss_mb() or 0.0)
+        if self._stack:
+            parent = self._stack[-1]
+            parent['peak_traced'] = max(parent['peak_traced'], peak_traced)
+            parent['peak_rss'] = max(parent['peak_rss'], peak_rss)
+
+        rss_end = current_rss_mb()
+        record.memory.update({
+            'peak_rss_mb': peak_rss,
+            'rss_delta_mb': rss_end - state['rss_start'] if rss_end is not None else None,
+            'python_peak_mb': (peak_traced - state['traced_start']) / MB,
+            'python_delta_mb': (traced_now - state['traced_start']) / MB,
+        })
+        if state['snapshot'] is not None:
+            record.memory['top_allocations'] = self._top_allocations(
+                self._snapshot().compare_to(state['snapshot'], 'traceback'))
+
+    def _top_allocations(self, differences):
+        by_location = {}
+        for difference in differences:
+            # Tracebacks run from the oldest frame to the most recent one
+            frames = list(difference.traceback)
+            frame = next((frame for frame in reversed(frames) if _is_pipeline_frame(frame)), frames[-1])
+            filename = os.path.relpath(frame.filename, SOURCE_DIR) if _is_pipeline_frame(frame) else frame.filename
+            location = f'{filename}:{frame.lineno}'
+            size, count = by_location.get(location, (0, 0))
+            by_location[location] = (size + difference.size_diff, count + difference.count_diff)
+
+        top = sorted(by_location.items(), key=lambda item: item[1][0], reverse=True)[:self.top_allocations]
+        return [{'location': location, 'size_mb': size / MB, 'count': count} for location, (size, count) in top
+                if size > 0]
+
+    def report(self, spans):
+        """
+        Orders the profiled spans by peak memory.
+
+        Args:
+            spans (list): The tracer's spans.
+
+        Returns:
+            list: One dictionary per span with its name, parent, wall time and memory, highest peak first.
+        """
+        profiled = [record for record in spans if record.memory]
+        profiled.sort(key=lambda record: (record.memory['peak_rss_mb'], record.memory['python_peak_mb']),
+                      reverse=True)
+        return [{'name': record.name, 'parent': record.parent.name if record.parent else None,
+                 'wall_seconds': record.wall_seconds, **record.attributes, **record.memory} for record in profiled]
@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, log_loss
+from xgboost import XGBClassifier
+import model_registry
+from clean_data_fighters import build_matchup_features, load_feature_store
+from model_tuning import split_cores
+from model_ufc_prediction import DEFAULT_PARAMS, split_training_data
+from tree_evaluator import CompiledTreeEnsemble
+
+ENSEMBLE_QUANTILES = (0.05, 0.5, 0.95)
+
+
+def train_bootstrap_ensemble(X, y, n_members=50, params=None, n_cores=None, random_state=42):
+    """
+    Trains boosters on bootstrap resamples of the training rows. Members are fitted on a thread
+    pool, which xgboost's native training runs in parallel, with the cores split between the
+    members being fitted at once and each member's xgboost threads.
+
+    Args:
+        X (pd.DataFrame): The training features.
+        y (pd.Series): The training targets.
+        n_members (int): The number of boosters.
+        params (dict): The XGBoost hyperparameters. Defaults to DEFAULT_PARAMS.
+        n_cores (int): The number of cores to use. Defaults to all cores.
+        random_state (int): The seed of the first member's resample; member i uses random_state + i.
+
+    Returns:
+        list: The fitted XGBClassifier members.
+    """
+    parallel_members, n_threads = split_cores(n_cores, max(1, (n_cores or os.cpu_count() or 1) // 2))
+    params = params or DEFAULT_PARAMS
+
+    def fit_member(member):
+        rng = np.random.default_rng(random_state + member)
+        rows = rng.integers(0, len(X), len(X))
+        model = XGBClassifier(eval_metric='logloss', n_jobs=n_threads, random_state=random_state + member, **params)
+        model.fit(X.iloc[rows], y.iloc[rows])
+        return model
+
+    print(f"Training {n_members} bootstrap members, {parallel_members} at a time with {n_threads} xgboost threads each")
+    with ThreadPoolExecutor(max_workers=parallel_members) as executor:
+        return list(executor.map(fit_member, range(n_members)))
+
+
+def predict_distribution(ensemble, X, quantiles=ENSEMBLE_QUANTILES):
+    """
+    Scores every row with every member of a compiled ensemble in one vectorized pass and
+    summarizes the members' probabilities of class 1.
+
+    Args:
+        ensemble (CompiledTreeEnsemble): The compiled members.
+        X (np.ndarray or pd.DataFrame): The feature matrix, in the members' feature order.
+        quantiles (tuple): The quantiles of the member probabilities to report.
+
+    Returns:
+        pd.DataFrame: One row per input row with the 'mean' and 'std' of the member probabilities
+                      and one 'q<percent>' column per quantile.
+    """
+    member_proba = ensemble.predict_member_proba(X)
+    distribution = pd.DataFrame({'mean': member_proba.mean(axis=1), 'std': member_proba.std(axis=1)})
+    for quantile, values in zip(quantiles, np.quantile(member_proba, quantiles, axis=1)):
+        distribution[f'q{round(quantile * 100):02d}'] = values
+    return distribution
+
+
+def build_ensemble(version=None, n_members=50, training_path=model_registry.TRAINING_DATA_PATH,
+                   registry_dir=model_registry.REGISTRY_DIR, n_cores=None):
+    """
+    Trains a bootstrap ensemble with a registered model's parameters and feature columns, and
+    stores it compiled next to the model as ensemble.npz, with its test metrics in ensemble.json.
+    The ensemble is fitted on the same training split as train_model, so its metrics are
+    comparable with the model's.
+
+    Args:
+        version (str): The registered version to build the ensemble for, or None for the latest.
+        n_members (int): The number of boosters.
+        training_path (str): The training CSV.
+        registry_dir (str): The registry directory.
+        n_cores (int): The number of cores to use. Defaults to all cores.
+
+    Returns:
+        str: The path of the compiled ensemble.
+    """
+    model, metadata = model_registry.get_model(version, training_path, registry_dir)
+    params = {key: metadata['params'][key] for key in DEFAULT_PARAMS if key in metadata['params']}
+
+    X_train, X_test, y_train, y_test = split_training_data(pd.read_csv(training_path))
+    X_train, X_test = X_train[metadata['feature_columns']], X_test[metadata['feature_columns']]
+    members = train_bootstrap_ensemble(X_train, y_train, n_members, params, n_cores)
+    ensemble = CompiledTreeEnsemble.from_boosters([member.get_booster() for member in members])
+
+    distribution = predict_distribution(ensemble, X_test.to_numpy(dtype=np.float32))
+    ensemble_metadata = {
+        'members': n_members,
+        'params': params,
+        'metrics': {
+            'accuracy': float(accuracy_score(y_test, (distribution['mean'] >= 0.5).astype(int))),
+            'log_loss': float(log_loss(y_test, distribution['mean'])),
+            'mean_std': float(distribution['std'].mean())
+        }
+    }
+
+    version_dir = os.path.join(registry_dir, metadata['version'])
+    path = os.path.join(version_dir, 'ensemble.npz')
+    ensemble.save(path)
+    with open(os.path.join(version_dir, 'ensemble.json'), 'w') as file:
+        json.dump(ensemble_metadata, file, indent=2)
+
+    print(f"Ensemble of {n_members} members saved to {path} (accuracy {ensemble_metadata['metrics']['accuracy']:.3f})")
+    return path
+
+
+def load_ensemble(version=None, registry_dir=model_registry.REGISTRY_DIR):
+    """
+    Loads the compiled bootstrap ensemble of a registered model, building it first if needed.
+
+    Args:
+        version (str): The registered version, or None for the latest.
+        registry_dir (str): The registry directory.
+
+    Returns:
+        tuple: The CompiledTreeEnsemble and the registered model's metadata.
+    """
+    metadata = model_registry.load_metadata(version, registry_dir)
+    path = os.path.join(registry_dir, metadata['version'], 'ensemble.npz')
+    if os.path.exists(path):
+        try:
+            return CompiledTreeEnsemble.load(path), metadata
+        except ValueError:
+            pass
+    build_ensemble(metadata['version'], registry_dir=registry_dir)
+    return CompiledTreeEnsemble.load(path), metadata
+
+
+def predict_matchup_uncertainty(fights_data, feature_store=None, model_version=None, quantiles=ENSEMBLE_QUANTILES):
+    """
+    Predicts matchups from the feature store with the bootstrap ensemble, reporting the spread of
+    fighter A's win probability across the members.
+
+    Args:
+        fights_data (list): Fight dictionaries with 'fighter_1', 'fighter_2', 'weight_class',
+                            'is_title_fight' and 'is_male_fight' keys.
+        feature_store (dict): The loaded feature store, or None to load it from disk.
+        model_version (str): The registered version, or None for the latest.
+        quantiles (tuple): The quantiles of fighter A's win probability to report.
+
+    Returns:
+        list: One dictionary per fight with the mean, standard deviation and quantiles of
+              fighter A's win probability, all None for a fight with a fighter missing from the store.
+    """
+    if feature_store is None:
+        feature_store = load_feature_store()
+    ensemble, metadata = load_ensemble(model_version)
+
+    feature_matrix = build_matchup_features(feature_store['fighter_features'], feature_store['fighter_attributes'],
+                                            fights_data)[metadata['feature_columns']]
+
+    # The members predict fighter B winning, so fighter A's quantiles are the mirrored ones
+    distribution = pd.DataFrame()
+    if not feature_matrix.empty:
+        distribution = predict_distribution(ensemble, feature_matrix.to_numpy(dtype=np.float32),
+                                            [1 - quantile for quantile in quantiles])
+
+    # Matchups with a fighter missing from the store have no prediction
+    results = [{'fight': f"{fight['fighter_1']} vs. {fight['fighter_2']}", 'predicted_winner': None,
+                'fighter_A_pct_winning': None, 'fighter_A_pct_std': None,
+                **{f'fighter_A_pct_q{round(quantile * 100):02d}': None for quantile in quantiles}}
+               for fight in fights_data]
+    for i, row in zip(feature_matrix.index, distribution.itertuples(index=False)):
+        fight = fights_data[i]
+        prob_A = 1 - row.mean
+        results[i] = {
+            'fight': f"{fight['fighter_1']} vs. {fight['fighter_2']}",
+            'predicted_winner': fight['fighter_1'] if prob_A >= 0.5 else fight['fighter_2'],
+            'fighter_A_pct_winning': float(prob_A),
+            'fighter_A_pct_std': float(row.std),
+            **{f'fighter_A_pct_q{round(quantile * 100):02d}': float(1 - value)
+               for quantile, value in zip(quantiles, row[2:])}
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Train a bootstrap ensemble for prediction uncertainty.')
+    parser.add_argument('--model-version', default=None)
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--cores', type=int, default=None)
+    args = parser.parse_args()
+
+    build_ensemble(args.model_version, args.members, n_cores=args.cores)
@@ -0,0 +1,370 @@
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+from pipeline_trace import span
+
+# pandas, sklearn and xgboost are imported by the functions that use them, so that reading the
+# registry's metadata, e.g. to look up cached predictions, does not pay for importing them
+
+REGISTRY_DIR = '../models'
+TRAINING_DATA_PATH = '../data/cleaned_data_ml.csv'
+
+# Models already loaded in this process, keyed by (registry_dir, version)
+_LOADED_MODELS = {}
+
+
+def hash_file(path):
+    """
+    Computes the SHA-256 hash of a file's content.
+
+    Args:
+        path (str): The path of the file to hash.
+
+    Returns:
+        str: The hex digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_hashes(df):
+    """
+    Hashes the fight identity of every row of the training data, its TRAINING_KEY_COLUMNS, so
+    that rows can be matched across versions of the training data. A fight keeps its hash when its
+    features change, e.g. a fighter's career totals after their next fight.
+
+    Args:
+        df (pd.DataFrame): The training data.
+
+    Returns:
+        np.ndarray: One uint64 hash per row, or None if the training data has no fight keys.
+    """
+    import pandas as pd
+    from clean_data_fighters import TRAINING_KEY_COLUMNS
+    if not set(TRAINING_KEY_COLUMNS).issubset(df.columns):
+        return None
+    return pd.util.hash_pandas_object(df[TRAINING_KEY_COLUMNS], index=False).to_numpy()
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    """
+    Lists the model versions stored in the registry, oldest first.
+
+    Args:
+        registry_dir (str): The registry directory.
+
+    Returns:
+        list: The version names, e.g. ['v0001', 'v0002'].
+    """
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(name for name in os.listdir(registry_dir)
+                  if name.startswith('v') and os.path.exists(os.path.join(registry_dir, name, 'metadata.json')))
+
+
+def latest_version(registry_dir=REGISTRY_DIR):
+    """
+    Returns the most recently registered model version, or None if the registry is empty.
+
+    Args:
+        registry_dir (str): The registry directory.
+
+    Returns:
+        str: The latest version name.
+    """
+    versions = list_versions(registry_dir)
+    return versions[-1] if versions else None
+
+
+def load_metadata(version=None, registry_dir=REGISTRY_DIR):
+    """
+    Loads the metadata of a registered model.
+
+    Args:
+        version (str): The version to load, or None for the latest version.
+        registry_dir (str): The registry directory.
+
+    Returns:
+        dict: The model metadata, including its feature columns, training data hash and metrics.
+    """
+    version = version or latest_version(registry_dir)
+    if version is None:
+        raise FileNotFoundError(f"No models registered in '{registry_dir}'")
+    with open(os.path.join(registry_dir, version, 'metadata.json')) as file:
+        return json.load(file)
+
+
+def register_model(model, feature_columns, training_hash, metrics, registry_dir=REGISTRY_DIR, split_hashes=None,
+                   params=None, **extra_metadata):
+    """
+    Saves a fitted model and its metadata as a new version in the registry.
+
+    Args:
+        model (XGBClassifier): The fitted model.
+        feature_columns (list): The feature columns the model was trained on, in order.
+        training_hash (str): The hash of the training data the model was fitted on.
+        metrics (dict): The evaluation metrics of the model.
+        registry_dir (str): The registry directory.
+        split_hashes (dict): The row hashes of the 'train' and 'test' rows, which update_model
+                             uses to find new fights and the held out rows.
+        params (dict): The hyperparameters to record. Defaults to the model's own, which a model loaded
+                       from the registry no longer has.
+        **extra_metadata: Any additional fields to store in the metadata.
+
+    Returns:
+        str: The new version name.
+    """
+    versions = list_versions(registry_dir)
+    version = f'v{int(versions[-1][1:]) + 1:04d}' if versions else 'v0001'
+    version_dir = os.path.join(registry_dir, version)
+    os.makedirs(version_dir)
+
+    model.save_model(os.path.join(version_dir, 'model.json'))
+    if split_hashes is not None:
+        np.savez(os.path.join(version_dir, 'row_hashes.npz'), **split_hashes)
+
+    metadata = {
+        'version': version,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'feature_columns': list(feature_columns),
+        'training_data_hash': training_hash,
+        'metrics': metrics,
+        'params': params or {key: value for key, value in model.get_params().items() if value is not None},
+        **extra_metadata
+    }
+    with open(os.path.join(version_dir, 'metadata.json'), 'w') as file:
+        json.dump(metadata, file, indent=2, default=str)
+
+    print(f"Registered model {version} (accuracy {metrics.get('accuracy', float('nan')):.3f})")
+    return version
+
+
+def train_and_register(training_path=TRAINING_DATA_PATH, registry_dir=REGISTRY_DIR, force=False, tune=False):
+    """
+    Trains the model on the training data and registers it. If the latest registered model was
+    trained on identical data, it is reused instead of retraining unless force or tune is True.
+
+    Args:
+        training_path (str): The path to the training CSV.
+        registry_dir (str): The registry directory.
+        force (bool): If True, always train a new version.
+        tune (bool): If True, search the hyperparameters with model_tuning before training.
+
+    Returns:
+        str: The version of the registered model.
+    """
+    training_hash = hash_file(training_path)
+    version = latest_version(registry_dir)
+    if not (force or tune) and version and load_metadata(version, registry_dir)['training_data_hash'] == training_hash:
+        print(f"Model {version} is already trained on this data.")
+        return version
+
+    import pandas as pd
+    from model_ufc_prediction import split_training_data, train_model
+    training_data = pd.read_csv(training_path)
+    params, tuning_metadata = None, {}
+    if tune:
+        from model_tuning import tune_hyperparameters
+        tuning = tune_hyperparameters(training_data)
+        params = tuning['best_params']
+        tuning_metadata = {'tuning': {'cv_log_loss': tuning['log_loss'], 'cv_accuracy': tuning['accuracy']}}
+
+    print("Training model...")
+    with span('train') as record:
+        model, metrics = train_model(training_data, params)
+        record.set_rows(len(training_data))
+    _, X_test, _, _ = split_training_data(training_data)
+    feature_columns = list(X_test.columns)
+    hashes = row_hashes(training_data)
+    split_hashes = None
+    if hashes is not None:
+        is_test = training_data.index.isin(X_test.index)
+        split_hashes = {'train': hashes[~is_test], 'test': hashes[is_test]}
+    return register_model(model, feature_columns, training_hash, metrics, registry_dir, split_hashes=split_hashes,
+                          training_rows=len(training_data), **tuning_metadata)
+
+
+def evaluate_model(model, X, y):
+    """
+    Computes the accuracy, F1 score and log loss of a model on labeled rows.
+
+    Args:
+        model (XGBClassifier): The fitted model.
+        X (pd.DataFrame): The features.
+        y (pd.Series): The targets.
+
+    Returns:
+        dict: The accuracy, F1 score and log loss.
+    """
+    from sklearn.metrics import accuracy_score, f1_score, log_loss
+    probability = model.predict_proba(X)[:, 1]
+    prediction = (probability >= 0.5).astype(int)
+    return {
+        'accuracy': float(accuracy_score(y, prediction)),
+        'f1': float(f1_score(y, prediction, zero_division=0)),
+        'log_loss': float(log_loss(y, probability, labels=[0, 1]))
+    }
+
+
+def check_training_params(model, params):
+    """
+    Checks that a fitted model's booster was trained with the given learning rate and tree depth.
+
+    Args:
+        model (XGBClassifier): The fitted model.
+        params (dict): The hyperparameters it should have been trained with.
+
+    Raises:
+        ValueError: If the booster's eta or max_depth differ from params.
+    """
+    tree_params = json.loads(model.get_booster().save_config())['learner']['gradient_booster']['tree_train_param']
+    trained = {'learning_rate': float(tree_params['eta']), 'max_depth': int(tree_params['max_depth'])}
+    expected = {key: params[key] for key in trained}
+    if not (np.isclose(trained['learning_rate'], expected['learning_rate']) and
+            trained['max_depth'] == expected['max_depth']):
+        raise ValueError(f"The booster was trained with {trained} instead of {expected}")
+
+
+def update_model(training_path=TRAINING_DATA_PATH, registry_dir=REGISTRY_DIR, base_version=None, new_trees=20,
+                 max_degradation=0.02, max_new_fight_log_loss=np.log(2), max_new_fraction=0.1):
+    """
+    Updates a registered model with the fights added to the training data since it was trained, by
+    boosting a bounded number of new trees on top of the existing booster. The new trees are fitted
+    on every training row rather than only the new fights, since a single card is too few rows to
+    fit trees on without overfitting them. A full retrain is run
+    instead when the drift check fails:
+    - the base model's log loss on the new fights is above max_new_fight_log_loss, which defaults to
+      the log loss of a coin flip since a single card is too few fights for a tighter bound,
+    - the updated model's log loss on the held out test rows is more than max_degradation worse, or
+    - the new fights are more than max_new_fraction of the training data.
+
+    Args:
+        training_path (str): The path to the updated training CSV.
+        registry_dir (str): The registry directory.
+        base_version (str): The version to update, or None for the latest version.
+        new_trees (int): The number of trees to add.
+        max_degradation (float): The largest tolerated increase in log loss on the held out test rows.
+        max_new_fight_log_loss (float): The largest tolerated log loss of the base model on the new fights.
+        max_new_fraction (float): The largest share of new rows that is updated incrementally.
+
+    Returns:
+        str: The version of the registered model.
+    """
+    training_hash = hash_file(training_path)
+    base_model, base_metadata = load_model(base_version, registry_dir)
+    if base_metadata['training_data_hash'] == training_hash:
+        print(f"Model {base_metadata['version']} is already trained on this data.")
+        return base_metadata['version']
+
+    hashes_path = os.path.join(registry_dir, base_metadata['version'], 'row_hashes.npz')
+    if not os.path.exists(hashes_path):
+        print(f"Model {base_metadata['version']} has no row hashes, running a full retrain.")
+        return train_and_register(training_path, registry_dir, force=True)
+    with np.load(hashes_path) as split_hashes:
+        train_hashes, test_hashes = split_hashes['train'], split_hashes['test']
+
+    import pandas as pd
+    from xgboost import XGBClassifier
+    from model_ufc_prediction import DEFAULT_PARAMS
+    training_data = pd.read_csv(training_path)
+    hashes = row_hashes(training_data)
+    if hashes is None:
+        print("The training data has no fight keys, running a full retrain.")
+        return train_and_register(training_path, registry_dir, force=True)
+    is_test = np.isin(hashes, test_hashes)
+    is_new = ~is_test & ~np.isin(hashes, train_hashes)
+    features = training_data[base_metadata['feature_columns']]
+    target = training_data['target']
+
+    if not is_new.any():
+        print("No new fights in the training data.")
+        return base_metadata['version']
+    if is_new.sum() > max_new_fraction * len(training_data):
+        print(f"{is_new.sum()} new fights is too many for an incremental update, running a full retrain.")
+        return train_and_register(training_path, registry_dir, force=True)
+
+    new_fight_metrics = evaluate_model(base_model, features[is_new], target[is_new])
+    if new_fight_metrics['log_loss'] > max_new_fight_log_loss:
+        print(f"Log loss on the new fights ({new_fight_metrics['log_loss']:.3f}) has drifted, running a full retrain.")
+        return train_and_register(training_path, registry_dir, force=True)
+
+    # A model loaded from disk keeps its trees but not its hyperparameters, so the new trees are
+    # fitted with the ones registered for the base model
+    params = {key: base_metadata['params'].get(key, value) for key, value in DEFAULT_PARAMS.items()}
+    base_test_metrics = evaluate_model(base_model, features[is_test], target[is_test])
+    updated_model = XGBClassifier(eval_metric='logloss', **{**params, 'n_estimators': new_trees})
+    updated_model.fit(features[~is_test], target[~is_test], xgb_model=base_model.get_booster())
+    check_training_params(updated_model, params)
+    metrics = evaluate_model(updated_model, features[is_test], target[is_test])
+
+    if metrics['log_loss'] > base_test_metrics['log_loss'] + max_degradation:
+        print(f"Updated model's test log loss ({metrics['log_loss']:.3f}) degraded, running a full retrain.")
+        return train_and_register(training_path, registry_dir, force=True)
+
+    metrics = {**metrics, 'test_rows': int(is_test.sum())}
+    return register_model(updated_model, base_metadata['feature_columns'], training_hash, metrics, registry_dir,
+                          split_hashes={'train': np.concatenate([train_hashes, hashes[is_new]]), 'test': test_hashes},
+                          params={**params, 'n_estimators': params['n_estimators'] + new_trees},
+                          training_rows=len(training_data), parent_version=base_metadata['version'],
+                          update={'new_rows': int(is_new.sum()), 'new_trees': new_trees,
+                                  'new_fight_metrics': new_fight_metrics})
+
+
+def load_model(version=None, registry_dir=REGISTRY_DIR):
+    """
+    Loads a registered model. Loaded models are kept in memory, so repeated calls are free.
+
+    Args:
+        version (str): The version to load, or None for the latest version.
+        registry_dir (str): The registry directory.
+
+    Returns:
+        tuple: The XGBClassifier and its metadata dictionary.
+    """
+    metadata = load_metadata(version, registry_dir)
+    key = (os.path.abspath(registry_dir), metadata['version'])
+    if key not in _LOADED_MODELS:
+        with span('load_model', version=metadata['version']):
+            from xgboost import XGBClassifier
+            model = XGBClassifier()
+            model.load_model(os.path.join(registry_dir, metadata['version'], 'model.json'))
+        _LOADED_MODELS[key] = (model, metadata)
+    return _LOADED_MODELS[key]
+
+
+def get_model(version=None, training_path=TRAINING_DATA_PATH, registry_dir=REGISTRY_DIR):
+    """
+    Loads a registered model, training and registering one first if the registry is empty.
+
+    Args:
+        version (str): The version to load, or None for the latest version.
+        training_path (str): The training CSV used if a model has to be trained.
+        registry_dir (str): The registry directory.
+
+    Returns:
+        tuple: The XGBClassifier and its metadata dictionary.
+    """
+    if version is None and latest_version(registry_dir) is None:
+        train_and_register(training_path, registry_dir)
+    return load_model(version, registry_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'list':
+        for registered_version in list_versions():
+            registered = load_metadata(registered_version)
+            print(f"{registered_version}  {registered['created_at']}  {registered['metrics']}")
+    elif len(sys.argv) > 1 and sys.argv[1] == 'update':
+        paths = [arg for arg in sys.argv[2:] if not arg.startswith('--')]
+        update_model(paths[0] if paths else TRAINING_DATA_PATH)
+    else:
+        paths = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+        train_and_register(paths[0] if paths else TRAINING_DATA_PATH, force='--force' in sys.argv,
+                           tune='--tune' in sys.argv)
@@ -1,106 +1,213 @@
+import argparse
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import pandas as pd
 import fighter_comparison
 from clean_data_fighters import process_fighter_attributes, engineer_fight_stats, filter_weight_class_data, \
-    prepare_fight_data_pairs
-from model_ufc_prediction import prediction_model
+    prepare_fight_data_pairs, build_matchup_features, load_feature_store
+import model_registry
+from feature_snapshots import FeatureSnapshotIndex
+from fight_card import load_card, write_predictions
+from model_ufc_prediction import predict_fight, predict_fights
+from pipeline_trace import span, traced, start_tracing, stop_tracing
+from prediction_cache import PredictionCache, feature_store_version, format_predictions
+from stage_cache import cached_stage, fingerprint_frame
+
+# Predictions already made in this process, reused by predict_matchups
+PREDICTION_CACHE = PredictionCache()
+
+# The fighters fetched at the same time by default. Their requests also share the rate limit in
+# scrape_metrics.fetch, so more workers do not put more load on ufcstats
+DEFAULT_FETCH_WORKERS = 4
 
 
-def extract_data(fighter_1, fighter_2):
+@traced('extract')
+def extract_data(fighter_1, fighter_2, fighter_data=None, use_cache=True):
     """
-    Extract data for the two specified fighters.
+    Extract data for the two specified fighters. fighter_data maps fighter names to the raw data
+    already scraped in this run, or to the Future of a fetch still running, so that a fighter on
+    several fights of a card is only scraped once; fighters scraped here are added to it. The
+    returned frame is shared by every stage of the fight, which must not modify it. Fighters whose
+    record is unchanged are read from the fighter cache when use_cache is True.
     """
-    print(f"Extracting data for fighters: {fighter_1} and {fighter_2}")
-    fighter_names = [fighter_1, fighter_2]
-    combined_fighter_data = fighter_comparison.fetch_specific_fighter_data(fighter_names)
-    data = pd.DataFrame(combined_fighter_data)
+    fighter_data = {} if fighter_data is None else fighter_data
+    fighter_frames = []
+    for fighter_name in [fighter_1, fighter_2]:
+        key = fighter_comparison.standardize_name(fighter_name)
+        if key in fighter_data:
+            print(f"Reusing data already collected for {fighter_name}")
+        else:
+            print(f"Extracting data for fighter: {fighter_name}")
+            fighter_data[key] = fighter_comparison.fetch_fighter_data(fighter_name, use_cache=use_cache)
+        if isinstance(fighter_data[key], Future):
+            fighter_data[key] = fighter_data[key].result()
+        if fighter_data[key] is not None:
+            fighter_frames.append(fighter_data[key])
+
+    data = pd.concat(fighter_frames, ignore_index=True) if fighter_frames else pd.DataFrame()
     print("Data collection complete...")
     return data
 
 
-def clean_fighter_data(raw_data):
+@traced('clean')
+def clean_fighter_data(raw_data, use_cache=True):
     """
     Clean the raw data for a given fighter.
     """
     print("Cleaning raw data...")
-    cleaned_data = process_fighter_attributes(raw_data)
+    cleaned_data = cached_stage('clean', process_fighter_attributes, raw_data, enabled=use_cache)
     return cleaned_data
 
 
-def process_and_filter_data(fighter_names, user_input):
+def filter_fighter_data(raw_data, user_input, use_cache=True):
     """
-    Process and filter the data for the specified fighters.
+    Filter the raw data of a fight's fighters based on weight class.
     """
-    # Extract the data
-    raw_data = extract_data(fighter_names[0], fighter_names[1])
-
-    # Filter the data based on weight class
-    filtered_data = filter_weight_class_data(raw_data, user_input)
+    with span('filter') as record:
+        filtered_data = cached_stage('filter', filter_weight_class_data, raw_data, user_input, enabled=use_cache)
+        record.set_rows(len(filtered_data))
 
     return filtered_data
 
 
-def merge_fighter_data(agg_data, attr_data, user_input):
+@traced('pair')
+def merge_fighter_data(agg_data, attr_data, user_input, use_cache=True):
     """
     Merge the data for the two fighters and prepare it for model input.
     """
-    final_df = prepare_fight_data_pairs(agg_data, attr_data, user_input)
+    final_df = cached_stage('pair', prepare_fight_data_pairs, agg_data, attr_data, user_input, enabled=use_cache)
     return final_df
 
 
-def engineer_fighter_stats(cleaned_data, weight_class):
+@traced('engineer')
+def engineer_fighter_stats(cleaned_data, weight_class, use_cache=True):
     """
     Perform feature engineering on the cleaned data using the weight class.
     """
-    engineered_data = engineer_fight_stats(cleaned_data, {"weight_class": weight_class})
+    engineered_data = cached_stage('engineer', engineer_fight_stats, cleaned_data, {"weight_class": weight_class},
+                                   enabled=use_cache)
     return engineered_data
 
 
-def process_fighter_data(fights_data):
+def process_fighter_data(fights_data, use_cache=True, workers=None):
     """
-    Process the data for all fights in the provided list.
+    Process the data for all fights in the provided list. Every fighter on the card is fetched once,
+    even when they appear on several fights, and the fetches run concurrently on a thread pool in
+    card order, so each fight's features are built while the fighters of later fights are still
+    being fetched. Fighters with an unchanged record and unchanged cleaning, feature engineering and
+    pairing stages are loaded from the fighter and stage caches when use_cache is True. workers is
+    the number of fetch threads, by default DEFAULT_FETCH_WORKERS. A fight without feature data for
+    both fighters is not scored, and its predicted winner and win percentages are None.
     """
-    all_fights_data = []
+    # The feature row of every fight with data, keyed by the fight's position on the card
+    fight_feature_rows = {}
 
+    # Every fighter on the card in order of first appearance, keyed as extract_data looks them up
+    card_fighters = {}
     for fight in fights_data:
-        print(f"\nProcessing fight: {fight['fighter_1']} vs. {fight['fighter_2']}")
+        for fighter_name in [fight['fighter_1'], fight['fighter_2']]:
+            card_fighters.setdefault(fighter_comparison.standardize_name(fighter_name), fighter_name)
+
+    # The directory is loaded before the fetches start, so that they all share it
+    all_fighter_urls = fighter_comparison.get_fighter_directory()
+    workers = workers or max(1, min(DEFAULT_FETCH_WORKERS, len(card_fighters)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        fighter_data = {key: executor.submit(fighter_comparison.fetch_fighter_data, fighter_name, all_fighter_urls,
+                                              use_cache)
+                        for key, fighter_name in card_fighters.items()}
+
+        for i, fight in enumerate(fights_data):
+            print(f"\nProcessing fight: {fight['fighter_1']} vs. {fight['fighter_2']}")
+            with span('fight', fight=f"{fight['fighter_1']} vs. {fight['fighter_2']}"):
+                # Extract the data once; the cleaning and the filtering branches both read it
+                raw_data = extract_data(fight['fighter_1'], fight['fighter_2'], fighter_data, use_cache)
+                cleaned_data = clean_fighter_data(raw_data, use_cache)
+
+                # Engineer fight stats
+                weight_class = fight["weight_class"]
+                engineered_data = engineer_fighter_stats(cleaned_data, weight_class, use_cache)
+
+                # Filter the fighters' attributes to the weight class
+                filtered_data = filter_fighter_data(raw_data, {"weight_class": fight["weight_class"],
+                                                               "is_male_fight": fight["is_male_fight"]}, use_cache)
 
-        # Extract and clean data
-        raw_data = extract_data(fight['fighter_1'], fight['fighter_2'])
-        cleaned_data = clean_fighter_data(raw_data)
+                # Merge data and prepare for ML model
+                final_df = merge_fighter_data(engineered_data, filtered_data, fight, use_cache)
+                if final_df.empty:
+                    print(f"No feature data found for {fight['fighter_1']} vs. {fight['fighter_2']} "
+                          f"in this weight class. Skipping the prediction.")
+                else:
+                    fight_feature_rows[i] = final_df.iloc[[0]]
 
-        # Engineer fight stats
-        weight_class = fight["weight_class"]
-        engineered_data = engineer_fighter_stats(cleaned_data, weight_class)
+    # Use the ML model to predict every outcome with data in one call; the others have no prediction
+    prediction_results = [None] * len(fights_data)
+    if fight_feature_rows:
+        batch_results = ml_model_batch(pd.concat(fight_feature_rows.values(), ignore_index=True))
+        for i, result in zip(fight_feature_rows, batch_results):
+            prediction_results[i] = result
 
-        # Process and filter data
-        filtered_data = process_and_filter_data([fight['fighter_1'], fight['fighter_2']],
-                                                {"weight_class": fight["weight_class"],
-                                                 "is_male_fight": fight["is_male_fight"]}
-                                                )
+    return format_predictions(fights_data, prediction_results)
 
-        # Merge data and prepare for ML model
-        final_df = prepare_fight_data_pairs(engineered_data, filtered_data, fight)
 
-        # Use the ML model to predict the outcome
-        prediction_result = ml_model(final_df)
+def predict_matchups(fights_data, feature_store=None, model_version=None, use_cache=True, as_of=None, cache=None):
+    """
+    Predict any number of matchups from the feature store with a single model call, without scraping.
+    Matchups already predicted with the same model and feature store are answered from the cache,
+    PREDICTION_CACHE unless another PredictionCache is given, when use_cache is True. With as_of,
+    each fighter's features are read from the point-in-time snapshots as they were before that date
+    instead of their current values. A matchup with a fighter who has no features in the weight
+    class is not scored, and its predicted winner and win percentages are None.
+    """
+    cache = PREDICTION_CACHE if cache is None else cache
+    model_version = model_registry.get_model(model_version)[1]['version']
+    if feature_store is None:
+        feature_version = feature_store_version()
+    else:
+        feature_version = fingerprint_frame(feature_store['fighter_features'])[:16] + \
+            fingerprint_frame(feature_store['fighter_attributes'])[:16]
+    if as_of is not None:
+        feature_version += f"@{pd.Timestamp(as_of).date()}"
 
-        # Determine the predicted winner's name
-        predicted_winner_name = fight['fighter_1'] if prediction_result['predicted_winner'] == 'fighter_1' else fight['fighter_2']
+    keys = [PredictionCache.key(fight, model_version, feature_version) for fight in fights_data]
+    prediction_results = [cache.get(key) if use_cache else None for key in keys]
+    missing = [i for i, result in enumerate(prediction_results) if result is None]
 
-        # Append the prediction result to all_fights_data with the actual fighter name
-        all_fights_data.append({
-            "fight": f"{fight['fighter_1']} vs. {fight['fighter_2']}",
-            "predicted_winner": predicted_winner_name,
-            "fighter_A_pct_winning": prediction_result['fighter_A_pct_winning'],
-            "fighter_B_pct_winning": prediction_result['fighter_B_pct_winning']
-        })
+    if missing:
+        if feature_store is None:
+            feature_store = load_feature_store()
+        if as_of is None:
+            fighter_features = feature_store['fighter_features']
+        else:
+            fighter_features = FeatureSnapshotIndex.from_feature_store(feature_store).fighter_features_as_of(as_of)
+        feature_matrix = build_matchup_features(fighter_features, feature_store['fighter_attributes'],
+                                                [fights_data[i] for i in missing])
+        # Matchups with a fighter missing from the store are neither scored nor cached
+        scored = [missing[position] for position in feature_matrix.index]
+        batch_results = ml_model_batch(feature_matrix, model_version) if scored else []
+        for i, result in zip(scored, batch_results):
+            prediction_results[i] = result
+            if use_cache:
+                cache.put(keys[i], result)
 
-    return all_fights_data
+    return format_predictions(fights_data, prediction_results)
 
 
-def ml_model(df):
-    training_data = pd.read_csv('../data/cleaned_data_ml.csv')
-    return prediction_model(training_data, df)
+@traced('predict')
+def ml_model(df, model_version=None):
+    """
+    Predict a fight with a registered model, training and registering one only if none exists yet.
+    """
+    model, metadata = model_registry.get_model(model_version)
+    return predict_fight(model, df[metadata['feature_columns']])
+
+
+@traced('predict')
+def ml_model_batch(df, model_version=None):
+    """
+    Predict every row of the feature matrix with one call to a registered model.
+    """
+    model, metadata = model_registry.get_model(model_version)
+    return predict_fights(model, df[metadata['feature_columns']])
 
 
 def get_fight_details():
@@ -141,9 +248,39 @@ def get_fight_details():
 
 
 if __name__ == "__main__":
-    fights_data = get_fight_details()
-    all_fights_data = process_fighter_data(fights_data)
+    parser = argparse.ArgumentParser(description='Predict the fights of a card, or those in get_fight_details, '
+                                                 'by scraping both fighters.')
+    parser.add_argument('--card', default=None,
+                        help='JSON or CSV file with the fights of an event card (see fight_card.load_card).')
+    parser.add_argument('--output', default=None, help='Write the predictions to this JSON or CSV file.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help=f'Fighters fetched at the same time, {DEFAULT_FETCH_WORKERS} by default.')
+    parser.add_argument('--trace', default=None, help='Write the timing of every stage to this file.')
+    parser.add_argument('--trace-format', choices=['json', 'chrome'], default='json',
+                        help='json for spans and a per-stage summary, chrome for chrome://tracing or Perfetto.')
+    parser.add_argument('--memory-profile', default=None,
+                        help='Profile the memory of every stage and write the report to this JSON file.')
+    args = parser.parse_args()
+
+    tracer = start_tracing(memory=bool(args.memory_profile)) if args.trace or args.memory_profile else None
+    fights_data = load_card(args.card) if args.card else get_fight_details()
+    try:
+        with span('run'):
+            all_fights_data = process_fighter_data(fights_data, workers=args.workers)
+    finally:
+        if tracer:
+            stop_tracing()
+            if args.trace:
+                tracer.export(args.trace, args.trace_format)
+                print(f"Trace written to {args.trace}")
+            if args.memory_profile:
+                tracer.export(args.memory_profile, 'memory')
+                print(f"Memory profile written to {args.memory_profile}")
+            tracer.print_summary()
 
     for fight_data in all_fights_data:
         print(fight_data)
+    if args.output:
+        write_predictions(all_fights_data, args.output)
+        print(f"Predictions written to {args.output}")
 
@@ -0,0 +1,223 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.model_selection import ParameterSampler, StratifiedKFold
+from model_ufc_prediction import DEFAULT_PARAMS, split_training_data
+from stage_cache import fingerprint_frame
+
+TUNING_CACHE_DIR = '../data/cache/tuning'
+
+SEARCH_SPACE = {
+    'max_depth': [2, 3, 4, 5, 6],
+    'learning_rate': [0.01, 0.02, 0.05, 0.1],
+    'subsample': [0.6, 0.7, 0.8, 1.0],
+    'colsample_bytree': [0.6, 0.75, 0.9, 1.0],
+    'gamma': [0, 0.5, 1, 2],
+    'min_child_weight': [1, 3, 5],
+    'reg_alpha': [0, 0.1, 1],
+    'reg_lambda': [1, 2, 5]
+}
+
+
+def build_folds(X, y, n_splits=3, random_state=42):
+    """
+    Builds the cross validation folds once, as xgboost DMatrix pairs that every candidate reuses.
+
+    Args:
+        X (pd.DataFrame): The training features.
+        y (pd.Series): The training targets.
+        n_splits (int): The number of folds.
+        random_state (int): The seed of the stratified split.
+
+    Returns:
+        list: One (train DMatrix, validation DMatrix) pair per fold.
+    """
+    kfold = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    folds = []
+    for train_index, valid_index in kfold.split(X, y):
+        folds.append((
+            xgb.DMatrix(X.iloc[train_index], label=y.iloc[train_index]),
+            xgb.DMatrix(X.iloc[valid_index], label=y.iloc[valid_index])
+        ))
+    return folds
+
+
+def split_cores(n_cores=None, parallel_candidates=None):
+    """
+    Splits the available cores between candidates evaluated in parallel and the xgboost threads of
+    each candidate, so that together they never use more threads than there are cores.
+
+    Args:
+        n_cores (int): The number of cores to use. Defaults to all cores.
+        parallel_candidates (int): The number of candidates to evaluate at once. Defaults to one
+                                   candidate per four cores.
+
+    Returns:
+        tuple: The number of parallel candidates and the number of xgboost threads per candidate.
+    """
+    n_cores = n_cores or os.cpu_count() or 1
+    parallel_candidates = max(1, min(parallel_candidates or n_cores // 4, n_cores))
+    return parallel_candidates, max(1, n_cores // parallel_candidates)
+
+
+def evaluate_candidate(params, folds, num_rounds, n_threads, early_stopping_rounds=30):
+    """
+    Cross validates one parameter set on the prebuilt folds with a budget of boosting rounds,
+    stopping each fold early once its validation log loss stops improving.
+
+    Args:
+        params (dict): The candidate's XGBoost hyperparameters, without n_estimators.
+        folds (list): The folds built by build_folds.
+        num_rounds (int): The maximum number of boosting rounds.
+        n_threads (int): The number of xgboost threads to train with.
+        early_stopping_rounds (int): The rounds without improvement after which a fold stops.
+
+    Returns:
+        dict: The mean validation log loss and accuracy and the mean best number of rounds.
+    """
+    train_params = {**params, 'objective': 'binary:logistic', 'eval_metric': 'logloss',
+                    'nthread': n_threads, 'seed': 0}
+    log_losses, accuracies, best_rounds = [], [], []
+    for dtrain, dvalid in folds:
+        booster = xgb.train(train_params, dtrain, num_boost_round=num_rounds, evals=[(dvalid, 'valid')],
+                            early_stopping_rounds=early_stopping_rounds, verbose_eval=False)
+        probability = booster.predict(dvalid, iteration_range=(0, booster.best_iteration + 1))
+        log_losses.append(float(booster.best_score))
+        accuracies.append(float(np.mean((probability >= 0.5) == dvalid.get_label())))
+        best_rounds.append(booster.best_iteration + 1)
+
+    return {
+        'log_loss': float(np.mean(log_losses)),
+        'accuracy': float(np.mean(accuracies)),
+        'best_rounds': int(round(np.mean(best_rounds)))
+    }
+
+
+class TuningCache:
+    """
+    Stores candidate evaluations in a JSON file so that an interrupted or repeated tuning run
+    resumes instead of refitting candidates it has already scored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.evaluations = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                self.evaluations = json.load(file)['evaluations']
+
+    @staticmethod
+    def key(params, num_rounds):
+        return f'{json.dumps(params, sort_keys=True)}@{num_rounds}'
+
+    def get(self, params, num_rounds):
+        with self._lock:
+            return self.evaluations.get(self.key(params, num_rounds))
+
+    def put(self, params, num_rounds, result):
+        with self._lock:
+            self.evaluations[self.key(params, num_rounds)] = result
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w') as file:
+                json.dump({'evaluations': self.evaluations}, file, indent=1)
+            os.replace(tmp_path, self.path)
+
+
+def tune_hyperparameters(training_data, n_candidates=27, min_rounds=50, max_rounds=1000, reduction_factor=3,
+                         n_splits=3, n_cores=None, parallel_candidates=None, cache_dir=TUNING_CACHE_DIR,
+                         random_state=42):
+    """
+    Searches XGBoost hyperparameters with successive halving. Every candidate is cross validated
+    with a small budget of boosting rounds, the best 1 / reduction_factor of them move on to a
+    budget reduction_factor times larger, and so on until one candidate is left or the budget
+    reaches max_rounds. Only the training split of train_model is used, so its test metrics stay
+    held out.
+
+    Args:
+        training_data (pd.DataFrame): The training matrix with a 'target' column.
+        n_candidates (int): The number of parameter sets sampled from SEARCH_SPACE, including
+                            DEFAULT_PARAMS.
+        min_rounds (int): The boosting round budget of the first rung.
+        max_rounds (int): The largest boosting round budget.
+        reduction_factor (int): The factor by which each rung shrinks the candidates and grows the budget.
+        n_splits (int): The number of cross validation folds.
+        n_cores (int): The number of cores to use. Defaults to all cores.
+        parallel_candidates (int): The number of candidates evaluated at once.
+        cache_dir (str): The directory of the resumable results cache.
+        random_state (int): The seed for the fold split and the candidate sampling.
+
+    Returns:
+        dict: The best parameters (including n_estimators), their cross validated scores and the
+              evaluations of every rung.
+    """
+    X_train, _, y_train, _ = split_training_data(training_data)
+
+    # Each training set and fold layout gets its own cache file
+    config = json.dumps({'n_splits': n_splits, 'random_state': random_state, 'space': SEARCH_SPACE}, sort_keys=True)
+    cache_key = hashlib.sha256((fingerprint_frame(pd.concat([X_train, y_train], axis=1)) + config).encode('utf-8'))
+    cache = TuningCache(os.path.join(cache_dir, f'{cache_key.hexdigest()[:16]}.json'))
+
+    default_params = {key: value for key, value in DEFAULT_PARAMS.items() if key != 'n_estimators'}
+    sampled = ParameterSampler(SEARCH_SPACE, n_iter=n_candidates, random_state=random_state)
+    candidates = [default_params] + [params for params in sampled if params != default_params]
+    candidates = candidates[:n_candidates]
+
+    parallel_candidates, n_threads = split_cores(n_cores, parallel_candidates)
+    print(f"Tuning {len(candidates)} candidates, {parallel_candidates} at a time with {n_threads} xgboost threads each")
+    folds = build_folds(X_train, y_train, n_splits, random_state)
+
+    def evaluate(params, num_rounds):
+        result = cache.get(params, num_rounds)
+        if result is None:
+            result = evaluate_candidate(params, folds, num_rounds, n_threads)
+            cache.put(params, num_rounds, result)
+        return result
+
+    rungs = []
+    num_rounds = min_rounds
+    with ThreadPoolExecutor(max_workers=parallel_candidates) as executor:
+        while True:
+            results = list(executor.map(lambda params: evaluate(params, num_rounds), candidates))
+            ranked = sorted(zip(candidates, results), key=lambda pair: pair[1]['log_loss'])
+            rungs.append({'num_rounds': num_rounds,
+                          'evaluations': [{'params': params, **result} for params, result in ranked]})
+            print(f"Rung {len(rungs)}: {len(candidates)} candidates at {num_rounds} rounds, "
+                  f"best log loss {ranked[0][1]['log_loss']:.4f}")
+
+            if len(candidates) == 1 or num_rounds >= max_rounds:
+                break
+            keep = max(1, math.ceil(len(candidates) / reduction_factor))
+            candidates = [params for params, _ in ranked[:keep]]
+            num_rounds = min(num_rounds * reduction_factor, max_rounds)
+
+    best_params, best_result = ranked[0]
+    return {
+        'best_params': {**best_params, 'n_estimators': best_result['best_rounds']},
+        'log_loss': best_result['log_loss'],
+        'accuracy': best_result['accuracy'],
+        'rungs': rungs
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Tune the fight outcome model with successive halving.')
+    parser.add_argument('training_path', nargs='?', default='../data/cleaned_data_ml.csv')
+    parser.add_argument('--candidates', type=int, default=27)
+    parser.add_argument('--cores', type=int, default=None)
+    parser.add_argument('--parallel-candidates', type=int, default=None)
+    args = parser.parse_args()
+
+    tuning = tune_hyperparameters(pd.read_csv(args.training_path), n_candidates=args.candidates,
+                                  n_cores=args.cores, parallel_candidates=args.parallel_candidates)
+    print(f"Best log loss {tuning['log_loss']:.4f}, accuracy {tuning['accuracy']:.3f}")
+    print(json.dumps(tuning['best_params'], indent=2))
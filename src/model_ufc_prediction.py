@@ -1,76 +1,164 @@
+import numpy as np
+from clean_data_fighters import TRAINING_KEY_COLUMNS
+from sklearn.metrics import accuracy_score, f1_score, log_loss
 from sklearn.model_selection import train_test_split
 from xgboost import XGBClassifier
-from sklearn.model_selection import GridSearchCV, StratifiedKFold
 
 
-def prediction_model(training_data, comp_fighter_data):
+# The tuned hyperparameters of the fight outcome model. model_tuning.tune_hyperparameters can search
+# for better ones.
+DEFAULT_PARAMS = {
+    'n_estimators': 300,
+    'max_depth': 3,
+    'learning_rate': 0.02,
+    'subsample': 0.7,
+    'colsample_bytree': 0.9,
+    'gamma': 1,
+    'min_child_weight': 1,
+    'reg_alpha': 0.1,
+    'reg_lambda': 2
+}
+
+
+def split_training_data(training_data):
     """
-    Predict the outcome of a fight between two fighters using a trained machine learning model.
+    Split the training matrix into the stratified train and held out test sets.
 
     Parameters:
     -----------
-    model : sklearn.base.BaseEstimator
-        The trained machine learning model used to predict the fight outcome.
-    comp_fighter_data : pandas.DataFrame
-        The processed data for the comparison of two fighters. This DataFrame should have all
-        the required features for the model to make a prediction.
+    training_data : pandas.DataFrame
+        The training matrix with a 'target' column followed by the model features. The
+        TRAINING_KEY_COLUMNS are dropped from the features when present.
 
     Returns:
     --------
-    results : dict
-        A dictionary containing:
-        - 'predicted_winner' (str): The predicted winner ('Fighter A' or 'Fighter B').
-        - 'fighter_A_pct_winning' (float): The predicted probability of Fighter A winning.
-        - 'fighter_B_pct_winning' (float): The predicted probability of Fighter B winning.
+    X_train, X_test, y_train, y_test : tuple
+        The train and test features and targets.
     """
 
-    X = training_data.drop(columns=['target'])
+    X = training_data.drop(columns=['target'] + TRAINING_KEY_COLUMNS, errors='ignore')
     y = training_data['target']
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42,
-                                                        stratify=y)
-
-    param_grid = {
-        'n_estimators': [300],
-        'max_depth': [3],
-        'learning_rate': [0.02],
-        'subsample': [0.7],
-        'colsample_bytree': [0.9],
-        'gamma': [1],
-        'min_child_weight': [1],
-        'reg_alpha': [0.1],
-        'reg_lambda': [2]
+    return train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+
+def train_model(training_data, params=None):
+    """
+    Train the fight outcome model on the paired fighter training data.
+
+    Parameters:
+    -----------
+    training_data : pandas.DataFrame
+        The training matrix with a 'target' column followed by the model features.
+    params : dict, optional
+        The XGBoost hyperparameters to use, e.g. the best parameters found by
+        model_tuning.tune_hyperparameters. Defaults to DEFAULT_PARAMS.
+
+    Returns:
+    --------
+    best_model_xgb2 : xgboost.XGBClassifier
+        The fitted model.
+    metrics : dict
+        The accuracy, F1 score and log loss of the model on the held out test split.
+    """
+
+    X_train, X_test, y_train, y_test = split_training_data(training_data)
+
+    # A single parameter set needs no cross validation, so the model is fitted directly
+    best_model_xgb2 = XGBClassifier(eval_metric='logloss', **(params or DEFAULT_PARAMS))
+    best_model_xgb2.fit(X_train, y_train)
+
+    test_probability = best_model_xgb2.predict_proba(X_test)[:, 1]
+    test_prediction = (test_probability >= 0.5).astype(int)
+    metrics = {
+        "accuracy": float(accuracy_score(y_test, test_prediction)),
+        "f1": float(f1_score(y_test, test_prediction)),
+        "log_loss": float(log_loss(y_test, test_probability)),
+        "test_rows": int(len(y_test))
     }
 
-    xgb = XGBClassifier(eval_metric='logloss')
+    return best_model_xgb2, metrics
 
-    kfold = StratifiedKFold(n_splits=3, shuffle=True, random_state=42)
 
-    grid_search = GridSearchCV(
-        estimator=xgb,
-        param_grid=param_grid,
-        scoring='accuracy',
-        n_jobs=-1,
-        cv=kfold,
-        verbose=0
-    )
+def predict_fights(model, comp_fighter_data):
+    """
+    Predict the outcomes of many fights at once with a single call to the model.
 
-    grid_search.fit(X_train, y_train)
+    Parameters:
+    -----------
+    model : xgboost.XGBClassifier
+        The trained machine learning model used to predict the fight outcomes.
+    comp_fighter_data : pandas.DataFrame
+        The processed comparison data, with one row per fight.
 
-    best_model_xgb2 = grid_search.best_estimator_
+    Returns:
+    --------
+    results : list
+        A list with one dictionary per row of comp_fighter_data, in the same order, each containing:
+        - 'predicted_winner' (str): The predicted winner ('fighter_1' or 'fighter_2').
+        - 'fighter_A_pct_winning' (float): The predicted probability of Fighter A winning.
+        - 'fighter_B_pct_winning' (float): The predicted probability of Fighter B winning.
+    """
 
-    fight_outcome_xgb2 = best_model_xgb2.predict(comp_fighter_data)
-    fight_probability_xgb2 = best_model_xgb2.predict_proba(comp_fighter_data)
+    fight_probability_xgb2 = model.predict_proba(comp_fighter_data)
 
-    prob_A_winning = fight_probability_xgb2[0][0]
-    prob_B_winning = fight_probability_xgb2[0][1]
+    prob_A_winning = fight_probability_xgb2[:, 0]
+    prob_B_winning = fight_probability_xgb2[:, 1]
 
-    predicted_winner = 'fighter_1' if fight_outcome_xgb2[0] == 0 else 'fighter_2'
+    predicted_winner = np.where(prob_B_winning > 0.5, 'fighter_2', 'fighter_1')
 
-    results = {
-        "predicted_winner": predicted_winner,
-        "fighter_A_pct_winning": prob_A_winning,
-        "fighter_B_pct_winning": prob_B_winning
-    }
+    results = [
+        {
+            "predicted_winner": str(winner),
+            "fighter_A_pct_winning": prob_A,
+            "fighter_B_pct_winning": prob_B
+        }
+        for winner, prob_A, prob_B in zip(predicted_winner, prob_A_winning, prob_B_winning)
+    ]
 
     return results
+
+
+def predict_fight(model, comp_fighter_data):
+    """
+    Predict the outcome of a fight between two fighters using a trained machine learning model.
+
+    Parameters:
+    -----------
+    model : xgboost.XGBClassifier
+        The trained machine learning model used to predict the fight outcome.
+    comp_fighter_data : pandas.DataFrame
+        The processed data for the comparison of two fighters. This DataFrame should have all
+        the required features for the model to make a prediction.
+
+    Returns:
+    --------
+    results : dict
+        A dictionary containing:
+        - 'predicted_winner' (str): The predicted winner ('Fighter A' or 'Fighter B').
+        - 'fighter_A_pct_winning' (float): The predicted probability of Fighter A winning.
+        - 'fighter_B_pct_winning' (float): The predicted probability of Fighter B winning.
+    """
+    return predict_fights(model, comp_fighter_data.iloc[:1])[0]
+
+
+def prediction_model(training_data, comp_fighter_data):
+    """
+    Train a model on the training data and predict the outcome of a fight between two fighters.
+    Prefer loading a trained model from model_registry and calling predict_fight, which avoids
+    retraining on every prediction.
+
+    Parameters:
+    -----------
+    training_data : pandas.DataFrame
+        The training matrix with a 'target' column followed by the model features.
+    comp_fighter_data : pandas.DataFrame
+        The processed data for the comparison of two fighters.
+
+    Returns:
+    --------
+    results : dict
+        The prediction returned by predict_fight.
+    """
+    best_model_xgb2, _ = train_model(training_data)
+    return predict_fight(best_model_xgb2, comp_fighter_data)
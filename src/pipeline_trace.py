@@ -0,0 +1,282 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from memory_profile import MemoryProfiler, frame_memory_mb
+
+# The tracer recording spans in this process, or None when tracing is off
+_ACTIVE_TRACER = None
+
+
+class Span:
+    """
+    One timed stage: its wall and CPU time, the rows it produced and the bytes fetched inside it,
+    and its memory when the tracer profiles memory.
+    """
+
+    __slots__ = ('name', 'attributes', 'parent', 'thread', 'start', 'wall_seconds', 'cpu_seconds', 'rows',
+                 'bytes_fetched', 'memory')
+
+    def __init__(self, name, attributes, parent, thread, start):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.thread = thread
+        self.start = start
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows = None
+        self.bytes_fetched = 0
+        self.memory = None
+
+    def set_rows(self, rows):
+        self.rows = int(rows)
+
+    def record_frames(self, inputs=None, output=None):
+        """
+        Records the deep memory usage of the DataFrames going into and out of the stage, when
+        memory is being profiled.
+        """
+        if self.memory is None:
+            return
+        if inputs is not None:
+            self.memory['input_frames_mb'] = frame_memory_mb(list(inputs))
+        if output is not None:
+            self.memory['output_frames_mb'] = frame_memory_mb(output)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'parent': self.parent.name if self.parent else None,
+            'thread': self.thread,
+            'start_seconds': self.start,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'rows': self.rows,
+            'bytes_fetched': self.bytes_fetched,
+            **({'attributes': self.attributes} if self.attributes else {}),
+            **({'memory': self.memory} if self.memory else {})
+        }
+
+
+class _NoSpan:
+    # Stands in for a span when tracing is off, so instrumented code never checks
+    def set_rows(self, rows):
+        pass
+
+    def record_frames(self, inputs=None, output=None):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """
+    Collects the spans of one run. Spans nest per thread, so stages running on a thread pool
+    each get their own parent chain, and bytes fetched inside a span count towards every span
+    enclosing it. With a MemoryProfiler, every span also measures its memory.
+    """
+
+    def __init__(self, memory_profiler=None):
+        self.spans = []
+        self.memory_profiler = memory_profiler
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._thread_ids = {}
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _thread_id(self):
+        ident = threading.get_ident()
+        with self._lock:
+            return self._thread_ids.setdefault(ident, len(self._thread_ids))
+
+    @contextmanager
+    def span(self, name, **attributes):
+        stack = self._stack()
+        record = Span(name, attributes, stack[-1] if stack else None, self._thread_id(),
+                      time.perf_counter() - self._origin)
+        stack.append(record)
+        if self.memory_profiler:
+            self.memory_profiler.enter(record)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield record
+        finally:
+            record.cpu_seconds = time.thread_time() - cpu_start
+            record.wall_seconds = time.perf_counter() - wall_start
+            if self.memory_profiler:
+                self.memory_profiler.exit(record)
+            stack.pop()
+            with self._lock:
+                self.spans.append(record)
+
+    def add_bytes(self, num_bytes):
+        for record in self._stack():
+            record.bytes_fetched += num_bytes
+
+    def summary(self):
+        """
+        Totals the spans by name, slowest first.
+
+        Returns:
+            list: One dictionary per span name with its calls, wall and CPU seconds, rows and bytes.
+        """
+        totals = {}
+        for record in self.spans:
+            total = totals.setdefault(record.name, {'name': record.name, 'calls': 0, 'wall_seconds': 0.0,
+                                                    'cpu_seconds': 0.0, 'rows': 0, 'bytes_fetched': 0})
+            total['calls'] += 1
+            total['wall_seconds'] += record.wall_seconds
+            total['cpu_seconds'] += record.cpu_seconds
+            total['rows'] += record.rows or 0
+            total['bytes_fetched'] += record.bytes_fetched
+        return sorted(totals.values(), key=lambda total: total['wall_seconds'], reverse=True)
+
+    def export(self, path, trace_format='json'):
+        """
+        Writes the spans to a file.
+
+        Args:
+            path (str): The file to write.
+            trace_format (str): 'json' for the spans and a per-stage summary, 'chrome' for the
+                                Trace Event format read by chrome://tracing and Perfetto, or
+                                'memory' for the profiled spans ordered by peak memory.
+        """
+        spans = sorted(self.spans, key=lambda record: record.start)
+        if trace_format == 'chrome':
+            content = {'traceEvents': [{
+                'name': record.name,
+                'ph': 'X',
+                'ts': record.start * 1e6,
+                'dur': record.wall_seconds * 1e6,
+                'pid': os.getpid(),
+                'tid': record.thread,
+                'args': {'cpu_ms': record.cpu_seconds * 1000, 'rows': record.rows,
+                         'bytes_fetched': record.bytes_fetched, **record.attributes,
+                         **{key: value for key, value in (record.memory or {}).items()
+                            if key.endswith('_mb') and not isinstance(value, dict)}}
+            } for record in spans], 'displayTimeUnit': 'ms'}
+        elif trace_format == 'json':
+            content = {'summary': self.summary(), 'spans': [record.to_dict() for record in spans]}
+        elif trace_format == 'memory' and self.memory_profiler:
+            content = {'rss_peak_per_stage': self.memory_profiler.can_reset_rss,
+                       'stages': self.memory_profiler.report(spans)}
+        else:
+            raise ValueError(f"Unknown trace format: {trace_format}")
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(content, file, indent=2, default=str)
+
+    def print_summary(self, limit=15):
+        print(f"{'stage':28s} {'calls':>6s} {'wall s':>9s} {'cpu s':>9s} {'rows':>9s} {'KB fetched':>11s}")
+        for total in self.summary()[:limit]:
+            print(f"{total['name']:28s} {total['calls']:6d} {total['wall_seconds']:9.3f} "
+                  f"{total['cpu_seconds']:9.3f} {total['rows']:9d} {total['bytes_fetched'] / 1024:11.1f}")
+
+        if self.memory_profiler:
+            print(f"\n{'stage':28s} {'peak RSS MB':>12s} {'python peak MB':>15s} {'RSS delta MB':>13s}  top allocation")
+            for stage in self.memory_profiler.report(self.spans)[:limit]:
+                top = stage.get('top_allocations') or [{'location': '', 'size_mb': 0.0}]
+                print(f"{stage['name']:28s} {stage['peak_rss_mb']:12.1f} {stage['python_peak_mb']:15.1f} "
+                      f"{stage['rss_delta_mb'] or 0.0:13.1f}  {top[0]['location']} ({top[0]['size_mb']:.1f} MB)")
+
+
+def start_tracing(memory=False, top_allocations=10):
+    """
+    Starts recording spans in this process.
+
+    Args:
+        memory (bool): Whether to also profile the memory of every span. This traces every Python
+                       allocation, which slows the run down considerably.
+        top_allocations (int): The number of source lines that allocated the most to report per
+                               span when profiling memory, or 0 to skip the allocation snapshots.
+
+    Returns:
+        Tracer: The new active tracer.
+    """
+    global _ACTIVE_TRACER
+    memory_profiler = MemoryProfiler(top_allocations) if memory else None
+    if memory_profiler:
+        memory_profiler.start()
+    _ACTIVE_TRACER = Tracer(memory_profiler)
+    return _ACTIVE_TRACER
+
+
+def stop_tracing():
+    """
+    Stops recording spans.
+
+    Returns:
+        Tracer: The tracer that was active, or None.
+    """
+    global _ACTIVE_TRACER
+    tracer, _ACTIVE_TRACER = _ACTIVE_TRACER, None
+    if tracer and tracer.memory_profiler:
+        tracer.memory_profiler.stop()
+    return tracer
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times a block as a span of the active tracer; does nothing when tracing is off.
+
+    Args:
+        name (str): The stage name, e.g. 'clean'.
+        **attributes: Extra values to attach to the span, e.g. the fighter or URL.
+
+    Yields:
+        Span: The span, whose row count can be set with set_rows.
+    """
+    tracer = _ACTIVE_TRACER
+    if tracer is None:
+        yield _NO_SPAN
+        return
+    with tracer.span(name, **attributes) as record:
+        yield record
+
+
+def traced(name):
+    """
+    Decorates a function so that every call is a span. The row count is taken from the result
+    when it has a length, e.g. a DataFrame or a list, and when memory is profiled the sizes of
+    the DataFrame arguments and results are recorded at the stage boundary.
+
+    Args:
+        name (str): The stage name.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name) as record:
+                record.record_frames(inputs=args)
+                result = func(*args, **kwargs)
+                if hasattr(result, '__len__') and not isinstance(result, dict):
+                    record.set_rows(len(result))
+                record.record_frames(output=result)
+                return result
+        return wrapper
+    return decorator
+
+
+def add_bytes(num_bytes):
+    """
+    Counts bytes fetched towards the current span and every span enclosing it.
+
+    Args:
+        num_bytes (int): The number of bytes fetched.
+    """
+    tracer = _ACTIVE_TRACER
+    if tracer is not None:
+        tracer.add_bytes(num_bytes)
@@ -0,0 +1,203 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import model_registry
+from feature_store_paths import FEATURE_STORE_DIR, FEATURE_STORE_TABLES
+
+PREDICTION_CACHE_PATH = '../data/cache/predictions.pkl'
+MAX_CACHED_PREDICTIONS = 10000
+
+# Feature store versions already computed in this process, keyed by the tables' paths, sizes and mtimes
+_STORE_VERSIONS = {}
+
+
+def normalize_matchup(matchup):
+    """
+    Normalizes a matchup request so that equivalent requests share a key.
+
+    Args:
+        matchup (dict): A fight dictionary with 'fighter_1', 'fighter_2', 'weight_class',
+                        'is_title_fight' and 'is_male_fight' keys.
+
+    Returns:
+        tuple: The normalized (fighter_1, fighter_2, weight_class, is_title_fight, is_male_fight) key.
+    """
+    return (
+        ' '.join(str(matchup['fighter_1']).lower().split()),
+        ' '.join(str(matchup['fighter_2']).lower().split()),
+        str(matchup['weight_class']).lower().strip().replace(' ', '_'),
+        parse_flag(matchup.get('is_title_fight', False)),
+        parse_flag(matchup.get('is_male_fight', True)),
+    )
+
+
+def parse_flag(value):
+    """
+    Parses a boolean flag that may arrive as a JSON boolean or a query string value.
+
+    Args:
+        value: The flag value, e.g. True, 'true', '1' or 'no'.
+
+    Returns:
+        bool: The parsed flag.
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+
+def feature_store_version(store_dir=FEATURE_STORE_DIR):
+    """
+    Computes a version for the feature store from the content of its tables. The hash is only
+    recomputed when a table's size or modification time changes.
+
+    Args:
+        store_dir (str): The feature store directory.
+
+    Returns:
+        str: A short hex digest that changes whenever the feature store is rebuilt with new data.
+    """
+    paths = [os.path.abspath(os.path.join(store_dir, f'{table}.csv')) for table in FEATURE_STORE_TABLES]
+    stat_key = tuple((path, os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in paths)
+    if stat_key not in _STORE_VERSIONS:
+        digest = hashlib.sha256()
+        for path in paths:
+            with open(path, 'rb') as file:
+                for block in iter(lambda: file.read(1024 * 1024), b''):
+                    digest.update(block)
+        _STORE_VERSIONS[stat_key] = digest.hexdigest()[:16]
+    return _STORE_VERSIONS[stat_key]
+
+
+class PredictionCache:
+    """
+    A bounded least-recently-used cache of matchup predictions. Entries are keyed by the
+    normalized matchup together with the model version and the feature store version, so a new
+    model or a rebuilt feature store never serves stale predictions; their old entries simply
+    age out. Every writer stores the entries of predict_fights, with 'fighter_1' or 'fighter_2' as
+    the predicted winner, and names are only applied by format_predictions. When a path is given, the cache is loaded from it and save writes it back.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_PREDICTIONS, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, 'rb') as file:
+                # Entries written by older servers held the winner's name rather than 'fighter_1' or
+                # 'fighter_2', and are dropped
+                self._entries.update((key, value) for key, value in pickle.load(file) if 'fight' not in value)
+            self._evict()
+
+    @staticmethod
+    def key(matchup, model_version, feature_version):
+        return normalize_matchup(matchup) + (model_version, feature_version)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = dict(value)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def save(self):
+        """
+        Writes the cache to its path, if it has one.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            entries = list(self._entries.items())
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(entries, file)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def format_predictions(fights_data, prediction_results):
+    """
+    Pair each fight with its prediction, replacing 'fighter_1'/'fighter_2' with the fighter's name.
+    A fight whose prediction result is None has no data; its winner and win percentages are None.
+    """
+    all_fights_data = []
+
+    for fight, prediction_result in zip(fights_data, prediction_results):
+        if prediction_result is None:
+            all_fights_data.append({
+                "fight": f"{fight['fighter_1']} vs. {fight['fighter_2']}",
+                "predicted_winner": None,
+                "fighter_A_pct_winning": None,
+                "fighter_B_pct_winning": None
+            })
+            continue
+
+        # Determine the predicted winner's name
+        predicted_winner_name = fight['fighter_1'] if prediction_result['predicted_winner'] == 'fighter_1' else fight['fighter_2']
+
+        # Append the prediction result to all_fights_data with the actual fighter name
+        all_fights_data.append({
+            "fight": f"{fight['fighter_1']} vs. {fight['fighter_2']}",
+            "predicted_winner": predicted_winner_name,
+            "fighter_A_pct_winning": prediction_result['fighter_A_pct_winning'],
+            "fighter_B_pct_winning": prediction_result['fighter_B_pct_winning']
+        })
+
+    return all_fights_data
+
+
+def cached_predictions(fights_data, cache, model_version=None, store_dir=FEATURE_STORE_DIR):
+    """
+    Answers matchups from a prediction cache alone, without loading the model, the feature store or
+    pandas, so that repeated predictions start in a fraction of a second.
+
+    Args:
+        fights_data (list): The matchups to predict.
+        cache (PredictionCache): The cache to read, usually loaded from PREDICTION_CACHE_PATH.
+        model_version (str): The registered model version, or None for the latest.
+        store_dir (str): The feature store directory the predictions were made from.
+
+    Returns:
+        list: The predictions formatted by format_predictions, or None if any matchup is not
+              cached, no model is registered or the feature store has not been built.
+    """
+    model_version = model_version or model_registry.latest_version()
+    if model_version is None:
+        return None
+    try:
+        feature_version = feature_store_version(store_dir)
+    except FileNotFoundError:
+        return None
+
+    prediction_results = [cache.get(PredictionCache.key(fight, model_version, feature_version))
+                          for fight in fights_data]
+    if any(result is None for result in prediction_results):
+        return None
+    return format_predictions(fights_data, prediction_results)
@@ -0,0 +1,330 @@
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import model_registry
+from prediction_cache import MAX_CACHED_PREDICTIONS, PREDICTION_CACHE_PATH, PredictionCache, \
+    feature_store_version, format_predictions, normalize_matchup
+from tree_evaluator import load_compiled_model
+from clean_data_fighters import FEATURE_STORE_DIR, MODEL_FEATURE_COLUMNS, load_feature_store, \
+    fighter_feature_arrays, encode_matchups
+
+
+class LatencyRecorder:
+    """
+    Keeps the most recent request latencies and reports their percentiles.
+    """
+
+    def __init__(self, max_samples=10000):
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+
+    def summary(self):
+        with self._lock:
+            samples = np.array(self._samples, dtype=float) * 1000
+            count = self._count
+        if samples.size == 0:
+            return {'requests': count, 'p50_ms': None, 'p99_ms': None, 'max_ms': None}
+        return {
+            'requests': count,
+            'p50_ms': round(float(np.percentile(samples, 50)), 3),
+            'p99_ms': round(float(np.percentile(samples, 99)), 3),
+            'max_ms': round(float(samples.max()), 3),
+        }
+
+
+class PredictionService:
+    """
+    Holds the model and the fighter features in memory and answers matchup predictions.
+    Identical requests that arrive while one is already being scored share its result, and
+    finished predictions are kept in a PredictionCache. With use_compiled, the model is scored by
+    the numpy tree evaluator instead of xgboost.
+    """
+
+    def __init__(self, store_dir=FEATURE_STORE_DIR, model_version=None, use_compiled=False, cache=None):
+        self.model, self.metadata = model_registry.get_model(model_version)
+        self.booster = self.model.get_booster()
+        self.booster.set_param({'nthread': 1})  # Parallelism comes from the request workers
+        self.compiled = load_compiled_model(self.metadata['version']) if use_compiled else None
+
+        self.feature_version = feature_store_version(store_dir)
+        self.cache = cache if cache is not None else PredictionCache()
+        feature_store = load_feature_store(store_dir)
+        keys, self.numerical, self.stance = fighter_feature_arrays(feature_store['fighter_features'],
+                                                                   feature_store['fighter_attributes'])
+        self.feature_rows = {}
+        self.stance_rows = {}
+        self.display_names = {}
+        for row, (name, weight_class) in enumerate(keys.itertuples(index=False)):
+            normalized_name = ' '.join(name.lower().split())
+            self.feature_rows[(normalized_name, weight_class)] = row
+            self.stance_rows.setdefault(normalized_name, row)
+            self.display_names[normalized_name] = name
+
+        # Map the encoder's column order onto the order the model was trained with
+        self.column_order = [MODEL_FEATURE_COLUMNS.index(col) for col in self.metadata['feature_columns']]
+
+        self.latency = LatencyRecorder()
+        self.coalesced_requests = 0
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def predict(self, matchup):
+        """
+        Predicts a single matchup, sharing the work with an identical request already in flight.
+
+        Args:
+            matchup (dict): A fight dictionary as accepted by normalize_matchup.
+
+        Returns:
+            dict: The predicted winner and each fighter's win probability.
+        """
+        key = normalize_matchup(matchup)
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced_requests += 1
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            future.set_result(self.predict_batch([key])[0])
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+        return future.result()
+
+    def predict_batch(self, keys):
+        """
+        Scores normalized matchup keys with one call to the model, answering keys already in the
+        prediction cache without scoring them.
+
+        Args:
+            keys (list): Keys produced by normalize_matchup.
+
+        Returns:
+            list: One prediction dictionary per key.
+
+        Raises:
+            KeyError: If a fighter has no features in the requested weight class.
+        """
+        cache_keys = [key + (self.metadata['version'], self.feature_version) for key in keys]
+        results = [self.cache.get(cache_key) for cache_key in cache_keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            self._score([keys[i] for i in missing], [cache_keys[i] for i in missing], missing, results)
+        return [self.format_prediction(key, result) for key, result in zip(keys, results)]
+
+    def _score(self, keys, cache_keys, positions, results):
+        # Scores the keys into their positions of results and caches them in the shared schema
+        rows_A, rows_B, stances_A, stances_B = [], [], [], []
+        for fighter_1, fighter_2, weight_class, _, _ in keys:
+            for fighter, rows, stances in [(fighter_1, rows_A, stances_A), (fighter_2, rows_B, stances_B)]:
+                row = self.feature_rows.get((fighter, weight_class))
+                if row is None:
+                    raise KeyError(f"No features for '{fighter}' at {weight_class}")
+                rows.append(row)
+                stances.append(self.stance_rows[fighter])
+
+        encoded = encode_matchups(
+            self.numerical[rows_A], self.numerical[rows_B],
+            self.stance[stances_A], self.stance[stances_B],
+            np.array([key[2] for key in keys]),
+            np.array([key[3] for key in keys]),
+            np.array([key[4] for key in keys])
+        )[:, self.column_order]
+
+        if self.compiled is not None:
+            prob_B_winning = self.compiled.predict_proba(encoded)[:, 1]
+        else:
+            prob_B_winning = self.booster.inplace_predict(encoded)
+
+        for i, cache_key, prob_B in zip(positions, cache_keys, prob_B_winning):
+            # The same entries as predict_fights, so that model_run and the CLI can read them
+            results[i] = {
+                'predicted_winner': 'fighter_2' if prob_B > 0.5 else 'fighter_1',
+                'fighter_A_pct_winning': float(1 - prob_B),
+                'fighter_B_pct_winning': float(prob_B),
+            }
+            self.cache.put(cache_key, results[i])
+
+    def format_prediction(self, key, result):
+        """
+        Names the fighters of a scored matchup for the response.
+
+        Args:
+            key (tuple): The matchup's key from normalize_matchup.
+            result (dict): The prediction as stored in the cache, with 'fighter_1' or 'fighter_2'
+                           as the predicted winner.
+
+        Returns:
+            dict: The fight, the predicted winner's name, each fighter's win probability and the
+                  model version.
+        """
+        fight = {'fighter_1': self.display_names.get(key[0], key[0]),
+                 'fighter_2': self.display_names.get(key[1], key[1])}
+        return {**format_predictions([fight], [result])[0], 'model_version': self.metadata['version']}
+
+    def stats(self):
+        """
+        Reports request latency percentiles, how many requests were coalesced and the prediction
+        cache's hit counts.
+
+        Returns:
+            dict: The service statistics.
+        """
+        return {**self.latency.summary(), 'coalesced_requests': self.coalesced_requests,
+                'cache': self.cache.stats(), 'model_version': self.metadata['version'],
+                'fighters': len(self.stance_rows)}
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    An HTTP server that handles connections on a fixed pool of worker threads.
+    """
+
+    def __init__(self, server_address, handler_class, workers):
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prediction-worker')
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves GET /predict?fighter_1=..&fighter_2=..&weight_class=.., POST /predict with a JSON
+    matchup or list of matchups, GET /stats and GET /health.
+    """
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/predict':
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            self._handle_prediction(params)
+        elif url.path == '/stats':
+            self._send_json(200, self.service.stats())
+        elif url.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': f'Unknown path {url.path}'})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/predict':
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as e:
+            self._send_json(400, {'error': f'Invalid JSON: {e}'})
+            return
+        self._handle_prediction(payload)
+
+    def _handle_prediction(self, payload):
+        start = time.perf_counter()
+        try:
+            if isinstance(payload, list):
+                result = self.service.predict_batch([normalize_matchup(matchup) for matchup in payload])
+            else:
+                result = self.service.predict(payload)
+        except KeyError as e:
+            self._send_json(404, {'error': str(e).strip('"')})
+            return
+        except (TypeError, ValueError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        self.service.latency.record(time.perf_counter() - start)
+        self._send_json(200, result)
+
+    def _send_json(self, status, body):
+        encoded = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host='127.0.0.1', port=8765, workers=8, store_dir=FEATURE_STORE_DIR, model_version=None,
+          use_compiled=False, cache_size=MAX_CACHED_PREDICTIONS, cache_path=None):
+    """
+    Starts the prediction server and blocks until it is interrupted.
+
+    Args:
+        host (str): The interface to listen on.
+        port (int): The port to listen on.
+        workers (int): The number of worker threads handling requests.
+        store_dir (str): The feature store directory to load fighter features from.
+        model_version (str): The registered model version to serve, or None for the latest.
+        use_compiled (bool): If True, score with the numpy tree evaluator instead of xgboost.
+        cache_size (int): The number of predictions kept in the cache.
+        cache_path (str): A file to load the prediction cache from and save it to on shutdown.
+    """
+    print("Loading model and feature store...")
+    cache = PredictionCache(cache_size, cache_path)
+    PredictionRequestHandler.service = PredictionService(store_dir, model_version, use_compiled, cache)
+    server = PooledHTTPServer((host, port), PredictionRequestHandler, workers)
+    print(f"Serving predictions on http://{host}:{port} with {workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(PredictionRequestHandler.service.stats()))
+    finally:
+        server.server_close()
+        cache.save()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve fight predictions from a warm model and feature store.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--store-dir', default=FEATURE_STORE_DIR)
+    parser.add_argument('--model-version', default=None)
+    parser.add_argument('--compiled', action='store_true',
+                        help='Score with the compiled numpy tree evaluator instead of xgboost.')
+    parser.add_argument('--cache-size', type=int, default=MAX_CACHED_PREDICTIONS)
+    parser.add_argument('--cache-path', default=None,
+                        help=f'Persist the prediction cache to this file, e.g. {PREDICTION_CACHE_PATH}.')
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers, args.store_dir, args.model_version, args.compiled,
+          args.cache_size, args.cache_path)
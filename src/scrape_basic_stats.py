@@ -1,5 +1,6 @@
 import requests
 from bs4 import BeautifulSoup
+from scrape_metrics import fetch, timed_parse
 
 
 def fetch_webpage(url):
@@ -13,7 +14,7 @@ def fetch_webpage(url):
         str: The content of the webpage if the request is successful, None otherwise.
     """
     try:
-        response = requests.get(url)
+        response = fetch(url, 'fighter')
         response.raise_for_status()
         return response.text
     except requests.exceptions.RequestException as e:
@@ -93,6 +94,20 @@ def get_fighter_basic_stats(fighter_url):
     if not html_content:
         return None
 
+    with timed_parse('fighter_profile'):
+        return parse_fighter_basic_stats(html_content)
+
+
+def parse_fighter_basic_stats(html_content):
+    """
+    Parses a fighter's basic stats from their UFC stats page.
+
+    Args:
+        html_content (str): The HTML content of the fighter's page.
+
+    Returns:
+        dict: A dictionary containing the fighter's basic stats.
+    """
     soup = BeautifulSoup(html_content, 'html.parser')
     name_element = soup.find('span', {'class': 'b-content__title-highlight'})
     record_element = soup.find('span', {'class': 'b-content__title-record'})
@@ -100,7 +115,6 @@ def get_fighter_basic_stats(fighter_url):
     if name_element and record_element:
         name = name_element.text.strip()
         record_text = record_element.text.strip()
-        print(f"Raw record text: {record_text}")  # Debug print
         try:
             wins, losses, draws, nc = parse_record(record_text)
         except Exception as e:
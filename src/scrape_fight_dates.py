@@ -1,5 +1,7 @@
 import requests
 from bs4 import BeautifulSoup
+from scrape_metrics import fetch, timed_parse
+from surrogate_keys import surrogate_key
 
 def clean_text(text):
     """
@@ -27,13 +29,14 @@ def fetch_webpage(url):
         requests.exceptions.RequestException: If the HTTP request fails.
     """
     try:
-        response = requests.get(url)
+        response = fetch(url, 'fighter')
         response.raise_for_status()
         return response.content
     except requests.exceptions.RequestException as e:
         print(f'Request failed: {e}')
         return None
 
+@timed_parse('fighter_fights')
 def extract_fight_dates_and_results(html_content):
     """
     Extracts fight dates, event names, results, and fighter names from the given HTML content.
@@ -42,8 +45,8 @@ def extract_fight_dates_and_results(html_content):
         html_content (str): The HTML content of the webpage to parse.
 
     Returns:
-        list: A list of dictionaries, each containing 'Event', 'Date', 'Result', 'Method', 'Fighter_1', and 'Fighter_2' of a fight.
-              Example: [{'Event': 'UFC 281: Adesanya vs. Pereira', 'Date': 'Nov. 12, 2022', 'Result': 'win', 'Method': 'KO/TKO', 'Fighter_1': 'Alex Pereira', 'Fighter_2': 'Jiri Prochazka'}, ...]
+        list: A list of dictionaries, each containing the 'Fight ID' and 'Event ID' keys, 'Event', 'Date', 'Result', 'Method', 'Fighter_1', and 'Fighter_2' of a fight.
+              Example: [{'Fight ID': 123, 'Event ID': 456, 'Event': 'UFC 281: Adesanya vs. Pereira', 'Date': 'Nov. 12, 2022', 'Result': 'win', 'Method': 'KO/TKO', 'Fighter_1': 'Alex Pereira', 'Fighter_2': 'Jiri Prochazka'}, ...]
     """
     soup = BeautifulSoup(html_content, 'html.parser')
     fight_details_list = []
@@ -70,7 +73,12 @@ def extract_fight_dates_and_results(html_content):
             fighter2 = clean_text(fighter_tags[1].text)
 
             if event_name.startswith("UFC"):
+                # The row links to the fight's page and its event cell to the event's page
+                fight_key = surrogate_key(event_row.get('data-link'), event_name, *sorted([fighter1, fighter2]))
+                event_key = surrogate_key(event_name_tag.get('href'), event_name)
                 fight_details_list.append({
+                    'Fight ID': fight_key,
+                    'Event ID': event_key,
                     'Event': event_name,
                     'Date': event_date,
                     'Result': result_text,
@@ -1,5 +1,7 @@
 import requests
 from bs4 import BeautifulSoup
+from scrape_metrics import fetch, timed_parse
+from surrogate_keys import surrogate_key
 import pandas as pd
 
 
@@ -18,7 +20,7 @@ def fetch_webpage(url):
         str: The content of the webpage, or None if the request fails.
     """
     try:
-        response = requests.get(url)
+        response = fetch(url, 'fight')
         response.raise_for_status()
         return response.content.decode('utf-8')  # Decode bytes to string
     except requests.exceptions.RequestException as e:
@@ -74,6 +76,29 @@ def extract_event_name(html_content):
     return 'Unknown Event'
 
 
+def extract_event_key(html_content, event_name):
+    """
+    Extracts the integer key of the event from the link in the fight details page's title.
+
+    Args:
+        html_content (str): The HTML content of the fight details page.
+        event_name (str): The event's name, used for the key if the page has no event link.
+
+    Returns:
+        int: The event's surrogate key.
+    """
+    soup = BeautifulSoup(html_content, 'html.parser')
+    event_title = soup.find('h2', class_='b-content__title')
+    event_link = event_title.find('a') if event_title else None
+    return surrogate_key(event_link.get('href') if event_link else None, event_name)
+
+
+def _fighter_keys(fighter_name_tags, fighter_names):
+    # Each fighter's name links to their ufcstats profile
+    links = [tag.find('a') for tag in fighter_name_tags]
+    return [surrogate_key(link.get('href') if link else None, name) for link, name in zip(links, fighter_names)]
+
+
 def parse_fight_data(html_content, max_round):
     """
     Parses the fight data from the fight details HTML content.
@@ -86,7 +111,7 @@ def parse_fight_data(html_content, max_round):
         list: A list of dictionaries containing fight data for each round.
 
     Example:
-        [{'Round': 'Round 1', 'Fighter': 'Fighter 1', ...}, {'Round': 'Round 1', 'Fighter': 'Fighter 2', ...}, ...]
+        [{'Round': 'Round 1', 'Fighter': 'Fighter 1', 'Fighter ID': 123, ...}, {'Round': 'Round 1', ...}, ...]
     """
     soup = BeautifulSoup(html_content, 'html.parser')
     sections = soup.find_all('section', class_='b-fight-details__section js-fight-section')
@@ -123,12 +148,14 @@ def parse_fight_data(html_content, max_round):
             if len(fighter_data) > 0:
                 fighter_name_tags = fighter_data[0].find_all('p')
                 fighter_names = [tag.text.strip() for tag in fighter_name_tags]
+                fighter_keys = _fighter_keys(fighter_name_tags, fighter_names)
                 metrics = fighter_data[1:]
 
                 for j, fighter_name in enumerate(fighter_names):
                     fighter_info = {
                         'Round': f'Round {round_counter}',
                         'Fighter': fighter_name,
+                        'Fighter ID': fighter_keys[j],
                         'KD': metrics[0].find_all('p')[j].text.strip(),
                         'Sig. Str.': metrics[1].find_all('p')[j].text.strip(),
                         'Sig. Str. %': metrics[2].find_all('p')[j].text.strip(),
@@ -163,7 +190,7 @@ def parse_significant_strikes(html_content, max_round):
         list: A list of dictionaries containing significant strikes data for each round.
 
     Example:
-        [{'Round': 'Round 1', 'Fighter': 'Fighter 1', ...}, {'Round': 'Round 1', 'Fighter': 'Fighter 2', ...}, ...]
+        [{'Round': 'Round 1', 'Fighter': 'Fighter 1', 'Fighter ID': 123, ...}, {'Round': 'Round 1', ...}, ...]
     """
     soup = BeautifulSoup(html_content, 'html.parser')
     sig_strikes_section = None
@@ -200,12 +227,14 @@ def parse_significant_strikes(html_content, max_round):
             if len(fighter_data) > 0:
                 fighter_name_tags = fighter_data[0].find_all('p')
                 fighter_names = [tag.text.strip() for tag in fighter_name_tags]
+                fighter_keys = _fighter_keys(fighter_name_tags, fighter_names)
                 metrics = fighter_data[1:]
 
                 for j, fighter_name in enumerate(fighter_names):
                     fighter_info = {
                         'Round': f'Round {round_counter}',
                         'Fighter': fighter_name,
+                        'Fighter ID': fighter_keys[j],
                         'Sig. Str.': metrics[0].find_all('p')[j].text.strip(),
                         'Sig. Str. %': metrics[1].find_all('p')[j].text.strip(),
                         'Head': metrics[2].find_all('p')[j].text.strip(),
@@ -247,22 +276,28 @@ def extract_weight_class(html_content):
     return 'Unknown Weight Class'
 
 
-def fight_details(fight_urls, fighter_name):
+def fight_details(fight_urls, fighter_name, fighter_key=None, unparsed_urls=None):
     """
     Extracts and combines fight details and significant strikes data for a given fighter from multiple fight URLs.
 
     Args:
         fight_urls (list): A list of URLs for the fighter's fights.
         fighter_name (str): The name of the fighter.
+        fighter_key (int): The fighter's surrogate key. If given, the fighter's rows are selected by
+            key rather than by name.
+        unparsed_urls (dict): If given, filled with every fight URL that produced no rows, mapped to
+            'fetch failed', 'no round stats' for the old fights whose pages have no per-round tables,
+            or 'parse failed'.
 
     Returns:
-        pandas.DataFrame: A DataFrame containing the combined fight details and significant strikes data for the fighter.
+        pandas.DataFrame: A DataFrame containing the combined fight details and significant strikes data for the fighter,
+        with the 'Fight ID', 'Event ID' and 'Fighter ID' keys of every row.
 
     Example:
-             Event    Round  ...  Ground
-        0  Event 1  Round 1  ...     0 of 0
-        1  Event 1  Round 2  ...     1 of 1
-        2  Event 2  Round 1  ...     2 of 2
+             Fight ID  Event ID  Fighter ID    Event    Round  ...  Ground
+        0         101       201         301  Event 1  Round 1  ...     0 of 0
+        1         101       201         301  Event 1  Round 2  ...     1 of 1
+        2         102       202         301  Event 2  Round 1  ...     2 of 2
         ...
     """
     all_fights_data = []
@@ -270,19 +305,25 @@ def fight_details(fight_urls, fighter_name):
     for url in fight_urls:
         html_content = fetch_webpage(url)
         if html_content:
-            event_name = extract_event_name(html_content)
-            max_round = extract_max_round(html_content)
-            weight_class = extract_weight_class(html_content)  # Extract weight class
-            fight_data = parse_fight_data(html_content, max_round)
-            sig_strikes_data = parse_significant_strikes(html_content, max_round)
+            with timed_parse('fight'):
+                event_name = extract_event_name(html_content)
+                event_key = extract_event_key(html_content, event_name)
+                max_round = extract_max_round(html_content)
+                weight_class = extract_weight_class(html_content)  # Extract weight class
+                fight_data = parse_fight_data(html_content, max_round)
+                sig_strikes_data = parse_significant_strikes(html_content, max_round)
             if fight_data and sig_strikes_data:
+                fight_key = surrogate_key(url, url)
                 for entry in fight_data:
+                    entry['Fight ID'] = fight_key
+                    entry['Event ID'] = event_key
                     entry['Event'] = event_name
                     entry['Weight Class'] = weight_class  # Add weight class to fight data
-                for entry in sig_strikes_data:
-                    entry['Event'] = event_name
-                    entry['Weight Class'] = weight_class  # Add weight class to significant strikes data
                 all_fights_data.append((fight_data, sig_strikes_data))
+            elif unparsed_urls is not None:
+                unparsed_urls[url] = 'parse failed' if max_round else 'no round stats'
+        elif unparsed_urls is not None:
+            unparsed_urls[url] = 'fetch failed'
 
     combined_data = []
     for fight_data, sig_strikes_data in all_fights_data:
@@ -290,17 +331,20 @@ def fight_details(fight_urls, fighter_name):
         sig_strikes_df = pd.DataFrame(sig_strikes_data)
 
         # Drop redundant columns from significant strikes dataframe
-        sig_strikes_df.drop(columns=['Sig. Str.', 'Sig. Str. %'], inplace=True)
+        sig_strikes_df.drop(columns=['Sig. Str.', 'Sig. Str. %', 'Fighter'], inplace=True)
 
-        # Merge DataFrames on Round, Fighter, Event, and Weight Class
-        combined_df = pd.merge(df, sig_strikes_df, on=['Round', 'Fighter', 'Event', 'Weight Class'], how='outer', suffixes=('', '_Sig_Strikes'))
+        # Both tables are of the same fight, so each row is identified by the round and the fighter's key
+        combined_df = pd.merge(df, sig_strikes_df, on=['Round', 'Fighter ID'], how='outer', suffixes=('', '_Sig_Strikes'))
         combined_data.append(combined_df)
 
     # Concatenate all combined dataframes
     final_combined_df = pd.concat(combined_data, ignore_index=True)
-    final_combined_df = final_combined_df[['Event', 'Weight Class', 'Round', 'Fighter', 'KD', 'Sig. Str.', 'Sig. Str. %', 'Total Str.', 'TD', 'TD %', 'Sub. Att', 'Rev.', 'Ctrl', 'Head', 'Body', 'Leg', 'Distance', 'Clinch', 'Ground']]
+    final_combined_df = final_combined_df[['Fight ID', 'Event ID', 'Fighter ID', 'Event', 'Weight Class', 'Round', 'Fighter', 'KD', 'Sig. Str.', 'Sig. Str. %', 'Total Str.', 'TD', 'TD %', 'Sub. Att', 'Rev.', 'Ctrl', 'Head', 'Body', 'Leg', 'Distance', 'Clinch', 'Ground']]
 
-    final_combined_df = final_combined_df[final_combined_df['Fighter'] == fighter_name].reset_index(drop=True)
+    if fighter_key is not None:
+        final_combined_df = final_combined_df[final_combined_df['Fighter ID'] == fighter_key].reset_index(drop=True)
+    else:
+        final_combined_df = final_combined_df[final_combined_df['Fighter'] == fighter_name].reset_index(drop=True)
     final_combined_df = final_combined_df.rename(columns={'Fighter': 'Name'})
 
     return final_combined_df
@@ -1,5 +1,6 @@
 import requests
 from bs4 import BeautifulSoup
+from scrape_metrics import fetch, timed_parse
 
 
 def get_fight_urls(fighter_url):
@@ -19,18 +20,32 @@ def get_fight_urls(fighter_url):
         ['http://ufcstats.com/fight-details/abc123', 'http://ufcstats.com/fight-details/def456', ...]
     """
     try:
-        response = requests.get(fighter_url)
+        response = fetch(fighter_url, 'fighter')
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        fight_urls = []
-        for fight in soup.find_all('tr', class_='b-fight-details__table-row'):
-            data_link = fight.get('data-link')
-            if data_link and 'fight-details' in data_link:
-                fight_urls.append(data_link)
-
-        return fight_urls
+        return extract_fight_urls(response.text)
 
     except requests.exceptions.RequestException as e:
         print(f"Request failed: {e}")
         return []
+
+
+@timed_parse('fighter_fight_urls')
+def extract_fight_urls(html_content):
+    """
+    Extracts the URLs of all fights listed on a fighter's UFC stats page.
+
+    Args:
+        html_content (str): The HTML content of the fighter's page.
+
+    Returns:
+        list: A list of fight URLs.
+    """
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    fight_urls = []
+    for fight in soup.find_all('tr', class_='b-fight-details__table-row'):
+        data_link = fight.get('data-link')
+        if data_link and 'fight-details' in data_link:
+            fight_urls.append(data_link)
+
+    return fight_urls
@@ -1,11 +1,35 @@
 import requests
 from bs4 import BeautifulSoup
-def get_all_fighter_urls(base_url):
+from scrape_metrics import fetch, timed_parse
+# The directory's W, L and D columns, after first name, last name, nickname, height, weight, reach and stance
+DIRECTORY_RECORD_COLUMNS = {7: 'Wins', 8: 'Losses', 9: 'Draws'}
+
+
+def parse_directory_record(row):
+    """
+    Reads a fighter's wins, losses and draws from their row of the fighter directory.
+
+    Args:
+        row (bs4.element.Tag): The fighter's table row.
+
+    Returns:
+        dict: The 'Wins', 'Losses' and 'Draws' counts, or None if the row has no record.
+    """
+    cells = row.find_all('td')
+    try:
+        return {field: int(cells[index].text.strip()) for index, field in DIRECTORY_RECORD_COLUMNS.items()}
+    except (IndexError, ValueError):
+        return None
+
+
+def get_all_fighter_urls(base_url, fighter_records=None):
     """
     Retrieves the URLs of all fighters' profile pages from the UFC stats website.
 
     Args:
         base_url (str): The base URL of the UFC stats fighters page.
+        fighter_records (dict): If given, filled with the wins, losses and draws the directory lists
+            for each fighter, keyed by profile URL.
 
     Returns:
         dict: A dictionary with fighter names as keys and their profile URLs as values.
@@ -23,19 +47,24 @@ def get_all_fighter_urls(base_url):
     for char in 'abcdefghijklmnopqrstuvwxyz':
         url = f"{base_url}?char={char}&page=all"
         try:
-            response = requests.get(url)
+            response = fetch(url, 'directory')
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            fighter_rows = soup.find_all('tr', class_='b-statistics__table-row')
-            for row in fighter_rows:
-                name_elements = row.find_all('a', class_='b-link b-link_style_black')
-                if len(name_elements) >= 2:
-                    first_name = name_elements[0].text.strip()
-                    last_name = name_elements[1].text.strip()
-                    fighter_name = f"{first_name} {last_name}"
-                    fighter_url = name_elements[0]['href']
-                    fighter_urls[fighter_name] = fighter_url
+            with timed_parse('directory'):
+                soup = BeautifulSoup(response.text, 'html.parser')
+
+                fighter_rows = soup.find_all('tr', class_='b-statistics__table-row')
+                for row in fighter_rows:
+                    name_elements = row.find_all('a', class_='b-link b-link_style_black')
+                    if len(name_elements) >= 2:
+                        first_name = name_elements[0].text.strip()
+                        last_name = name_elements[1].text.strip()
+                        fighter_name = f"{first_name} {last_name}"
+                        fighter_url = name_elements[0]['href']
+                        fighter_urls[fighter_name] = fighter_url
+                        if fighter_records is not None:
+                            record = parse_directory_record(row)
+                            if record:
+                                fighter_records[fighter_url] = record
         except requests.exceptions.RequestException as e:
             print(f"Request failed for character {char}: {e}")
 
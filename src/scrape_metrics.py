@@ -0,0 +1,258 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from pipeline_trace import span, add_bytes
+
+METRICS_PATH = '../data/metrics/scrape.prom'
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PARSE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# Status codes that are worth retrying, after a pause that doubles with every attempt
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 1.0
+# The connect and read timeouts of a request, in seconds, after which it is retried like a
+# connection error
+REQUEST_TIMEOUT = (5, 30)
+
+# Every thread shares these limits, so fetching fighters concurrently does not multiply the load on
+# ufcstats: at most MAX_CONCURRENT_REQUESTS in flight, started at least MIN_REQUEST_INTERVAL apart
+MAX_CONCURRENT_REQUESTS = 4
+MIN_REQUEST_INTERVAL = 0.25
+_REQUEST_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+_REQUEST_START_LOCK = threading.Lock()
+_last_request_start = 0.0
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+class Counter:
+    """
+    A monotonically increasing count, one series per label combination.
+    """
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(key)} {value}')
+        return lines
+
+
+class Histogram:
+    """
+    A distribution of observed values in cumulative buckets, one series per label combination.
+    """
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._series[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{_format_labels(key + (("le", bound),))} {cumulative}')
+                lines.append(f'{self.name}_sum{_format_labels(key)} {total}')
+                lines.append(f'{self.name}_count{_format_labels(key)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The scrape layer's metrics, rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = Counter('ufcstats_requests_total', 'HTTP requests by page type and status code.')
+        self.bytes_fetched = Counter('ufcstats_response_bytes_total', 'Response bytes fetched by page type.')
+        self.retries = Counter('ufcstats_retries_total', 'Requests retried after a failure, by page type.')
+        self.cache = Counter('ufcstats_cache_requests_total', 'Scrape cache lookups by cache and result.')
+        self.fetch_latency = Histogram('ufcstats_fetch_seconds', 'HTTP fetch latency by page type.',
+                                       LATENCY_BUCKETS)
+        self.parse_time = Histogram('ufcstats_parse_seconds', 'Time spent parsing a page by page type.',
+                                    PARSE_BUCKETS)
+
+    def render(self):
+        elapsed = max(time.time() - self.started, 1e-9)
+        total_requests = sum(self.requests._values.values())  # Summed across page types and status codes
+        lines = []
+        for metric in [self.requests, self.bytes_fetched, self.retries, self.cache, self.fetch_latency,
+                       self.parse_time]:
+            lines.extend(metric.render())
+        # The average rate over the crawl, for reading the text file without a Prometheus server
+        lines.extend(['# HELP ufcstats_requests_per_second Average request rate since the crawl started.',
+                      '# TYPE ufcstats_requests_per_second gauge',
+                      f'ufcstats_requests_per_second {total_requests / elapsed}',
+                      '# HELP ufcstats_start_time_seconds Unix time the crawl started.',
+                      '# TYPE ufcstats_start_time_seconds gauge',
+                      f'ufcstats_start_time_seconds {self.started}'])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path=METRICS_PATH):
+        """
+        Writes the metrics to a Prometheus text file, e.g. for node_exporter's textfile collector.
+
+        Args:
+            path (str): The .prom file to write.
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as file:
+            file.write(self.render())
+        os.replace(tmp_path, path)
+
+
+METRICS = MetricsRegistry()
+
+
+def _wait_for_request_start():
+    # Spaces the starts of requests from all threads at least MIN_REQUEST_INTERVAL apart
+    global _last_request_start
+    with _REQUEST_START_LOCK:
+        delay = _last_request_start + MIN_REQUEST_INTERVAL - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        _last_request_start = time.monotonic()
+
+
+def fetch(url, page_type):
+    """
+    Fetches a ufcstats page, recording its latency, size and status code. Connection errors,
+    timeouts after REQUEST_TIMEOUT and rate limiting or server errors are retried up to MAX_RETRIES
+    times with a growing pause. Requests from every thread share the MAX_CONCURRENT_REQUESTS and
+    MIN_REQUEST_INTERVAL limits.
+
+    Args:
+        url (str): The URL to fetch.
+        page_type (str): The kind of page, e.g. 'directory', 'fighter' or 'fight'.
+
+    Returns:
+        requests.Response: The last response received.
+
+    Raises:
+        requests.exceptions.RequestException: If the request still fails after the retries.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            METRICS.retries.inc(page_type=page_type)
+            time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+        with _REQUEST_SLOTS:
+            _wait_for_request_start()
+            start = time.perf_counter()
+            try:
+                with span('http_get', url=url):
+                    response = requests.get(url, timeout=REQUEST_TIMEOUT)
+                    add_bytes(len(response.content))
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                METRICS.requests.inc(page_type=page_type, status='error')
+                if attempt == MAX_RETRIES:
+                    raise
+                continue
+            finally:
+                METRICS.fetch_latency.observe(time.perf_counter() - start, page_type=page_type)
+
+        METRICS.requests.inc(page_type=page_type, status=str(response.status_code))
+        METRICS.bytes_fetched.inc(len(response.content), page_type=page_type)
+        if response.status_code not in RETRY_STATUS_CODES:
+            break
+    return response
+
+
+@contextmanager
+def timed_parse(page_type):
+    """
+    Times the parsing of a page as a trace span and in the parse time histogram.
+
+    Args:
+        page_type (str): The kind of page being parsed.
+    """
+    start = time.perf_counter()
+    try:
+        with span(f'parse_{page_type}'):
+            yield
+    finally:
+        METRICS.parse_time.observe(time.perf_counter() - start, page_type=page_type)
+
+
+def record_cache(cache, hit):
+    """
+    Counts a scrape cache lookup.
+
+    Args:
+        cache (str): The cache's name.
+        hit (bool): Whether the lookup was a hit.
+    """
+    METRICS.cache.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def serve_metrics(port=9108, host='127.0.0.1'):
+    """
+    Serves the metrics at http://host:port/metrics on a background thread for Prometheus to scrape.
+
+    Args:
+        port (int): The port to listen on.
+        host (str): The interface to bind.
+
+    Returns:
+        ThreadingHTTPServer: The running server; call shutdown() to stop it.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = METRICS.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving scrape metrics on http://{host}:{port}/metrics")
+    return server
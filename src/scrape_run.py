@@ -1,3 +1,4 @@
+import argparse
 import pandas as pd
 import time
 from scrape_fighters import get_all_fighter_urls
@@ -5,6 +6,10 @@ from scrape_basic_stats import get_fighter_basic_stats
 from scrape_fight_urls import get_fight_urls
 from scrape_fight_dates import fetch_webpage, extract_fight_dates_and_results
 from scrape_fight_round_details import fight_details
+from surrogate_keys import surrogate_key
+from scrape_metrics import METRICS, METRICS_PATH, serve_metrics
+
+RAW_DATA_PATH = '../data/combined_fighter_data.csv'
 
 
 def fighter_stats(fighter_url):
@@ -23,17 +28,16 @@ def fighter_stats(fighter_url):
 
     try:
         stats = get_fighter_basic_stats(fighter_url)
+        stats['Fighter ID'] = surrogate_key(fighter_url, stats['Name'])
         all_fighter_stats.append(stats)
 
         html_content = fetch_webpage(fighter_url)
         if html_content:
             fight_dates = extract_fight_dates_and_results(html_content)
-            for fight in fight_dates:
-                fight['Name'] = stats['Name']  # Add fighter name to each fight date
             all_fight_dates.extend(fight_dates)
 
         fight_urls = get_fight_urls(fighter_url)
-        fighter_round_df = fight_details(fight_urls, stats['Name'])
+        fighter_round_df = fight_details(fight_urls, stats['Name'], stats['Fighter ID'])
 
         combined_fighter_round_df = pd.concat([combined_fighter_round_df, fighter_round_df], ignore_index=True)
     except Exception as e:
@@ -43,20 +47,23 @@ def fighter_stats(fighter_url):
     df_fighter_stats = pd.DataFrame(all_fighter_stats)
     df_fight_dates = pd.DataFrame(all_fight_dates)
 
-    # Merge the DataFrames to get the final combined data
-    final_combined_df = combined_fighter_round_df.merge(df_fighter_stats, on='Name', how='inner')
-    final_combined_df = final_combined_df.merge(df_fight_dates, on=['Event', 'Name'], how='inner')
+    # Merge the DataFrames on the fighter and fight keys to get the final combined data
+    final_combined_df = combined_fighter_round_df.merge(df_fighter_stats.drop(columns='Name'), on='Fighter ID',
+                                                        how='inner')
+    final_combined_df = final_combined_df.merge(df_fight_dates.drop(columns=['Event', 'Event ID']), on='Fight ID',
+                                                how='inner')
 
     return final_combined_df
 
 
-def fetch_all_fighter_data(all_fighter_urls):
+def fetch_all_fighter_data(all_fighter_urls, metrics_path=None):
     """
     Fetches fight data for a specified number of fighters and compiles it into a single DataFrame.
 
     Args:
         all_fighter_urls (dict): A dictionary with fighter names as keys and their profile URLs as values.
-        num_fighters (int): The number of fighters to process (default is 2).
+        metrics_path (str): A Prometheus text file to rewrite with the scrape metrics after every
+                            fighter, or None to skip writing.
 
     Returns:
         pd.DataFrame: A DataFrame containing fight data for the specified number of fighters.
@@ -70,15 +77,40 @@ def fetch_all_fighter_data(all_fighter_urls):
             combined_data = pd.concat([combined_data, fighter_data], ignore_index=True)
         except Exception as e:
             print(f"Failed to fetch data for {fighter_name}: {e}")
+        if metrics_path:
+            METRICS.write(metrics_path)
         time.sleep(1)  # Sleep to avoid overwhelming the server
 
     return combined_data
 
 
-if __name__ == "__main__":
+def crawl(output_path=RAW_DATA_PATH, metrics_path=METRICS_PATH, metrics_port=None):
+    """
+    Scrapes every fighter in the ufcstats directory and saves their round statistics.
+
+    Args:
+        output_path (str): The CSV file to write the combined data to.
+        metrics_path (str): The Prometheus text file rewritten with the scrape metrics after every fighter.
+        metrics_port (int): A port to also serve the metrics on during the crawl, or None.
+    """
+    if metrics_port:
+        serve_metrics(metrics_port)
+
     base_url = 'http://ufcstats.com/statistics/fighters'
     all_fighter_urls = get_all_fighter_urls(base_url)
-    combined_fighter_data = fetch_all_fighter_data(all_fighter_urls)
-    combined_fighter_data.to_csv('../data/combined_fighter_data.csv', index=False)
-    print("Data collection complete and saved to 'combined_fighter_data.csv'")
+    combined_fighter_data = fetch_all_fighter_data(all_fighter_urls, metrics_path)
+    combined_fighter_data.to_csv(output_path, index=False)
+    print(f"Data collection complete and saved to '{output_path}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Scrape the round statistics of every fighter on ufcstats.')
+    parser.add_argument('--output', default=RAW_DATA_PATH)
+    parser.add_argument('--metrics-file', default=METRICS_PATH,
+                        help='Prometheus text file rewritten with the scrape metrics after every fighter.')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Also serve the metrics at http://127.0.0.1:<port>/metrics during the crawl.')
+    args = parser.parse_args()
+
+    crawl(args.output, args.metrics_file, args.metrics_port)
     
\ No newline at end of file
@@ -0,0 +1,186 @@
+import hashlib
+import inspect
+import json
+import os
+import sys
+
+import pandas as pd
+
+CACHE_DIR = '../data/cache/stages'
+MAX_CACHE_ENTRIES = 256
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+
+
+def fingerprint_frame(df):
+    """
+    Computes a content hash for a DataFrame, covering its columns, dtypes and every row.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to fingerprint.
+
+    Returns:
+        str: A hex digest that changes whenever the frame's content changes.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(col) for col in df.columns]).encode('utf-8'))
+    digest.update(json.dumps([str(dtype) for dtype in df.dtypes]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def fingerprint_value(value):
+    """
+    Computes a hash for a stage input, which can be a DataFrame or any JSON-serializable parameter.
+
+    Args:
+        value: The stage input to fingerprint.
+
+    Returns:
+        str: A hex digest of the input.
+    """
+    if isinstance(value, pd.DataFrame):
+        return fingerprint_frame(value)
+    encoded = json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def code_version(func):
+    """
+    Hashes the source of the module defining a stage function, together with the source of any
+    project module it imports functions from, so that editing the cleaning code invalidates the cache.
+
+    Args:
+        func (callable): The stage function.
+
+    Returns:
+        str: A hex digest of the relevant source code.
+    """
+    module = inspect.getmodule(func)
+    module_dir = os.path.dirname(os.path.abspath(module.__file__))
+    modules = {module.__name__: module}
+
+    for value in vars(module).values():
+        dependency = inspect.getmodule(value)
+        dependency_file = getattr(dependency, '__file__', None)
+        if dependency_file and os.path.dirname(os.path.abspath(dependency_file)) == module_dir:
+            modules[dependency.__name__] = dependency
+
+    digest = hashlib.sha256()
+    for name in sorted(modules):
+        digest.update(inspect.getsource(modules[name]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def stage_key(stage_name, func, inputs, params):
+    """
+    Builds the cache key for one execution of a pipeline stage.
+
+    Args:
+        stage_name (str): The name of the stage, e.g. 'clean' or 'engineer'.
+        func (callable): The function implementing the stage.
+        inputs (tuple): The positional inputs passed to the stage.
+        params (dict): The keyword parameters passed to the stage.
+
+    Returns:
+        str: A hex digest identifying the stage's output.
+    """
+    digest = hashlib.sha256()
+    digest.update(stage_name.encode('utf-8'))
+    digest.update(code_version(func).encode('utf-8'))
+    for value in inputs:
+        digest.update(fingerprint_value(value).encode('utf-8'))
+    digest.update(fingerprint_value(params).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def evict_stage_cache(cache_dir=CACHE_DIR, max_entries=MAX_CACHE_ENTRIES, max_bytes=MAX_CACHE_BYTES):
+    """
+    Removes the least recently used cache entries until the cache fits within its limits.
+
+    Args:
+        cache_dir (str): The directory holding cached stage outputs.
+        max_entries (int): The maximum number of entries to keep.
+        max_bytes (int): The maximum total size of the cache in bytes.
+
+    Returns:
+        int: The number of entries removed.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith('.pkl'):
+            path = os.path.join(cache_dir, file_name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    # Most recently used first, so everything past the limits is the oldest
+    entries.sort(reverse=True)
+    removed = 0
+    total_bytes = 0
+    for index, (_, size, path) in enumerate(entries):
+        total_bytes += size
+        if index >= max_entries or total_bytes > max_bytes:
+            os.remove(path)
+            removed += 1
+
+    return removed
+
+
+def cached_stage(stage_name, func, *inputs, cache_dir=CACHE_DIR, enabled=True, **params):
+    """
+    Runs a pipeline stage, loading its output from the on-disk cache when the stage's inputs,
+    parameters and code are unchanged since a previous run.
+
+    Args:
+        stage_name (str): The name of the stage, used in the cache key and log messages.
+        func (callable): The function implementing the stage.
+        *inputs: Positional inputs for the stage, usually DataFrames.
+        cache_dir (str): The directory holding cached stage outputs.
+        enabled (bool): If False, the stage always runs and nothing is cached.
+        **params: Keyword parameters for the stage.
+
+    Returns:
+        The output of the stage.
+    """
+    if not enabled:
+        return func(*inputs, **params)
+
+    key = stage_key(stage_name, func, inputs, params)
+    path = os.path.join(cache_dir, f'{stage_name}_{key[:32]}.pkl')
+
+    if os.path.exists(path):
+        try:
+            result = pd.read_pickle(path)
+            os.utime(path)  # Mark as recently used for LRU eviction
+            print(f"Loaded '{stage_name}' stage from cache.")
+            return result
+        except Exception as e:
+            print(f"Failed to read cached '{stage_name}' stage, recomputing: {e}")
+
+    result = func(*inputs, **params)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    pd.to_pickle(result, temp_path)
+    os.replace(temp_path, path)
+    evict_stage_cache(cache_dir)
+
+    return result
+
+
+def clear_stage_cache(cache_dir=CACHE_DIR):
+    """
+    Removes every cached stage output.
+
+    Args:
+        cache_dir (str): The directory holding cached stage outputs.
+    """
+    evict_stage_cache(cache_dir, max_entries=0)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'clear':
+        clear_stage_cache()
+        print("Stage cache cleared.")
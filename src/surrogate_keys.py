@@ -0,0 +1,104 @@
+import hashlib
+
+import pandas as pd
+
+# The integer key columns of the raw scraped data, derived from ufcstats' fight, event and fighter IDs
+ID_COLUMNS = ['Fight ID', 'Event ID', 'Fighter ID']
+
+# Keys are kept below 2**63 so that they fit a signed int64 column
+KEY_MASK = (1 << 63) - 1
+
+
+def ufcstats_id(url):
+    """
+    Gets the ID that ends a ufcstats fighter, event or fight URL.
+
+    Args:
+        url (str): The URL, e.g. 'http://ufcstats.com/fighter-details/e5549c82bfb5582d'.
+
+    Returns:
+        str: The 16 digit hex ID, or None if the URL does not end in one.
+    """
+    if not url:
+        return None
+    page_id = url.rstrip('/').rsplit('/', 1)[-1]
+    try:
+        int(page_id, 16)
+    except ValueError:
+        return None
+    return page_id
+
+
+def name_key(*names):
+    """
+    Derives an integer key from display names, for rows that have no ufcstats ID.
+
+    Args:
+        *names: The names identifying the entity, e.g. an event and both of its fighters.
+
+    Returns:
+        int: A non-negative key that fits in an int64.
+    """
+    digest = hashlib.md5('\x1f'.join(str(name) for name in names).encode('utf-8')).hexdigest()
+    return int(digest[:16], 16) & KEY_MASK
+
+
+def surrogate_key(url, *fallback_names):
+    """
+    Derives a stable integer key for a ufcstats fighter, event or fight from its URL. The key is
+    the page's hex ID read as an integer, so it is the same in every scrape.
+
+    Args:
+        url (str): The page's URL.
+        *fallback_names: The names to derive the key from with name_key if the URL has no ID.
+
+    Returns:
+        int: A non-negative key that fits in an int64.
+    """
+    page_id = ufcstats_id(url)
+    if page_id is None:
+        return name_key(*fallback_names)
+    return int(page_id, 16) & KEY_MASK
+
+
+def _name_keys(columns):
+    # Each distinct combination of names is hashed once
+    codes, uniques = pd.MultiIndex.from_arrays([column.fillna('').astype(str) for column in columns]).factorize()
+    return pd.Series([name_key(*names) for names in uniques], dtype='int64').to_numpy()[codes]
+
+
+def fill_surrogate_keys(raw_data, columns=ID_COLUMNS):
+    """
+    Makes sure raw scraped rows carry integer keys. Rows scraped before the scrapers wrote the
+    keys, or from pages without a ufcstats link, get keys derived from the display names: the
+    fighter's name, the event's name, and for a fight the event with the unordered pair of
+    fighters, so that both fighters' rows of a fight share the key.
+
+    Args:
+        raw_data (pd.DataFrame): Raw rows in the combined_fighter_data.csv format.
+        columns (list): The key columns to fill, by default all of ID_COLUMNS.
+
+    Returns:
+        pd.DataFrame: The rows with the key columns as int64.
+    """
+    keys = {}
+    for column in columns:
+        existing = raw_data[column] if column in raw_data.columns else pd.Series(pd.NA, index=raw_data.index)
+        missing = existing.isna().to_numpy()
+        if not missing.any():
+            keys[column] = existing.astype('int64')
+            continue
+
+        rows = raw_data[missing]
+        if column == 'Fighter ID':
+            derived = _name_keys([rows['Name']])
+        elif column == 'Event ID':
+            derived = _name_keys([rows['Event']])
+        else:
+            fighters = rows[['Fighter_1', 'Fighter_2']].astype(str)
+            derived = _name_keys([rows['Event'], fighters.min(axis=1), fighters.max(axis=1)])
+        filled = existing.astype('Int64').to_numpy(dtype='int64', na_value=0)
+        filled[missing] = derived
+        keys[column] = pd.Series(filled, index=raw_data.index)
+
+    return raw_data.assign(**keys)
@@ -0,0 +1,273 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from surrogate_keys import ID_COLUMNS, KEY_MASK
+
+SYNTHETIC_DATA_DIR = '../data/synthetic'
+
+RAW_COLUMNS = ID_COLUMNS + [
+    'Event', 'Weight Class', 'Round', 'Name', 'KD', 'Sig. Str.', 'Sig. Str. %', 'Total Str.', 'TD', 'TD %',
+    'Sub. Att', 'Rev.', 'Ctrl', 'Head', 'Body', 'Leg', 'Distance', 'Clinch', 'Ground', 'Wins', 'Losses', 'Draws',
+    'No Contests', 'Height', 'Weight', 'Reach', 'Stance', 'DOB', 'Date', 'Result', 'Method', 'Fighter_1', 'Fighter_2'
+]
+
+# Weight class title, weight limit in pounds, whether it has a women's division, and share of the roster
+WEIGHT_CLASSES = [
+    ('Strawweight', 115, True, 0.06),
+    ('Flyweight', 125, True, 0.10),
+    ('Bantamweight', 135, True, 0.14),
+    ('Featherweight', 145, True, 0.13),
+    ('Lightweight', 155, False, 0.16),
+    ('Welterweight', 170, False, 0.15),
+    ('Middleweight', 185, False, 0.12),
+    ('Light Heavyweight', 205, False, 0.07),
+    ('Heavyweight', 265, False, 0.07),
+]
+
+METHODS = [
+    ('U-DEC', 0.30), ('S-DEC', 0.06), ('M-DEC', 0.01), ('KO/TKO Punches', 0.22), ('KO/TKO Punch', 0.07),
+    ('KO/TKO Kick', 0.03), ('KO/TKO Elbows', 0.02), ('Submission Rear Naked Choke', 0.10),
+    ('Submission Guillotine Choke', 0.06), ('Submission Armbar', 0.04), ('TKO - Doctor\'s Stoppage', 0.02),
+    ('DQ', 0.005), ('Overturned', 0.005), ('Other', 0.02),
+]
+
+FIRST_NAMES = [
+    'Alex', 'Jon', 'Israel', 'Jiri', 'Islam', 'Charles', 'Dustin', 'Max', 'Alexander', 'Ilia', 'Sean', 'Merab',
+    'Alexandre', 'Brandon', 'Leon', 'Belal', 'Kamaru', 'Dricus', 'Robert', 'Magomed', 'Tom', 'Ciryl', 'Zhang',
+    'Valentina', 'Amanda', 'Julianna', 'Rose', 'Tatiana', 'Manon', 'Erin', 'Beneil', 'Justin', 'Arman', 'Mateusz',
+    'Jamahal', 'Khamzat', 'Sean', 'Paulo', 'Jan', 'Curtis'
+]
+LAST_NAMES = [
+    'Pereira', 'Jones', 'Adesanya', 'Prochazka', 'Makhachev', 'Oliveira', 'Poirier', 'Holloway', 'Volkanovski',
+    'Topuria', 'OMalley', 'Dvalishvili', 'Pantoja', 'Moreno', 'Edwards', 'Muhammad', 'Usman', 'Du Plessis',
+    'Whittaker', 'Ankalaev', 'Aspinall', 'Gane', 'Weili', 'Shevchenko', 'Nunes', 'Pena', 'Namajunas', 'Suarez',
+    'Fiorot', 'Blanchfield', 'Dariush', 'Gaethje', 'Tsarukyan', 'Gamrot', 'Hill', 'Chimaev', 'Strickland', 'Costa',
+    'Blachowicz', 'Blaydes'
+]
+
+
+def fighter_names(n_fighters):
+    names = [f'{first} {last}' for last in LAST_NAMES for first in FIRST_NAMES]
+    # Past every first and last name combination, the names get a numeric suffix to stay unique
+    return [names[i % len(names)] + (f' {i // len(names)}' if i >= len(names) else '') for i in range(n_fighters)]
+
+
+def _x_of_y(landed, thrown):
+    return landed.astype(str) + ' of ' + thrown.astype(str)
+
+
+def _percent(landed, thrown):
+    # ufcstats shows '---' when nothing was attempted
+    percent = pd.Series(100 * landed // np.maximum(thrown, 1)).astype(str) + '%'
+    return percent.where(thrown > 0, '---')
+
+
+def _synthetic_keys(count, kind):
+    # Distinct scrambled keys in place of the ones the scrapers derive from ufcstats IDs. Keeping the
+    # low 63 bits of the uint64 product multiplies modulo 2**63, where multiplying by an odd constant
+    # is a bijection, so no two entities of a kind share a key while the indices stay below 2**63
+    index = np.arange(count, dtype=np.uint64) + np.uint64(kind << 40)
+    return ((index * np.uint64(0x9E3779B97F4A7C15 & KEY_MASK)) & np.uint64(KEY_MASK)).astype(np.int64)
+
+
+def _split(rng, totals, shares):
+    """
+    Splits every total into len(shares) non-negative integer parts that sum to it.
+    """
+    parts = np.zeros((len(totals), len(shares)), dtype=np.int64)
+    remaining = totals.copy()
+    remaining_share = 1.0
+    for i, share in enumerate(shares[:-1]):
+        parts[:, i] = rng.binomial(remaining, min(1.0, share / remaining_share))
+        remaining -= parts[:, i]
+        remaining_share -= share
+    parts[:, -1] = remaining
+    return parts
+
+
+def generate_raw_rounds(n_rows, seed=0, fights_per_fighter=10, start_year=1994, end_year=2024):
+    """
+    Generates synthetic round-by-round fight data in the schema written by the scraper, with
+    "X of Y" strike strings, percentages, control times, ufcstats date formats and weight class
+    bout titles. Every fight appears once per round in each fighter's rows, each fighter's rows are
+    contiguous and latest fight first as on their ufcstats page, and profile columns (record,
+    height, reach, stance, date of birth) are constant per fighter.
+
+    Args:
+        n_rows (int): The approximate number of rows to generate.
+        seed (int): The random seed; the same seed and size always give the same data.
+        fights_per_fighter (int): The average number of fights per fighter, which sets the roster size.
+        start_year (int): The year of the first event.
+        end_year (int): The year of the last event.
+
+    Returns:
+        pd.DataFrame: The synthetic raw data with the scraper's columns.
+    """
+    rng = np.random.default_rng(seed)
+
+    # A fight has about 2.45 rounds on average and one row per round for each fighter
+    n_fights = max(2, int(round(n_rows / (2 * 2.45))))
+    n_fighters = max(4, 2 * n_fights // fights_per_fighter)
+
+    # Roster: every fighter has a weight class, gender and constant profile
+    class_index = rng.choice(len(WEIGHT_CLASSES), n_fighters, p=[share for *_, share in WEIGHT_CLASSES])
+    has_women = np.array([women for _, _, women, _ in WEIGHT_CLASSES])
+    is_woman = has_women[class_index] & (rng.random(n_fighters) < 0.3)
+    weight = np.array([limit for _, limit, _, _ in WEIGHT_CLASSES])[class_index]
+    height = np.clip(np.round(50 + weight / 10 + rng.normal(0, 2, n_fighters) - 4 * is_woman), 58, 84).astype(int)
+    reach = height + np.round(rng.normal(1, 2, n_fighters)).astype(int)
+    birth_dates = pd.to_datetime(f'{start_year - 35}-01-01') + pd.to_timedelta(
+        rng.integers(0, 365 * (end_year - start_year + 20), n_fighters), unit='D')
+    fighters = pd.DataFrame({
+        'Name': fighter_names(n_fighters),
+        'Wins': rng.poisson(12, n_fighters),
+        'Losses': rng.poisson(4, n_fighters),
+        'Draws': rng.binomial(1, 0.1, n_fighters),
+        'No Contests': rng.binomial(1, 0.05, n_fighters),
+        'Height': pd.Series(height).astype(str) + ' inches',
+        'Weight': pd.Series(weight).astype(str) + ' lbs.',
+        'Reach': pd.Series(reach).astype(str) + ' inches',
+        'Stance': rng.choice(['Orthodox', 'Southpaw', 'Switch'], n_fighters, p=[0.72, 0.22, 0.06]),
+        'DOB': birth_dates.strftime('%b %d, %Y'),
+    })
+
+    # Fights: two distinct fighters of the same division
+    division = class_index * 2 + is_woman
+    division_sizes = np.bincount(division, minlength=2 * len(WEIGHT_CLASSES))
+    valid_divisions = np.flatnonzero(division_sizes >= 2)
+    division_share = division_sizes[valid_divisions] / division_sizes[valid_divisions].sum()
+    fight_division = rng.choice(valid_divisions, n_fights, p=division_share)
+    fighter_1 = np.empty(n_fights, dtype=np.int64)
+    fighter_2 = np.empty(n_fights, dtype=np.int64)
+    for div in valid_divisions:
+        fights_in_division = np.flatnonzero(fight_division == div)
+        members = np.flatnonzero(division == div)
+        first = rng.integers(0, len(members), len(fights_in_division))
+        second = (first + rng.integers(1, len(members), len(fights_in_division))) % len(members)
+        fighter_1[fights_in_division] = members[first]
+        fighter_2[fights_in_division] = members[second]
+
+    # Events of about 12 fights, evenly spaced in time
+    fight_event = np.sort(rng.integers(0, max(1, n_fights // 12), n_fights))
+    n_events = fight_event.max() + 1
+    event_dates = pd.date_range(f'{start_year}-01-01', f'{end_year}-12-31', periods=n_events).normalize()
+    event_names = np.array([f'UFC Fight Night {i + 1}' for i in range(n_events)], dtype=object)
+
+    is_title = rng.random(n_fights) < 0.06
+    method_share = np.array([share for _, share in METHODS])
+    method = rng.choice([name for name, _ in METHODS], n_fights, p=method_share / method_share.sum())
+    max_rounds = np.where(is_title, 5, 3)
+    is_decision = np.char.find(method.astype(str), 'DEC') >= 0
+    n_rounds = np.where(is_decision, max_rounds, rng.integers(1, max_rounds + 1))
+    # fighter_1 is the winner unless the bout was overturned or drawn
+    no_contest = method == 'Overturned'
+    draw = is_decision & (rng.random(n_fights) < 0.01)
+
+    division_titles = np.array([f"{'Women' + chr(39) + 's ' if div % 2 else ''}{WEIGHT_CLASSES[div // 2][0]}"
+                                for div in range(2 * len(WEIGHT_CLASSES))], dtype=object)
+    bout_title = np.where(is_title, 'UFC ' + division_titles[fight_division] + ' Title Bout',
+                          division_titles[fight_division] + ' Bout')
+
+    # One row per fight, round and side
+    fight_rows = np.repeat(np.arange(n_fights), n_rounds * 2)
+    offsets = np.arange(len(fight_rows)) - np.repeat(np.cumsum(n_rounds * 2) - n_rounds * 2, n_rounds * 2)
+    round_number = offsets // 2 + 1
+    side = offsets % 2
+    fighter = np.where(side == 0, fighter_1[fight_rows], fighter_2[fight_rows])
+    opponent = np.where(side == 0, fighter_2[fight_rows], fighter_1[fight_rows])
+    n = len(fight_rows)
+
+    result = np.where(side == 0, 'win', 'loss').astype(object)
+    result[draw[fight_rows]] = 'draw'
+    result[no_contest[fight_rows]] = 'nc'
+
+    # Round statistics, with landed never above thrown and positional splits summing to the totals
+    sig_thrown = rng.poisson(rng.gamma(4, 9, n))
+    sig_landed = rng.binomial(sig_thrown, rng.beta(9, 11, n))
+    total_thrown = sig_thrown + rng.poisson(8, n)
+    total_landed = sig_landed + rng.binomial(total_thrown - sig_thrown, 0.7)
+    td_thrown = rng.poisson(0.9, n)
+    td_landed = rng.binomial(td_thrown, 0.4)
+    ctrl_seconds = np.minimum(300, rng.poisson(20 + 40 * td_landed))
+
+    target_landed = _split(rng, sig_landed, [0.65, 0.2, 0.15])
+    target_missed = _split(rng, sig_thrown - sig_landed, [0.75, 0.15, 0.1])
+    position_landed = _split(rng, sig_landed, [0.75, 0.12, 0.13])
+    position_missed = _split(rng, sig_thrown - sig_landed, [0.85, 0.08, 0.07])
+
+    rows = pd.DataFrame({
+        'Fight ID': _synthetic_keys(n_fights, 1)[fight_rows],
+        'Event ID': _synthetic_keys(n_events, 2)[fight_event[fight_rows]],
+        'Fighter ID': _synthetic_keys(n_fighters, 3)[fighter],
+        'Event': event_names[fight_event[fight_rows]],
+        'Weight Class': bout_title[fight_rows],
+        'Round': 'Round ' + pd.Series(round_number).astype(str),
+        'Name': fighters['Name'].to_numpy()[fighter],
+        'KD': rng.poisson(0.08, n),
+        'Sig. Str.': _x_of_y(sig_landed, sig_thrown),
+        'Sig. Str. %': _percent(sig_landed, sig_thrown),
+        'Total Str.': _x_of_y(total_landed, total_thrown),
+        'TD': _x_of_y(td_landed, td_thrown),
+        'TD %': _percent(td_landed, td_thrown),
+        'Sub. Att': rng.poisson(0.15, n),
+        'Rev.': rng.poisson(0.03, n),
+        'Ctrl': pd.Series(ctrl_seconds // 60).astype(str) + ':' + pd.Series(ctrl_seconds % 60).astype(str).str.zfill(2),
+    })
+    for i, column in enumerate(['Head', 'Body', 'Leg']):
+        rows[column] = _x_of_y(target_landed[:, i], target_landed[:, i] + target_missed[:, i])
+    for i, column in enumerate(['Distance', 'Clinch', 'Ground']):
+        rows[column] = _x_of_y(position_landed[:, i], position_landed[:, i] + position_missed[:, i])
+
+    profile = fighters.drop(columns='Name').iloc[fighter].reset_index(drop=True)
+    rows = pd.concat([rows, profile], axis=1)
+    rows['Date'] = event_dates[fight_event[fight_rows]].strftime('%b. %d, %Y')
+    rows['Result'] = result
+    rows['Method'] = method[fight_rows]
+    names = fighters['Name'].to_numpy()
+    # Each row lists its own fighter first, as the fight history on their ufcstats page does
+    rows['Fighter_1'] = names[fighter]
+    rows['Fighter_2'] = names[opponent]
+
+    # Each fighter's rows together, latest fight first and rounds in order, as the scraper writes them
+    order = np.lexsort((round_number, -fight_rows, fighter))
+    return rows.iloc[order][RAW_COLUMNS].reset_index(drop=True)
+
+
+def synthetic_raw_path(n_rows, seed=0, data_dir=SYNTHETIC_DATA_DIR):
+    return os.path.join(data_dir, f'raw_rounds_{n_rows}_{seed}.csv')
+
+
+def load_synthetic_raw_rounds(n_rows, seed=0, data_dir=SYNTHETIC_DATA_DIR):
+    """
+    Loads the synthetic raw data of a given size, generating and saving it first if needed. The
+    data is read back from CSV so that its dtypes match scraped data loaded from disk.
+
+    Args:
+        n_rows (int): The approximate number of rows.
+        seed (int): The random seed.
+        data_dir (str): The directory the generated CSVs are kept in.
+
+    Returns:
+        pd.DataFrame: The synthetic raw data.
+    """
+    path = synthetic_raw_path(n_rows, seed, data_dir)
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        start = time.perf_counter()
+        generate_raw_rounds(n_rows, seed).to_csv(path, index=False)
+        print(f"Generated {path} in {time.perf_counter() - start:.2f}s")
+    return pd.read_csv(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate synthetic raw round data in the scraper schema.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=SYNTHETIC_DATA_DIR)
+    args = parser.parse_args()
+
+    for n_rows in args.rows:
+        load_synthetic_raw_rounds(n_rows, args.seed, args.data_dir)
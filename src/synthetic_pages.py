@@ -0,0 +1,362 @@
+import argparse
+import hashlib
+import os
+from datetime import date, timedelta
+
+import numpy as np
+from synthetic_data import METHODS, WEIGHT_CLASSES, fighter_names
+
+SYNTHETIC_PAGES_DIR = '../data/synthetic/html'
+
+TOTALS_COLUMNS = ['KD', 'Sig. str.', 'Sig. str. %', 'Total str.', 'Td', 'Td %', 'Sub. att', 'Rev.', 'Ctrl']
+SIG_STRIKES_COLUMNS = ['Sig. str', 'Sig. str. %', 'Head', 'Body', 'Leg', 'Distance', 'Clinch', 'Ground']
+
+
+def _page_id(key):
+    # ufcstats identifies pages by a 16 digit hex ID
+    return hashlib.md5(key.encode('utf-8')).hexdigest()[:16]
+
+
+def _stat_cell(values, align_left=False):
+    align = ' l-page_align_left' if align_left else ''
+    paragraphs = ''.join(f'\n          <p class="b-fight-details__table-text">\n            {value}\n          </p>'
+                         for value in values)
+    return f'\n        <td class="b-fight-details__table-col{align}">{paragraphs}\n        </td>'
+
+
+def _x_of_y(landed, thrown):
+    return f'{landed} of {thrown}'
+
+
+def _percent(landed, thrown):
+    return f'{100 * landed // thrown}%' if thrown else '---'
+
+
+def _round_stats(rng):
+    """
+    Draws one fighter's statistics for one round, as the strings shown on a fight page.
+    """
+    sig_thrown = int(rng.poisson(rng.gamma(4, 9)))
+    sig_landed = int(rng.binomial(sig_thrown, rng.beta(9, 11)))
+    total_thrown = sig_thrown + int(rng.poisson(8))
+    total_landed = sig_landed + int(rng.binomial(total_thrown - sig_thrown, 0.7))
+    td_thrown = int(rng.poisson(0.9))
+    td_landed = int(rng.binomial(td_thrown, 0.4))
+    ctrl = int(min(300, rng.poisson(20 + 40 * td_landed)))
+
+    def split(total, shares):
+        parts = rng.multinomial(total, shares)
+        return [int(part) for part in parts]
+
+    targets_landed, targets_missed = split(sig_landed, [0.65, 0.2, 0.15]), split(sig_thrown - sig_landed, [0.75, 0.15, 0.1])
+    positions_landed = split(sig_landed, [0.75, 0.12, 0.13])
+    positions_missed = split(sig_thrown - sig_landed, [0.85, 0.08, 0.07])
+
+    totals = [str(int(rng.poisson(0.08))), _x_of_y(sig_landed, sig_thrown), _percent(sig_landed, sig_thrown),
+              _x_of_y(total_landed, total_thrown), _x_of_y(td_landed, td_thrown), _percent(td_landed, td_thrown),
+              str(int(rng.poisson(0.15))), str(int(rng.poisson(0.03))), f'{ctrl // 60}:{ctrl % 60:02d}']
+    sig_strikes = [_x_of_y(sig_landed, sig_thrown), _percent(sig_landed, sig_thrown)] + \
+        [_x_of_y(landed, landed + missed) for landed, missed in zip(targets_landed, targets_missed)] + \
+        [_x_of_y(landed, landed + missed) for landed, missed in zip(positions_landed, positions_missed)]
+    return totals, sig_strikes
+
+
+def _stats_row(names, fighter_stats):
+    cells = _stat_cell([f'<a class="b-link b-link_style_black" href="http://ufcstats.com/fighter-details/'
+                        f'{_page_id(name)}">{name}</a>' for name in names], align_left=True)
+    for column in range(len(fighter_stats[0])):
+        cells += _stat_cell([stats[column] for stats in fighter_stats])
+    return f'\n      <tr class="b-fight-details__table-row">{cells}\n      </tr>'
+
+
+def _table_head(columns):
+    headers = ''.join(f'\n          <th class="b-fight-details__table-col">{column}</th>' for column in columns)
+    return f'\n    <thead class="b-fight-details__table-head">\n      <tr class="b-fight-details__table-row">' \
+           f'\n          <th class="b-fight-details__table-col l-page_align_left">Fighter</th>{headers}\n      </tr>\n    </thead>'
+
+
+def _stats_section(title, columns, names, round_stats, per_round):
+    """
+    Renders a "Totals" or "Significant Strikes" section: the fight totals table and, unless
+    per_round is False, the collapsible per-round table.
+    """
+    def total(values):
+        # Totals sum the landed and attempted counts, and show the first round for other columns
+        if ' of ' in values[0]:
+            landed = sum(int(value.split(' of ')[0]) for value in values)
+            thrown = sum(int(value.split(' of ')[1]) for value in values)
+            return _x_of_y(landed, thrown)
+        return values[0]
+
+    totals = [[total([stats[side][column] for stats in round_stats]) for column in range(len(columns))]
+              for side in range(2)]
+    html = f'''
+  <section class="b-fight-details__section js-fight-section">
+    <p class="b-fight-details__collapse-link_tot">
+      {title}
+    </p>
+  </section>
+  <section class="b-fight-details__section js-fight-section">
+    <table style="width: 745px">{_table_head(columns)}
+      <tbody class="b-fight-details__table-body">{_stats_row(names, totals)}
+      </tbody>
+    </table>
+  </section>'''
+    if not per_round:
+        return html
+
+    rounds = ''.join(f'''
+    <thead class="b-fight-details__table-row b-fight-details__table-row_type_head">
+      <tr><th class="b-fight-details__table-col" colspan="{len(columns) + 1}">Round {number}</th></tr>
+    </thead>
+    <tbody class="b-fight-details__table-body">{_stats_row(names, stats)}
+    </tbody>''' for number, stats in enumerate(round_stats, start=1))
+    return html + f'''
+  <section class="b-fight-details__section js-fight-section">
+    <a class="b-fight-details__collapse-link_rnd js-fight-collapse-link" href="#">
+      Per round
+      <i class="b-fight-details__collapse-icon"></i>
+    </a>
+  </section>
+  <table class="b-fight-details__table js-fight-table">{_table_head(columns)}{rounds}
+  </table>'''
+
+
+def fight_page_html(rng, fighter_1, fighter_2, event, bout_title, n_rounds, method, per_round=True):
+    """
+    Renders a ufcstats fight details page with the totals and significant strikes tables.
+
+    Args:
+        rng (np.random.Generator): The random generator for the statistics.
+        fighter_1 (str): The first fighter listed, usually the winner.
+        fighter_2 (str): The second fighter listed.
+        event (str): The event name.
+        bout_title (str): The bout title, e.g. 'UFC Lightweight Title Bout'.
+        n_rounds (int): The number of rounds fought.
+        method (str): The method of victory.
+        per_round (bool): Whether the page has the per-round tables, which old fights lack.
+
+    Returns:
+        str: The page's HTML.
+    """
+    names = [fighter_1, fighter_2]
+    round_stats = [[_round_stats(rng) for _ in names] for _ in range(n_rounds)]
+    totals = [[side[0] for side in stats] for stats in round_stats]
+    sig_strikes = [[side[1] for side in stats] for stats in round_stats]
+    persons = ''.join(f'''
+      <div class="b-fight-details__person">
+        <i class="b-fight-details__person-status b-fight-details__person-status_style_{style}">{status}</i>
+        <div class="b-fight-details__person-text">
+          <h3 class="b-fight-details__person-name"><a class="b-link b-fight-details__person-link" href="#">{name}</a></h3>
+        </div>
+      </div>''' for name, status, style in zip(names, ['W', 'L'], ['green', 'gray']))
+
+    return f'''<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>UFC Fight Details</title></head>
+<body>
+<section class="b-statistics__section_details">
+  <h2 class="b-content__title">
+    <a class="b-link" href="http://ufcstats.com/event-details/{_page_id(event)}">
+      {event}
+    </a>
+  </h2>
+  <div class="b-fight-details">
+    <div class="b-fight-details__persons clearfix">{persons}
+    </div>
+    <div class="b-fight-details__fight">
+      <div class="b-fight-details__fight-head">
+        <i class="b-fight-details__fight-title">
+          {bout_title}
+        </i>
+      </div>
+      <div class="b-fight-details__content">
+        <p class="b-fight-details__text">
+          <i class="b-fight-details__text-item_first"><i class="b-fight-details__label">Method:</i> <i style="font-style: normal">{method}</i></i>
+          <i class="b-fight-details__text-item"><i class="b-fight-details__label">Round:</i> {n_rounds}</i>
+          <i class="b-fight-details__text-item"><i class="b-fight-details__label">Time format:</i> {5 if n_rounds > 3 else 3} Rnd (5-5-5)</i>
+        </p>
+      </div>
+    </div>{_stats_section('Totals', TOTALS_COLUMNS, names, totals, per_round)}{_stats_section('Significant Strikes', SIG_STRIKES_COLUMNS, names, sig_strikes, per_round)}
+  </div>
+</section>
+</body>
+</html>
+'''
+
+
+def fighter_page_html(rng, name, bouts, upcoming=None):
+    """
+    Renders a ufcstats fighter page: the profile box and the fight history table.
+
+    Args:
+        rng (np.random.Generator): The random generator for the profile.
+        name (str): The fighter's name.
+        bouts (list): The fights, latest first, as dictionaries with 'opponent', 'event', 'date',
+                      'result' ('win', 'loss', 'draw' or 'nc') and 'method'.
+        upcoming (dict): An upcoming fight to list first, in the same form with the result 'next', or None.
+
+    Returns:
+        str: The page's HTML.
+    """
+    wins = sum(bout['result'] == 'win' for bout in bouts)
+    losses = sum(bout['result'] == 'loss' for bout in bouts)
+    draws = sum(bout['result'] == 'draw' for bout in bouts)
+    no_contests = sum(bout['result'] == 'nc' for bout in bouts)
+    height = int(rng.integers(62, 80))
+    birth_date = date(1975, 1, 1) + timedelta(days=int(rng.integers(0, 365 * 25)))
+    details = {
+        'Height': f"{height // 12}' {height % 12}\"",
+        'Weight': f'{int(rng.choice([limit for _, limit, _, _ in WEIGHT_CLASSES]))} lbs.',
+        'Reach': f'{height + int(rng.integers(-2, 5))}"',
+        'STANCE': str(rng.choice(['Orthodox', 'Southpaw', 'Switch'])),
+        'DOB': birth_date.strftime('%b %d, %Y'),
+    }
+    profile = ''.join(f'''
+        <li class="b-list__box-list-item b-list__box-list-item_type_block">
+          <i class="b-list__box-item-title b-list__box-item-title_type_width">
+            {title}:
+          </i>
+          {value}
+        </li>''' for title, value in details.items())
+
+    rows = ''
+    for i, bout in enumerate(([upcoming] if upcoming else []) + bouts):
+        flag_style = {'win': 'green', 'loss': 'red', 'next': 'bordered'}.get(bout['result'], 'gray')
+        event_cell = (f'\n        <td class="b-fight-details__table-col l-page_align_left">'
+                      f'\n          <p class="b-fight-details__table-text"><a class="b-link b-link_style_black" '
+                      f'href="http://ufcstats.com/event-details/{_page_id(bout["event"])}">{bout["event"]}</a></p>'
+                      f'\n          <p class="b-fight-details__table-text">{bout["date"]}</p>\n        </td>')
+        method, _, details = bout['method'].partition(' ')
+        rows += f'''
+      <tr class="b-fight-details__table-row b-fight-details__table-row__hover js-fight-details-click" data-link="http://ufcstats.com/fight-details/{_page_id(f'{name} {i}')}">
+        <td class="b-fight-details__table-col"><p class="b-fight-details__table-text"><a class="b-flag b-flag_style_{flag_style}" href="#"><i class="b-flag__inner"><i class="b-flag__text">{bout["result"]}</i></i></a></p></td>{_stat_cell([name, bout['opponent']], align_left=True)}{_stat_cell([rng.poisson(0.3), rng.poisson(0.3)])}{_stat_cell([rng.poisson(50), rng.poisson(50)])}{event_cell}{_stat_cell([method, details], align_left=True)}{_stat_cell([rng.integers(1, 4)])}{_stat_cell(['5:00'])}
+      </tr>'''
+
+    return f'''<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>Fighter Profile</title></head>
+<body>
+<section class="b-statistics__section_details">
+  <h2 class="b-content__title">
+    <span class="b-content__title-highlight">
+      {name}
+    </span>
+    <span class="b-content__title-record">
+      Record: {wins}-{losses}-{draws}{f' ({no_contests} NC)' if no_contests else ''}
+    </span>
+  </h2>
+  <div class="b-list__info-box b-list__info-box_style_small-width clearfix">
+    <ul class="b-list__box-list">{profile}
+    </ul>
+  </div>
+  <table class="b-fight-details__table b-fight-details__table_style_margin-top b-fight-details__table_type_event-details js-fight-table">
+    <thead class="b-fight-details__table-head">
+      <tr class="b-fight-details__table-row">
+        <th class="b-fight-details__table-col">W/L</th>
+        <th class="b-fight-details__table-col">Fighter</th>
+      </tr>
+    </thead>
+    <tbody class="b-fight-details__table-body">
+      <tr class="b-fight-details__table-row b-statistics__table-row_type_first"><td class="b-fight-details__table-col"></td></tr>{rows}
+    </tbody>
+  </table>
+</section>
+</body>
+</html>
+'''
+
+
+def generate_pages(n_fight_pages=200, n_fighter_pages=50, max_bouts=45, title_fight_rate=0.1,
+                   missing_per_round_rate=0.05, non_ufc_rate=0.1, upcoming_rate=0.2, seed=0):
+    """
+    Generates ufcstats-structured fight and fighter pages for offline parser tests, together with
+    what a correct parse should return.
+
+    Edge cases are mixed in at controllable rates: 5-round title fights, fight pages without the
+    per-round tables (as for old events), fighters with up to max_bouts fights, non-UFC events that
+    the fight history parser skips, draws and no contests, and upcoming fights.
+
+    Args:
+        n_fight_pages (int): The number of fight details pages.
+        n_fighter_pages (int): The number of fighter pages.
+        max_bouts (int): The largest number of fights on a fighter page; one page always has this many.
+        title_fight_rate (float): The share of fights that are 5-round title fights.
+        missing_per_round_rate (float): The share of fight pages without per-round tables.
+        non_ufc_rate (float): The share of bouts on fighter pages at non-UFC events.
+        upcoming_rate (float): The share of fighter pages listing an upcoming fight.
+        seed (int): The random seed.
+
+    Returns:
+        dict: 'fight' and 'fighter' lists of (html, expected) pairs. A fight page's expected dict has
+              'rounds', 'per_round' and 'bout_title'; a fighter page's has 'name', 'bouts' and 'ufc_rows'.
+    """
+    rng = np.random.default_rng(seed)
+    names = fighter_names(max(2 * n_fight_pages, n_fighter_pages, 2))
+    methods = [method for method, _ in METHODS]
+    method_shares = np.array([share for _, share in METHODS]) / sum(share for _, share in METHODS)
+    pages = {'fight': [], 'fighter': []}
+
+    for i in range(n_fight_pages):
+        weight_class = WEIGHT_CLASSES[int(rng.integers(len(WEIGHT_CLASSES)))][0]
+        is_title = rng.random() < title_fight_rate
+        method = str(rng.choice(methods, p=method_shares))
+        max_rounds = 5 if is_title else 3
+        n_rounds = max_rounds if 'DEC' in method else int(rng.integers(1, max_rounds + 1))
+        per_round = rng.random() >= missing_per_round_rate
+        bout_title = f'UFC {weight_class} Title Bout' if is_title else f'{weight_class} Bout'
+        html = fight_page_html(rng, names[2 * i % len(names)], names[(2 * i + 1) % len(names)],
+                               f'UFC Fight Night {i + 1}', bout_title, n_rounds, method, per_round)
+        pages['fight'].append((html, {'rounds': n_rounds, 'per_round': per_round, 'bout_title': bout_title}))
+
+    for i in range(n_fighter_pages):
+        n_bouts = max_bouts if i == 0 else int(rng.integers(1, max_bouts + 1))
+        last_fight = date(2024, 12, 14) - timedelta(days=int(rng.integers(0, 365)))
+        bouts = []
+        for j in range(n_bouts):
+            is_ufc = rng.random() >= non_ufc_rate
+            bouts.append({
+                'opponent': names[int(rng.integers(len(names)))],
+                'event': f'UFC {300 - j}: Main Event' if is_ufc else f'Strikeforce {j}: Main Event',
+                'date': (last_fight - timedelta(days=120 * j)).strftime('%b. %d, %Y'),
+                'result': str(rng.choice(['win', 'loss', 'draw', 'nc'], p=[0.6, 0.35, 0.03, 0.02])),
+                'method': str(rng.choice(methods, p=method_shares)),
+            })
+        upcoming = None
+        if rng.random() < upcoming_rate:
+            upcoming = {'opponent': names[int(rng.integers(len(names)))], 'event': 'UFC 310: Main Event',
+                        'date': 'Dec. 07, 2025', 'result': 'next', 'method': ''}
+        html = fighter_page_html(rng, names[i], bouts, upcoming)
+        # The fight history parser returns the UFC fights, including an upcoming one
+        ufc_rows = sum(bout['event'].startswith('UFC') for bout in bouts) + (upcoming is not None)
+        pages['fighter'].append((html, {'name': names[i], 'bouts': n_bouts, 'ufc_rows': ufc_rows}))
+
+    return pages
+
+
+def write_pages(pages, output_dir=SYNTHETIC_PAGES_DIR):
+    """
+    Writes generated pages to disk as fight_<n>.html and fighter_<n>.html.
+
+    Args:
+        pages (dict): The pages returned by generate_pages.
+        output_dir (str): The directory to write to.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for page_type, page_list in pages.items():
+        for i, (html, _) in enumerate(page_list):
+            with open(os.path.join(output_dir, f'{page_type}_{i:05d}.html'), 'w', encoding='utf-8') as file:
+                file.write(html)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate ufcstats-structured HTML pages for parser tests.')
+    parser.add_argument('--fight-pages', type=int, default=200)
+    parser.add_argument('--fighter-pages', type=int, default=50)
+    parser.add_argument('--max-bouts', type=int, default=45)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-dir', default=SYNTHETIC_PAGES_DIR)
+    args = parser.parse_args()
+
+    write_pages(generate_pages(args.fight_pages, args.fighter_pages, args.max_bouts, seed=args.seed), args.output_dir)
+    print(f"Wrote {args.fight_pages} fight pages and {args.fighter_pages} fighter pages to {args.output_dir}")
@@ -0,0 +1,293 @@
+import json
+import os
+
+import numpy as np
+import model_registry
+
+# Bumped whenever the layout of the compiled arrays changes, so stale compiled.npz files are rebuilt
+COMPILED_FORMAT = 2
+
+
+def parse_base_score(value):
+    """
+    Parses the base score stored in a model's JSON, which newer xgboost versions write as a
+    one-element list such as '[4.979469E-1]'.
+
+    Args:
+        value (str): The base_score string from the learner parameters.
+
+    Returns:
+        float: The base score in probability space.
+    """
+    return float(str(value).strip('[]'))
+
+
+class CompiledTreeEnsemble:
+    """
+    A binary:logistic xgboost booster flattened into node arrays. Every tree of every model is
+    walked at once with numpy indexing, one tree level per step, so scoring a single row avoids
+    xgboost's DMatrix construction and validation overhead. Nodes are numbered so that a split's
+    right child directly follows its left child, which lets a step move to left + go_right with a
+    single gather.
+
+    Several boosters can be compiled together; predict_member_proba then returns one probability
+    per booster for every row.
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots, member_sizes,
+                 base_margins, max_depth, feature_names=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.member_sizes = member_sizes
+        self.base_margins = base_margins
+        self.max_depth = int(max_depth)
+        self.feature_names = feature_names
+        self._default_right = ~default_left
+        self._member_ids = np.repeat(np.arange(len(member_sizes)), member_sizes)
+
+    @classmethod
+    def from_boosters(cls, boosters):
+        """
+        Compiles one or more xgboost boosters.
+
+        Args:
+            boosters (list): xgboost.Booster objects, all trained with objective binary:logistic.
+
+        Returns:
+            CompiledTreeEnsemble: The compiled ensemble.
+
+        Raises:
+            ValueError: If a booster uses an unsupported objective or categorical splits.
+        """
+        features, thresholds, lefts, rights, defaults, values = [], [], [], [], [], []
+        roots, member_sizes, base_margins = [], [], []
+        offset = 0
+        max_depth = 0
+        feature_names = None
+
+        for booster in boosters:
+            learner = json.loads(booster.save_raw('json'))['learner']
+            if learner['objective']['name'] != 'binary:logistic':
+                raise ValueError(f"Unsupported objective {learner['objective']['name']}")
+            base_score = parse_base_score(learner['learner_model_param']['base_score'])
+            base_margins.append(np.log(base_score / (1 - base_score)))
+            feature_names = feature_names or booster.feature_names
+
+            trees = learner['gradient_booster']['model']['trees']
+            member_sizes.append(len(trees))
+            for tree in trees:
+                if any(tree['split_type']):
+                    raise ValueError("Categorical splits are not supported")
+
+                left = np.array(tree['left_children'], dtype=np.int64)
+                right = np.array(tree['right_children'], dtype=np.int64)
+                order = sibling_order(left, right)
+                new_ids = np.empty_like(order)
+                new_ids[order] = np.arange(len(order))
+
+                left, right = left[order], right[order]
+                is_leaf = left == -1
+                node_ids = np.arange(len(left))
+
+                # Leaves point at themselves and never step right, so extra traversal steps leave
+                # them in place: their NaN threshold fails x >= threshold and NaNs default left
+                lefts.append(np.where(is_leaf, node_ids, new_ids[left]) + offset)
+                rights.append(np.where(is_leaf, node_ids, new_ids[right]) + offset)
+                features.append(np.where(is_leaf, 0, np.array(tree['split_indices'])[order]))
+                conditions = np.array(tree['split_conditions'], dtype=np.float32)[order]
+                thresholds.append(np.where(is_leaf, np.float32(np.nan), conditions))
+                defaults.append(np.array(tree['default_left'], dtype=bool)[order] | is_leaf)
+                values.append(np.where(is_leaf, conditions, 0).astype(np.float64))
+
+                roots.append(offset)
+                max_depth = max(max_depth, tree_depth(left, right, new_ids))
+                offset += len(left)
+
+        return cls(np.concatenate(features).astype(np.int32), np.concatenate(thresholds),
+                   np.concatenate(lefts).astype(np.int32), np.concatenate(rights).astype(np.int32),
+                   np.concatenate(defaults), np.concatenate(values),
+                   np.array(roots, dtype=np.int32), np.array(member_sizes, dtype=np.int64),
+                   np.array(base_margins, dtype=np.float64), max_depth, feature_names)
+
+    def predict_member_margin(self, X):
+        """
+        Computes the raw margin of every compiled booster for every row.
+
+        Args:
+            X (np.ndarray or pd.DataFrame): The feature matrix, shape (n_rows, n_features).
+
+        Returns:
+            np.ndarray: The margins, shape (n_rows, n_members).
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.roots.size))
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_right = np.where(np.isnan(x), self._default_right[node], x >= self.threshold[node])
+            node = self.left[node] + go_right
+
+        leaf_values = self.value[node]
+        if np.all(self.member_sizes == self.member_sizes[0]):
+            # Members of equal size, such as a bootstrap ensemble, reduce with a reshape
+            margins = leaf_values.reshape(X.shape[0], self.member_sizes.size, -1).sum(axis=2)
+        else:
+            margins = np.zeros((X.shape[0], self.member_sizes.size))
+            np.add.at(margins.T, self._member_ids, leaf_values.T)
+        return margins + self.base_margins
+
+    def predict_member_proba(self, X):
+        """
+        Computes the probability of class 1 from every compiled booster for every row.
+
+        Args:
+            X (np.ndarray or pd.DataFrame): The feature matrix, shape (n_rows, n_features).
+
+        Returns:
+            np.ndarray: The probabilities, shape (n_rows, n_members).
+        """
+        return 1 / (1 + np.exp(-self.predict_member_margin(X)))
+
+    def predict_proba(self, X):
+        """
+        Computes class probabilities like XGBClassifier.predict_proba, averaging the members when
+        several boosters were compiled together.
+
+        Args:
+            X (np.ndarray or pd.DataFrame): The feature matrix, shape (n_rows, n_features).
+
+        Returns:
+            np.ndarray: The probabilities of class 0 and class 1, shape (n_rows, 2).
+        """
+        prob_1 = self.predict_member_proba(X).mean(axis=1)
+        return np.column_stack([1 - prob_1, prob_1])
+
+    def save(self, path):
+        """
+        Saves the compiled arrays to a .npz file.
+
+        Args:
+            path (str): The file to write.
+        """
+        np.savez(path, feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+                 default_left=self.default_left, value=self.value, roots=self.roots,
+                 member_sizes=self.member_sizes, base_margins=self.base_margins,
+                 max_depth=np.array(self.max_depth), feature_names=np.array(self.feature_names or []),
+                 format=np.array(COMPILED_FORMAT))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads arrays written by save.
+
+        Args:
+            path (str): The .npz file to read.
+
+        Returns:
+            CompiledTreeEnsemble: The compiled ensemble.
+
+        Raises:
+            ValueError: If the file was written in an older layout.
+        """
+        with np.load(path) as arrays:
+            if 'format' not in arrays or int(arrays['format']) != COMPILED_FORMAT:
+                raise ValueError(f"{path} was compiled in an older layout")
+            feature_names = [str(name) for name in arrays['feature_names']] or None
+            return cls(arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'],
+                       arrays['default_left'], arrays['value'], arrays['roots'], arrays['member_sizes'],
+                       arrays['base_margins'], int(arrays['max_depth']), feature_names)
+
+
+def sibling_order(left, right):
+    """
+    Orders a tree's nodes breadth first so that every split's two children are adjacent, left first.
+
+    Args:
+        left (np.ndarray): The left child of each node, where -1 marks a leaf.
+        right (np.ndarray): The right child of each node.
+
+    Returns:
+        np.ndarray: The original node IDs in their new order, starting with the root.
+    """
+    order = [0]
+    for node in order:
+        if left[node] != -1:
+            order.extend([left[node], right[node]])
+    return np.array(order, dtype=np.int64)
+
+
+def tree_depth(left, right, new_ids=None):
+    """
+    Computes the depth of a tree from its child arrays, where -1 marks a leaf. Nodes must be in
+    breadth first order, so every parent comes before its children.
+
+    Args:
+        left (np.ndarray): The left child of each node.
+        right (np.ndarray): The right child of each node.
+        new_ids (np.ndarray): If the child arrays hold original IDs of reordered nodes, the new
+                              position of each original ID.
+
+    Returns:
+        int: The number of splits on the longest root-to-leaf path.
+    """
+    depth = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):
+        if left[node] != -1:
+            left_child = left[node] if new_ids is None else new_ids[left[node]]
+            right_child = right[node] if new_ids is None else new_ids[right[node]]
+            depth[left_child] = depth[node] + 1
+            depth[right_child] = depth[node] + 1
+    return int(depth.max())
+
+
+def compile_registered_model(version=None, registry_dir=model_registry.REGISTRY_DIR):
+    """
+    Compiles a registered model and stores the arrays next to it as compiled.npz.
+
+    Args:
+        version (str): The version to compile, or None for the latest version.
+        registry_dir (str): The registry directory.
+
+    Returns:
+        str: The path of the compiled arrays.
+    """
+    model, metadata = model_registry.load_model(version, registry_dir)
+    compiled = CompiledTreeEnsemble.from_boosters([model.get_booster()])
+    path = os.path.join(registry_dir, metadata['version'], 'compiled.npz')
+    compiled.save(path)
+    return path
+
+
+def load_compiled_model(version=None, registry_dir=model_registry.REGISTRY_DIR):
+    """
+    Loads the compiled arrays of a registered model, compiling them first if needed.
+
+    Args:
+        version (str): The version to load, or None for the latest version.
+        registry_dir (str): The registry directory.
+
+    Returns:
+        CompiledTreeEnsemble: The compiled model.
+    """
+    metadata = model_registry.load_metadata(version, registry_dir)
+    path = os.path.join(registry_dir, metadata['version'], 'compiled.npz')
+    if os.path.exists(path):
+        try:
+            return CompiledTreeEnsemble.load(path)
+        except ValueError:
+            pass
+    compile_registered_model(metadata['version'], registry_dir)
+    return CompiledTreeEnsemble.load(path)
+
+
+if __name__ == "__main__":
+    import sys
+    print(f"Compiled model written to {compile_registered_model(sys.argv[1] if len(sys.argv) > 1 else None)}")